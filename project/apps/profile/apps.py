@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class ProfileAppConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.profile'
+
+    def ready(self):
+        from .infrastructure import signals  # noqa: F401  (connects the receivers)
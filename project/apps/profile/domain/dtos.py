@@ -2,6 +2,8 @@
 Data Transfer Objects (DTOs) for the profile domain.
 DTOs are used to transfer data between layers and serve as intermediary objects
 between domain entities and infrastructure models.
+They are immutable and slotted: gateways build them once per conversion,
+and slots keep them free of a per-instance __dict__.
 """
 
 from dataclasses import dataclass
@@ -9,7 +11,7 @@ from datetime import datetime
 from typing import Optional
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class UserDTO:
     """DTO for User data transfer"""
     id: Optional[int] = None
@@ -21,7 +23,7 @@ class UserDTO:
     last_login: Optional[datetime] = None
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class DeviceDTO:
     """DTO for Device data transfer"""
     id: Optional[int] = None
@@ -34,7 +36,7 @@ class DeviceDTO:
     updated_at: Optional[datetime] = None
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class SessionDTO:
     """DTO for Session data transfer"""
     id: Optional[int] = None
@@ -1,15 +1,45 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, fields
 from datetime import datetime
-from typing import Optional
+from typing import Dict, Iterable, Iterator, Optional, Sequence, Set
 
-@dataclass
+
+class ChangeTracking:
+    """
+    Remembers the field values an entity was loaded with, so repositories
+    can write only the fields that changed since.
+    """
+
+    __slots__ = ('_persisted',)
+
+    def mark_clean(self, values: Optional[tuple] = None) -> None:
+        """Record the current field values (or ``values``, in field order) as persisted"""
+        if values is None:
+            values = tuple(getattr(self, f.name) for f in fields(self))
+        self._persisted = values
+
+    def changed_fields(self) -> Optional[Set[str]]:
+        """Names of fields changed since mark_clean, or None if the entity was never loaded"""
+        persisted = getattr(self, '_persisted', None)
+        if persisted is None:
+            return None
+        return {f.name for f, value in zip(fields(self), persisted) if getattr(self, f.name) != value}
+
+
+@dataclass(slots=True)
 class UserEntity:
     username: str
     email: str
     password: str = ''
 
-@dataclass
-class DeviceEntity:
+@dataclass(slots=True)
+class LoginCredentials:
+    username: str
+    user_id: int
+    password_hash: str
+    token: Optional[str] = None  # Auth token key, if one was already issued
+
+@dataclass(slots=True)
+class DeviceEntity(ChangeTracking):
     name: str
     device_type: str
     platform: str
@@ -19,8 +49,8 @@ class DeviceEntity:
     created_at: Optional[datetime] = None
     updated_at: Optional[datetime] = None
 
-@dataclass
-class SessionEntity:
+@dataclass(slots=True)
+class SessionEntity(ChangeTracking):
     session_token: str
     username: str  # Associated user
     device_name: Optional[str] = None  # Associated device name
@@ -30,3 +60,43 @@ class SessionEntity:
     session_id: Optional[int] = None
     created_at: Optional[datetime] = None
     last_activity: Optional[datetime] = None
+
+
+class SessionBatch:
+    """
+    Sessions stored column-wise: one tuple per field rather than one object
+    per session. Meant for bulk and analytic reads over many rows; single
+    sessions are materialized as SessionEntity only when indexed or iterated.
+    """
+
+    __slots__ = ('columns', '_length')
+
+    FIELDS = tuple(f.name for f in fields(SessionEntity))
+
+    def __init__(self, columns: Dict[str, Sequence]):
+        self.columns = columns
+        self._length = len(columns[self.FIELDS[0]])
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[tuple]) -> 'SessionBatch':
+        """Build a batch from rows whose values are in SessionEntity field order"""
+        columns = list(zip(*rows)) or [() for _ in cls.FIELDS]
+        return cls(dict(zip(cls.FIELDS, columns)))
+
+    def __len__(self) -> int:
+        return self._length
+
+    def column(self, name: str) -> Sequence:
+        """All values of one field, in row order"""
+        return self.columns[name]
+
+    def __getitem__(self, index: int) -> SessionEntity:
+        entity = SessionEntity(*(self.columns[name][index] for name in self.FIELDS))
+        entity.mark_clean()
+        return entity
+
+    def __iter__(self) -> Iterator[SessionEntity]:
+        for row in zip(*(self.columns[name] for name in self.FIELDS)):
+            entity = SessionEntity(*row)
+            entity.mark_clean(row)
+            yield entity
@@ -1,6 +1,10 @@
 from abc import ABC, abstractmethod
-from .entities import UserEntity, DeviceEntity, SessionEntity
-from typing import List
+from .entities import UserEntity, DeviceEntity, SessionEntity, SessionBatch, LoginCredentials
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+# Keyset pagination position: (ordering timestamp, id) of the last row seen
+Cursor = Tuple[datetime, int]
 
 class UserRepository(ABC):
     @abstractmethod
@@ -19,17 +23,58 @@ class UserRepository(ABC):
     def change_password(self, username: str, new_password: str) -> None:
         ...
 
+    @abstractmethod
+    def find_password_hash(self, username: str) -> str | None:
+        ...
+
+    @abstractmethod
+    def set_password_hash(self, username: str, encoded: str, expected: Optional[str] = None) -> bool:
+        ...
+
+    @abstractmethod
+    def find_login_credentials(self, username: str) -> LoginCredentials | None:
+        ...
+
+    @abstractmethod
+    def record_login(self, credentials: LoginCredentials, session: SessionEntity) -> str:
+        ...
+
+    @abstractmethod
+    def bulk_add(self, users: List[UserEntity]) -> List[UserEntity]:
+        ...
+
+    @abstractmethod
+    def bulk_delete(self, usernames: List[str]) -> None:
+        ...
+
 class DeviceRepository(ABC):
     @abstractmethod
     def add(self, device: DeviceEntity) -> DeviceEntity:
         ...
 
+    @abstractmethod
+    def get_or_register(self, device: DeviceEntity) -> Tuple[DeviceEntity, bool]:
+        ...
+
     @abstractmethod
     def find_by_id(self, device_id: int) -> DeviceEntity | None:
         ...
 
     @abstractmethod
-    def find_by_user(self, username: str) -> List[DeviceEntity]:
+    def find_by_user(self, username: str, after: Optional[Cursor] = None,
+                     limit: Optional[int] = None) -> List[DeviceEntity]:
+        ...
+
+    @abstractmethod
+    def iter_by_user(self, username: str, chunk_size: int = 1000) -> Iterator[DeviceEntity]:
+        ...
+
+    @abstractmethod
+    def iter_active_by_user(self, username: str, chunk_size: int = 1000) -> Iterator[DeviceEntity]:
+        ...
+
+    @abstractmethod
+    def iter_all(self, chunk_size: int = 1000) -> Iterator[DeviceEntity]:
         ...
 
     @abstractmethod
@@ -52,6 +97,26 @@ class DeviceRepository(ABC):
     def set_active_status(self, name: str, username: str, is_active: bool) -> None:
         ...
 
+    @abstractmethod
+    def bulk_add(self, devices: List[DeviceEntity]) -> List[DeviceEntity]:
+        ...
+
+    @abstractmethod
+    def bulk_register(self, devices: List[DeviceEntity]) -> List[DeviceEntity]:
+        ...
+
+    @abstractmethod
+    def bulk_deactivate(self, device_ids: List[int]) -> None:
+        ...
+
+    @abstractmethod
+    def bulk_delete(self, device_ids: List[int]) -> None:
+        ...
+
+    @abstractmethod
+    def find_existing_names(self, username: str, names: List[str]) -> Set[str]:
+        ...
+
 class SessionRepository(ABC):
     @abstractmethod
     def add(self, session: SessionEntity) -> SessionEntity:
@@ -62,23 +127,57 @@ class SessionRepository(ABC):
         ...
 
     @abstractmethod
-    def find_by_user(self, username: str) -> List[SessionEntity]:
+    def find_by_user(self, username: str, after: Optional[Cursor] = None,
+                     limit: Optional[int] = None) -> List[SessionEntity]:
+        ...
+
+    @abstractmethod
+    def iter_by_user(self, username: str, chunk_size: int = 1000) -> Iterator[SessionEntity]:
         ...
 
     @abstractmethod
-    def find_active_by_user(self, username: str) -> List[SessionEntity]:
+    def iter_active_by_user(self, username: str, chunk_size: int = 1000) -> Iterator[SessionEntity]:
+        ...
+
+    @abstractmethod
+    def iter_all(self, chunk_size: int = 1000) -> Iterator[SessionEntity]:
+        ...
+
+    @abstractmethod
+    def iter_batches(self, chunk_size: int = 10000) -> Iterator[SessionBatch]:
+        ...
+
+    @abstractmethod
+    def find_active_by_user(self, username: str, after: Optional[Cursor] = None,
+                            limit: Optional[int] = None) -> List[SessionEntity]:
+        ...
+
+    @abstractmethod
+    def update(self, session: SessionEntity) -> SessionEntity:
         ...
 
     @abstractmethod
     def update_last_activity(self, token: str) -> None:
         ...
 
+    @abstractmethod
+    def bulk_update_last_activity(self, activity: Dict[str, datetime]) -> None:
+        ...
+
     @abstractmethod
     def deactivate(self, token: str) -> None:
         ...
 
     @abstractmethod
-    def deactivate_user_sessions(self, username: str) -> None:
+    def deactivate_user_sessions(self, username: str) -> List[str]:
+        ...
+
+    @abstractmethod
+    def deactivate_device_sessions(self, device_id: int) -> List[str]:
+        ...
+
+    @abstractmethod
+    def deactivate_sessions_created_before(self, cutoff: datetime) -> List[str]:
         ...
 
     @abstractmethod
@@ -88,3 +187,100 @@ class SessionRepository(ABC):
     @abstractmethod
     def delete_inactive_sessions(self) -> None:
         ...
+
+    @abstractmethod
+    def delete_inactive_batch(self, batch_size: int) -> int:
+        ...
+
+    @abstractmethod
+    def delete_idle_batch(self, last_activity_before: datetime, batch_size: int) -> int:
+        ...
+
+    @abstractmethod
+    def bulk_add(self, sessions: List[SessionEntity]) -> List[SessionEntity]:
+        ...
+
+    @abstractmethod
+    def bulk_deactivate(self, tokens: List[str]) -> None:
+        ...
+
+    @abstractmethod
+    def bulk_delete(self, tokens: List[str]) -> None:
+        ...
+
+class AsyncDeviceRepository(ABC):
+    @abstractmethod
+    async def add(self, device: DeviceEntity) -> DeviceEntity:
+        ...
+
+    @abstractmethod
+    async def get_or_register(self, device: DeviceEntity) -> Tuple[DeviceEntity, bool]:
+        ...
+
+    @abstractmethod
+    async def find_by_id(self, device_id: int) -> DeviceEntity | None:
+        ...
+
+    @abstractmethod
+    async def find_by_user(self, username: str, after: Optional[Cursor] = None,
+                           limit: Optional[int] = None) -> List[DeviceEntity]:
+        ...
+
+    @abstractmethod
+    async def find_by_name_and_user(self, name: str, username: str) -> DeviceEntity | None:
+        ...
+
+    @abstractmethod
+    async def find_existing_names(self, username: str, names: List[str]) -> Set[str]:
+        ...
+
+    @abstractmethod
+    async def update(self, device: DeviceEntity) -> DeviceEntity:
+        ...
+
+    @abstractmethod
+    async def delete(self, device_id: int) -> None:
+        ...
+
+    @abstractmethod
+    async def bulk_add(self, devices: List[DeviceEntity]) -> List[DeviceEntity]:
+        ...
+
+    @abstractmethod
+    async def bulk_deactivate(self, device_ids: List[int]) -> None:
+        ...
+
+class AsyncSessionRepository(ABC):
+    @abstractmethod
+    async def add(self, session: SessionEntity) -> SessionEntity:
+        ...
+
+    @abstractmethod
+    async def find_by_token(self, token: str) -> SessionEntity | None:
+        ...
+
+    @abstractmethod
+    async def find_by_user(self, username: str, after: Optional[Cursor] = None,
+                           limit: Optional[int] = None) -> List[SessionEntity]:
+        ...
+
+    @abstractmethod
+    async def find_active_by_user(self, username: str, after: Optional[Cursor] = None,
+                                  limit: Optional[int] = None) -> List[SessionEntity]:
+        ...
+
+    @abstractmethod
+    async def update_last_activity(self, token: str) -> None:
+        ...
+
+    @abstractmethod
+    async def deactivate(self, token: str) -> None:
+        ...
+
+    @abstractmethod
+    async def deactivate_user_sessions(self, username: str) -> List[str]:
+        ...
+
+    @abstractmethod
+    async def delete(self, token: str) -> None:
+        ...
@@ -0,0 +1,161 @@
+"""
+Write-behind tracker for session activity.
+Touches are recorded in memory and written with one bulk UPDATE per flush,
+instead of one UPDATE per request. get_activity_tracker() returns the one
+tracker of the process. Its background flush thread starts on the first
+touch of each process (a pre-fork server's children start their own), writes
+every FLUSH_INTERVAL and as soon as MAX_PENDING tokens are waiting, on its
+own connection, and logs failed flushes instead of failing a request.
+
+Configured through the ``PROFILE_SESSION_ACTIVITY`` setting:
+
+    PROFILE_SESSION_ACTIVITY = {
+        'FLUSH_INTERVAL': 5,    # seconds between flushes
+        'MAX_PENDING': 1000,    # flush early once this many tokens are pending
+        'MIN_RESOLUTION': 60,   # seconds during which re-touching a token is ignored
+    }
+"""
+
+import atexit
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Optional
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.utils import timezone
+
+from ..domain.repositories import SessionRepository
+from .django_repositories_with_gateway import DjangoSessionRepositoryWithGateway
+from .session_index import IndexedSessionRepository, get_session_index
+from .shared_state import process_singleton
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SETTINGS = {
+    'FLUSH_INTERVAL': 5,
+    'MAX_PENDING': 1000,
+    'MIN_RESOLUTION': 60,
+}
+
+
+class SessionActivityTracker:
+    """Buffers session activity touches and flushes them in bulk"""
+
+    def __init__(self, session_repository: SessionRepository,
+                 flush_interval: Optional[float] = None,
+                 max_pending: Optional[int] = None,
+                 min_resolution: Optional[float] = None):
+        options = {**DEFAULT_SETTINGS, **getattr(settings, 'PROFILE_SESSION_ACTIVITY', {})}
+        self.session_repository = session_repository
+        self.flush_interval = options['FLUSH_INTERVAL'] if flush_interval is None else flush_interval
+        self.max_pending = options['MAX_PENDING'] if max_pending is None else max_pending
+        self.min_resolution = options['MIN_RESOLUTION'] if min_resolution is None else min_resolution
+
+        self._pending: Dict[str, datetime] = {}
+        # token -> monotonic time of the last accepted touch
+        self._last_touch: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        # The process that started the thread; a forked child has none running
+        self._pid: Optional[int] = None
+
+    def touch(self, token: str) -> None:
+        """Record activity for a session token; the background thread writes it"""
+        if self._pid != os.getpid():
+            self.start()
+        now = time.monotonic()
+        with self._lock:
+            last = self._last_touch.get(token)
+            if last is not None and now - last < self.min_resolution:
+                return
+            self._last_touch[token] = now
+            self._pending[token] = timezone.now()
+            full = len(self._pending) >= self.max_pending
+        if full:
+            self._wake.set()
+
+    def pending_count(self) -> int:
+        with self._lock:
+            return len(self._pending)
+
+    def flush(self) -> None:
+        """Write all pending touches now, on the calling thread's connection"""
+        with self._flush_lock:
+            now = time.monotonic()
+            with self._lock:
+                pending, self._pending = self._pending, {}
+                # Touches older than the resolution window no longer suppress anything
+                self._last_touch = {
+                    token: at for token, at in self._last_touch.items()
+                    if now - at < self.min_resolution
+                }
+            if pending:
+                try:
+                    self.session_repository.bulk_update_last_activity(pending)
+                except Exception:
+                    # Put the touches back so the next flush retries them
+                    with self._lock:
+                        for token, at in pending.items():
+                            self._pending.setdefault(token, at)
+                    raise
+
+    def start(self) -> None:
+        """Flush from a background thread of this process, unless one is running"""
+        with self._start_lock:
+            pid = os.getpid()
+            if self._pid == pid:
+                return
+            if self._pid is not None:
+                # Forked: the parent writes the touches it buffered, and its thread did not survive the fork
+                with self._lock:
+                    self._pending, self._last_touch = {}, {}
+            self._pid = pid
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='session-activity-flush', daemon=True)
+            self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            if self._stop.is_set():
+                # shutdown() writes what is left
+                break
+            # The thread's own connection, so a failed write never touches a request's transaction
+            close_old_connections()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Failed to flush session activity")
+        close_old_connections()
+
+    def shutdown(self) -> None:
+        """Stop the background thread and write anything still pending"""
+        with self._start_lock:
+            thread = self._thread if self._pid == os.getpid() else None
+            self._thread = self._pid = None
+        if thread is not None:
+            self._stop.set()
+            self._wake.set()
+            thread.join()
+        self.flush()
+
+
+@process_singleton
+def get_activity_tracker() -> SessionActivityTracker:
+    """Return the process-wide session activity tracker"""
+    tracker = SessionActivityTracker(
+        IndexedSessionRepository(DjangoSessionRepositoryWithGateway(), get_session_index())
+    )
+    # Write what is still buffered when the process exits
+    atexit.register(tracker.shutdown)
+    return tracker
@@ -0,0 +1,203 @@
+"""
+Async Django repository implementations using the DTO/Gateway pattern.
+These mirror the synchronous repositories but use Django's async ORM API,
+so ASGI views can query without a thread-pool hop per call.
+"""
+
+from typing import Iterable, List, Optional, Set, Tuple
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+from django.utils import timezone
+
+from ..domain.entities import DeviceEntity, SessionEntity
+from ..domain.repositories import AsyncDeviceRepository, AsyncSessionRepository, Cursor
+from ..models import Device, Session
+from .cached_repositories import CachedDeviceRepository, get_device_cache, invalidate_devices, remember_devices
+from .django_repositories_with_gateway import (
+    BULK_BATCH_SIZE, DjangoDeviceRepositoryWithGateway, deactivate_sessions, known_user_filter, paginate_queryset
+)
+from .gateways import DeviceGateway, SessionGateway
+from .session_index import invalidate_sessions
+
+
+async def aresolve_user_ids(usernames: Iterable[str]) -> dict:
+    """Map usernames to user ids with a single query"""
+    usernames = set(usernames)
+    user_ids = {
+        username: user_id
+        async for username, user_id in User.objects.filter(username__in=usernames).values_list('username', 'id')
+    }
+    missing = usernames - user_ids.keys()
+    if missing:
+        raise User.DoesNotExist(f"Unknown users: {', '.join(sorted(missing))}")
+    return user_ids
+
+
+# transaction.on_commit is sync only, so cached devices and sessions are written and dropped off the event loop
+aremember_devices = sync_to_async(remember_devices)
+ainvalidate_devices = sync_to_async(invalidate_devices)
+ainvalidate_sessions = sync_to_async(invalidate_sessions)
+
+
+class DjangoAsyncDeviceRepositoryWithGateway(AsyncDeviceRepository):
+    """Async device repository implementation using DTO/Gateway pattern"""
+
+    async def add(self, device: DeviceEntity) -> DeviceEntity:
+        """Add a new device"""
+        user = await User.objects.aget(username=device.username)
+
+        dto = DeviceGateway.entity_to_dto(device, user.id)
+        django_device = DeviceGateway.dto_to_model(dto)
+        await django_device.asave()
+
+        return DeviceGateway.model_to_entity(django_device, username=user.username)
+
+    async def get_or_register(self, device: DeviceEntity) -> Tuple[DeviceEntity, bool]:
+        """Add a device unless the user already has one with that name, returning (device, created)"""
+        # The ORM has no async INSERT ... ON CONFLICT, so this one hops to a thread
+        return await sync_to_async(DjangoDeviceRepositoryWithGateway().get_or_register)(device)
+
+    async def find_by_id(self, device_id: int) -> Optional[DeviceEntity]:
+        """Find device by ID, from the shared device cache when possible"""
+        cache = get_device_cache()
+        key = CachedDeviceRepository.id_key(device_id)
+        row = await cache.aget(key)
+        if row is None:
+            rows = [row async for row in Device.objects.filter(id=device_id).values_list(*DeviceGateway.ROW_FIELDS)]
+            if not rows:
+                return None
+            row = rows[0]
+            await aremember_devices({key: row}, cache)
+        return DeviceGateway.rows_to_entities([row])[0]
+
+    async def find_by_user(self, username: str, after: Optional[Cursor] = None,
+                           limit: Optional[int] = None) -> List[DeviceEntity]:
+        """Find devices for a user, newest first, optionally after a (created_at, id) cursor"""
+        devices = paginate_queryset(Device.objects.filter(user__username=username), 'created_at', after, limit)
+        rows = [row async for row in devices.values_list(*DeviceGateway.ROW_FIELDS)]
+        return DeviceGateway.rows_to_entities(rows)
+
+    async def find_by_name_and_user(self, name: str, username: str) -> Optional[DeviceEntity]:
+        """Find device by name and user"""
+        devices = Device.objects.filter(name=name, user__username=username)
+        rows = [row async for row in devices.values_list(*DeviceGateway.ROW_FIELDS)]
+        entities = DeviceGateway.rows_to_entities(rows)
+        return entities[0] if entities else None
+
+    async def find_existing_names(self, username: str, names: List[str]) -> Set[str]:
+        """Return which of the given device names the user already has"""
+        devices = Device.objects.filter(user__username=username, name__in=names).order_by()
+        return {name async for name in devices.values_list('name', flat=True)}
+
+    async def update(self, device: DeviceEntity) -> DeviceEntity:
+        """Update an existing device with a single UPDATE of its changed fields"""
+        values = DeviceGateway.entity_to_update_values(device)
+        if not values:
+            return device
+
+        values['updated_at'] = timezone.now()
+        devices = Device.objects.filter(known_user_filter(values, device.username), id=device.device_id)
+        if not await devices.aupdate(**values):
+            if 'user_id' in values and not await User.objects.filter(username=device.username).aexists():
+                raise User.DoesNotExist(f"User {device.username} not found")
+            raise Device.DoesNotExist(f"Device {device.device_id} does not exist")
+        await ainvalidate_devices([device.device_id])
+
+        device.updated_at = values['updated_at']
+        device.mark_clean()
+        return device
+
+    async def delete(self, device_id: int) -> None:
+        """Delete device by ID"""
+        await Device.objects.filter(id=device_id).adelete()
+        await ainvalidate_devices([device_id])
+
+    async def bulk_add(self, devices: List[DeviceEntity]) -> List[DeviceEntity]:
+        """Add many devices, resolving their users in one query"""
+        user_ids = await aresolve_user_ids(device.username for device in devices)
+        django_devices = [
+            DeviceGateway.dto_to_model(DeviceGateway.entity_to_dto(device, user_ids[device.username]))
+            for device in devices
+        ]
+        await Device.objects.abulk_create(django_devices, batch_size=BULK_BATCH_SIZE)
+        return [
+            DeviceGateway.model_to_entity(django_device, username=device.username)
+            for device, django_device in zip(devices, django_devices)
+        ]
+
+    async def bulk_deactivate(self, device_ids: List[int]) -> None:
+        """Deactivate many devices in a single UPDATE"""
+        await Device.objects.filter(id__in=device_ids).aupdate(is_active=False, updated_at=timezone.now())
+        await ainvalidate_devices(device_ids)
+
+
+class DjangoAsyncSessionRepositoryWithGateway(AsyncSessionRepository):
+    """Async session repository implementation using DTO/Gateway pattern"""
+
+    async def add(self, session: SessionEntity) -> SessionEntity:
+        """Add a new session"""
+        user = await User.objects.aget(username=session.username)
+
+        device_id = None
+        device_name = None
+        if session.device_name:
+            try:
+                device = await Device.objects.aget(name=session.device_name, user=user)
+                device_id = device.id
+                device_name = device.name
+            except Device.DoesNotExist:
+                pass
+
+        dto = SessionGateway.entity_to_dto(session, user.id, device_id)
+        django_session = SessionGateway.dto_to_model(dto)
+        await django_session.asave()
+
+        return SessionGateway.model_to_entity(django_session, username=user.username, device_name=device_name)
+
+    async def find_by_token(self, token: str) -> Optional[SessionEntity]:
+        """Find session by token"""
+        sessions = Session.objects.filter(session_token=token)
+        rows = [row async for row in sessions.values_list(*SessionGateway.ROW_FIELDS)]
+        entities = SessionGateway.rows_to_entities(rows)
+        return entities[0] if entities else None
+
+    async def find_by_user(self, username: str, after: Optional[Cursor] = None,
+                           limit: Optional[int] = None) -> List[SessionEntity]:
+        """Find sessions for a user, most recently active first"""
+        sessions = paginate_queryset(Session.objects.filter(user__username=username), 'last_activity', after, limit)
+        rows = [row async for row in sessions.values_list(*SessionGateway.ROW_FIELDS)]
+        return SessionGateway.rows_to_entities(rows)
+
+    async def find_active_by_user(self, username: str, after: Optional[Cursor] = None,
+                                  limit: Optional[int] = None) -> List[SessionEntity]:
+        """Find active sessions for a user, most recently active first"""
+        sessions = paginate_queryset(
+            Session.objects.filter(user__username=username, is_active=True), 'last_activity', after, limit
+        )
+        rows = [row async for row in sessions.values_list(*SessionGateway.ROW_FIELDS)]
+        return SessionGateway.rows_to_entities(rows)
+
+    async def update_last_activity(self, token: str) -> None:
+        """Update session last activity"""
+        await Session.objects.filter(session_token=token).aupdate(last_activity=timezone.now())
+        await ainvalidate_sessions([token])
+
+    async def deactivate(self, token: str) -> None:
+        """Deactivate session"""
+        await Session.objects.filter(session_token=token).aupdate(is_active=False)
+        await ainvalidate_sessions([token])
+
+    async def deactivate_user_sessions(self, username: str) -> List[str]:
+        """Deactivate all active sessions of a user, returning their tokens"""
+        user_id = await User.objects.filter(username=username).values_list('id', flat=True).afirst()
+        if user_id is None:
+            return []
+        # The ORM has no async UPDATE ... RETURNING, so this one hops to a thread
+        tokens = await sync_to_async(deactivate_sessions)(user_id=user_id)
+        await ainvalidate_sessions(tokens)
+        return tokens
+
+    async def delete(self, token: str) -> None:
+        """Delete session by token"""
+        await Session.objects.filter(session_token=token).adelete()
+        await ainvalidate_sessions([token])
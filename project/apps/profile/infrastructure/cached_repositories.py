@@ -0,0 +1,236 @@
+"""
+Read-through cache for device lookups.
+CachedDeviceRepository decorates another DeviceRepository: find_by_id and
+find_by_name_and_user are answered from a cache and fall back to the wrapped
+repository on a miss, while writes go to the wrapped repository and then
+invalidate what they touched.
+
+Devices are cached by id as their gateway row tuple (see DeviceGateway.ROW_FIELDS);
+the (username, name) key only stores the device id, and is checked against
+the cached row on read, so renaming a device never leaves a stale name entry.
+
+Configured through the ``PROFILE_DEVICE_CACHE`` setting (see key_value_cache
+for the keys).
+"""
+
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from django.db import transaction
+
+from ..domain.entities import DeviceEntity
+from ..domain.repositories import Cursor, DeviceRepository
+from ..models import Device
+from .django_repositories_with_gateway import register_devices
+from .gateways import DeviceGateway
+from .key_value_cache import KeyValueCache, build_cache
+from .shared_state import invalidate_now_and_on_commit, process_singleton
+from .unit_of_work import current_unit_of_work
+
+
+class KeyLocks:
+    """One lock per key, created on demand and dropped once nobody holds or waits for it"""
+
+    def __init__(self):
+        self._locks: Dict[str, list] = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def hold(self, key: str):
+        with self._lock:
+            entry = self._locks.setdefault(key, [threading.Lock(), 0])
+            entry[1] += 1
+        try:
+            with entry[0]:
+                yield
+        finally:
+            with self._lock:
+                entry[1] -= 1
+                if not entry[1]:
+                    del self._locks[key]
+
+
+class CachedDeviceRepository(DeviceRepository):
+    """DeviceRepository decorator that caches single-device lookups"""
+
+    def __init__(self, repository: DeviceRepository, cache: KeyValueCache):
+        self.repository = repository
+        self.cache = cache
+        self.hits = 0
+        self.misses = 0
+        self._key_locks = KeyLocks()
+        self._stats_lock = threading.Lock()
+
+    @staticmethod
+    def id_key(device_id: int) -> str:
+        return f'device:{device_id}'
+
+    @staticmethod
+    def name_key(name: str, username: str) -> str:
+        return f'device:{username}:{name}'
+
+    def stats(self) -> dict:
+        """Hit and miss counters since the repository was created"""
+        with self._stats_lock:
+            hits, misses = self.hits, self.misses
+        total = hits + misses
+        return {'hits': hits, 'misses': misses, 'hit_rate': hits / total if total else 0.0}
+
+    def find_by_id(self, device_id: int) -> Optional[DeviceEntity]:
+        """Find device by ID, from the cache when possible"""
+        uow = current_unit_of_work()
+        device = uow.device(device_id) if uow is not None else None
+        if device is not None:
+            return device
+
+        key = self.id_key(device_id)
+        row = self.cache.get(key)
+        if row is None:
+            # Only one thread per key loads from the database; the others wait and reread the cache
+            with self._key_locks.hold(key):
+                row = self.cache.get(key)
+                if row is None:
+                    self._count(hit=False)
+                    device = self.repository.find_by_id(device_id)
+                    if device is not None:
+                        self._remember({key: self._to_row(device)})
+                    return device
+        self._count(hit=True)
+        return register_devices(DeviceGateway.rows_to_entities([row]))[0]
+
+    def find_by_name_and_user(self, name: str, username: str) -> Optional[DeviceEntity]:
+        """Find device by name and user, from the cache when possible"""
+        device_id = self.cache.get(self.name_key(name, username))
+        if device_id is not None:
+            device = self.find_by_id(device_id)
+            if device is not None and device.name == name and device.username == username:
+                return device
+
+        device = self.repository.find_by_name_and_user(name, username)
+        if device is not None:
+            self._remember({
+                self.name_key(name, username): device.device_id,
+                self.id_key(device.device_id): self._to_row(device),
+            })
+        return device
+
+    def find_by_user(self, username: str, after: Optional[Cursor] = None,
+                     limit: Optional[int] = None) -> List[DeviceEntity]:
+        """Find devices for a user (not cached)"""
+        return self.repository.find_by_user(username, after=after, limit=limit)
+
+    def iter_by_user(self, username: str, chunk_size: int = 1000) -> Iterator[DeviceEntity]:
+        """Yield all devices for a user (not cached)"""
+        return self.repository.iter_by_user(username, chunk_size=chunk_size)
+
+    def iter_active_by_user(self, username: str, chunk_size: int = 1000) -> Iterator[DeviceEntity]:
+        """Yield active devices for a user (not cached)"""
+        return self.repository.iter_active_by_user(username, chunk_size=chunk_size)
+
+    def iter_all(self, chunk_size: int = 1000) -> Iterator[DeviceEntity]:
+        """Yield every device (not cached)"""
+        return self.repository.iter_all(chunk_size=chunk_size)
+
+    def find_existing_names(self, username: str, names: List[str]) -> Set[str]:
+        """Return which of the given device names the user already has (not cached)"""
+        return self.repository.find_existing_names(username, names)
+
+    def add(self, device: DeviceEntity) -> DeviceEntity:
+        """Add a new device"""
+        return self.repository.add(device)
+
+    def get_or_register(self, device: DeviceEntity) -> Tuple[DeviceEntity, bool]:
+        """Add a device unless the user already has one with that name"""
+        return self.repository.get_or_register(device)
+
+    def bulk_add(self, devices: List[DeviceEntity]) -> List[DeviceEntity]:
+        """Add many devices"""
+        return self.repository.bulk_add(devices)
+
+    def bulk_register(self, devices: List[DeviceEntity]) -> List[DeviceEntity]:
+        """Add many devices, skipping names their user already has"""
+        return self.repository.bulk_register(devices)
+
+    def update(self, device: DeviceEntity) -> DeviceEntity:
+        """Update a device and drop its cached copy"""
+        device = self.repository.update(device)
+        self._invalidate([device.device_id])
+        return device
+
+    def set_active_status(self, name: str, username: str, is_active: bool) -> None:
+        """Set device active status and drop its cached copy"""
+        device = self.find_by_name_and_user(name, username)
+        self.repository.set_active_status(name, username, is_active)
+        if device is not None:
+            self._invalidate([device.device_id])
+
+    def delete(self, device_id: int) -> None:
+        """Delete device by ID and drop its cached copy"""
+        self.repository.delete(device_id)
+        self._invalidate([device_id])
+
+    def delete_by_id(self, device_id: int) -> None:
+        """Delete device by ID and drop its cached copy"""
+        self.repository.delete_by_id(device_id)
+        self._invalidate([device_id])
+
+    def bulk_deactivate(self, device_ids: List[int]) -> None:
+        """Deactivate many devices and drop their cached copies"""
+        self.repository.bulk_deactivate(device_ids)
+        self._invalidate(device_ids)
+
+    def bulk_delete(self, device_ids: List[int]) -> None:
+        """Delete many devices and drop their cached copies"""
+        self.repository.bulk_delete(device_ids)
+        self._invalidate(device_ids)
+
+    def _remember(self, entries: dict) -> None:
+        remember_devices(entries, self.cache)
+
+    def _invalidate(self, device_ids: Iterable[int]) -> None:
+        invalidate_devices(device_ids, self.cache)
+
+    def _count(self, hit: bool) -> None:
+        with self._stats_lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    @staticmethod
+    def _to_row(device: DeviceEntity) -> tuple:
+        return (
+            device.name, device.device_type, device.platform, device.username,
+            device.is_active, device.device_id, device.created_at, device.updated_at
+        )
+
+
+@process_singleton
+def get_device_cache() -> KeyValueCache:
+    """Return the process-wide device cache"""
+    return build_cache('PROFILE_DEVICE_CACHE', key_prefix='profile:')
+
+
+def invalidate_devices(device_ids: Iterable[int], cache: Optional[KeyValueCache] = None) -> None:
+    """Drop cached devices, now and again once the current transaction commits"""
+    cache = cache if cache is not None else get_device_cache()
+    keys = [CachedDeviceRepository.id_key(device_id) for device_id in device_ids]
+    invalidate_now_and_on_commit(cache.invalidate, keys)
+
+
+def remember_devices(entries: dict, cache: Optional[KeyValueCache] = None) -> None:
+    """Write device cache entries once the current transaction commits"""
+    cache = cache if cache is not None else get_device_cache()
+
+    def write():
+        for key, value in entries.items():
+            cache.set(key, value)
+
+    # Rows read inside a transaction may never be committed; on_commit runs at once outside atomic blocks
+    transaction.on_commit(write)
+
+
+def user_device_ids(username: str) -> List[int]:
+    """Return the ids of a user's devices"""
+    return list(Device.objects.filter(user__username=username).values_list('id', flat=True))
@@ -3,13 +3,153 @@ Django repository implementations using the DTO/Gateway pattern.
 These repositories use gateways to convert between entities and Django models.
 """
 
-from typing import List, Optional
+from datetime import datetime
+from itertools import islice
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
 from django.contrib.auth.models import User
+from django.db import IntegrityError, connections, transaction
+from django.db.models import Case, DateTimeField, Exists, Q, Subquery, Value, When
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
 
-from ..domain.entities import UserEntity, DeviceEntity, SessionEntity
-from ..domain.repositories import UserRepository, DeviceRepository, SessionRepository
+from ..domain.entities import UserEntity, DeviceEntity, SessionEntity, SessionBatch, LoginCredentials
+from ..domain.repositories import Cursor, UserRepository, DeviceRepository, SessionRepository
 from ..models import Device, Session
 from .gateways import UserGateway, DeviceGateway, SessionGateway
+from .password_hashing import get_hashing_pool
+from .unit_of_work import current_unit_of_work
+
+
+BULK_BATCH_SIZE = 500
+
+
+def supports_returning_upserts(connection) -> bool:
+    """
+    Whether the database runs INSERT ... ON CONFLICT (columns) DO NOTHING and
+    UPDATE ... RETURNING as PostgreSQL spells them (PostgreSQL, SQLite 3.35+)
+    """
+    features = connection.features
+    return features.can_return_rows_from_bulk_insert and features.supports_update_conflicts_with_target
+
+
+def resolve_user_ids(usernames: Iterable[str]) -> Dict[str, int]:
+    """Map usernames to user ids with a single query"""
+    usernames = set(usernames)
+    user_ids = dict(User.objects.filter(username__in=usernames).values_list('username', 'id'))
+    missing = usernames - user_ids.keys()
+    if missing:
+        raise User.DoesNotExist(f"Unknown users: {', '.join(sorted(missing))}")
+    return user_ids
+
+
+def resolve_user_id(username: str) -> int:
+    """Map a username to its user id, reusing the active unit of work's lookup"""
+    uow = current_unit_of_work()
+    if uow is not None:
+        return uow.user_id(username)
+    return User.objects.values_list('id', flat=True).get(username=username)
+
+
+def known_user_filter(values: dict, username: str) -> Q:
+    """
+    Filter for an UPDATE of entity_to_update_values that moves a row to a user
+    by name: it matches no row for an unknown username, so the user_id
+    subquery never writes NULL
+    """
+    if 'user_id' not in values:
+        return Q()
+    return Q(Exists(User.objects.filter(username=username)))
+
+
+def register_devices(devices: List[DeviceEntity]) -> List[DeviceEntity]:
+    """Put devices in the active unit of work's identity map"""
+    uow = current_unit_of_work()
+    return uow.register_devices(devices) if uow is not None else devices
+
+
+def register_sessions(sessions: List[SessionEntity]) -> List[SessionEntity]:
+    """Put sessions in the active unit of work's identity map"""
+    uow = current_unit_of_work()
+    return uow.register_sessions(sessions) if uow is not None else sessions
+
+
+def evict_devices(predicate: Callable[[DeviceEntity], bool]) -> None:
+    """Drop devices a write may have changed from the active unit of work"""
+    uow = current_unit_of_work()
+    if uow is not None:
+        uow.evict_devices(predicate)
+
+
+def evict_sessions(predicate: Callable[[SessionEntity], bool]) -> None:
+    """Drop sessions a write may have changed from the active unit of work"""
+    uow = current_unit_of_work()
+    if uow is not None:
+        uow.evict_sessions(predicate)
+
+
+def evict_users(usernames: Set[str]) -> None:
+    """Drop deleted users, with their devices and sessions, from the active unit of work"""
+    uow = current_unit_of_work()
+    if uow is not None:
+        for username in usernames:
+            uow.user_ids.pop(username, None)
+        uow.evict_devices(lambda device: device.username in usernames)
+        uow.evict_sessions(lambda session: session.username in usernames)
+
+
+def deactivate_sessions(**filters) -> List[str]:
+    """
+    Deactivate the active sessions matching filters (columns of the session
+    table only, no joins) and return their tokens. Databases with RETURNING
+    (see supports_returning_upserts) run this as one UPDATE ... RETURNING;
+    others lock and read the tokens first, in the same transaction. Rows
+    already inactive are never rewritten.
+    """
+    queryset = Session.objects.filter(is_active=True, **filters)
+    connection = connections[queryset.db]
+    if supports_returning_upserts(connection):
+        where, params = queryset.query.get_compiler(connection=connection).compile(queryset.query.where)
+        quote = connection.ops.quote_name
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"UPDATE {quote(Session._meta.db_table)} SET {quote('is_active')} = %s "
+                f"WHERE {where} RETURNING {quote('session_token')}",
+                [False, *params]
+            )
+            tokens = [token for token, in cursor.fetchall()]
+    else:
+        with transaction.atomic(using=queryset.db, savepoint=False):
+            tokens = list(queryset.select_for_update().values_list('session_token', flat=True))
+            Session.objects.filter(session_token__in=tokens, is_active=True).update(is_active=False)
+
+    revoked = set(tokens)
+    evict_sessions(lambda session: session.session_token in revoked)
+    return tokens
+
+
+def paginate_queryset(queryset, field: str, after: Optional[Cursor], limit: Optional[int]):
+    """Order newest first by (field, id) and apply a keyset cursor and limit"""
+    queryset = queryset.order_by(f'-{field}', '-id')
+    if after is not None:
+        value, row_id = after
+        queryset = queryset.filter(Q(**{f'{field}__lt': value}) | Q(**{field: value, 'id__lt': row_id}))
+    if limit is not None:
+        queryset = queryset[:limit]
+    return queryset
+
+
+def iter_entities(queryset, gateway, chunk_size: int) -> Iterator:
+    """
+    Yield entities for a queryset chunk by chunk, reading rows through a
+    server-side cursor where the database supports one. Entities are not
+    added to the unit of work, so memory stays bounded by the chunk size.
+    """
+    rows = queryset.values_list(*gateway.ROW_FIELDS).iterator(chunk_size=chunk_size)
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            return
+        yield from gateway.rows_to_entities(chunk)
 
 
 class DjangoUserRepositoryWithGateway(UserRepository):
@@ -21,7 +161,7 @@ class DjangoUserRepositoryWithGateway(UserRepository):
         django_user = UserGateway.dto_to_model(dto)
         
         if user.password:
-            django_user.set_password(user.password)
+            django_user.password = get_hashing_pool().hash(user.password)
         
         django_user.save()
         
@@ -38,12 +178,100 @@ class DjangoUserRepositoryWithGateway(UserRepository):
     def delete(self, username: str) -> None:
         """Delete user by username"""
         User.objects.filter(username=username).delete()
+        evict_users({username})
 
     def change_password(self, username: str, new_password: str) -> None:
-        """Change user password"""
-        user = User.objects.get(username=username)
-        user.set_password(new_password)
-        user.save()
+        """Change user password with a single UPDATE"""
+        if not self.set_password_hash(username, get_hashing_pool().hash(new_password)):
+            raise User.DoesNotExist(f"User {username} not found")
+
+    def find_password_hash(self, username: str) -> Optional[str]:
+        """Return the stored password hash of an active user"""
+        return User.objects.filter(username=username, is_active=True).values_list('password', flat=True).first()
+
+    def set_password_hash(self, username: str, encoded: str, expected: Optional[str] = None) -> bool:
+        """
+        Store an already hashed password, only if the current hash is expected
+        when given; return whether the user was updated
+        """
+        users = User.objects.filter(username=username)
+        if expected is not None:
+            users = users.filter(password=expected)
+        return users.update(password=encoded) > 0
+
+    def find_login_credentials(self, username: str) -> Optional[LoginCredentials]:
+        """Read an active user's id, password hash and auth token key in one query"""
+        row = (
+            User.objects.filter(username=username, is_active=True)
+            .values_list('id', 'password', 'auth_token__key').first()
+        )
+        if row is None:
+            return None
+        user_id, password_hash, token = row
+        return LoginCredentials(username=username, user_id=user_id, password_hash=password_hash, token=token)
+
+    def record_login(self, credentials: LoginCredentials, session: SessionEntity) -> str:
+        """
+        Record a login as a new session and return the user's auth token key,
+        issuing a token first if the user has none, in one transaction. With
+        a token already issued this is a single INSERT: the session's device
+        is resolved by a subquery inside it.
+        """
+        with transaction.atomic(savepoint=False):
+            token = credentials.token or self._get_or_create_token(credentials.user_id)
+            device_id = None
+            if session.device_name:
+                device_id = Subquery(
+                    Device.objects.filter(user_id=credentials.user_id, name=session.device_name)
+                    .order_by().values('id')[:1]
+                )
+            Session.objects.create(
+                session_token=session.session_token, user_id=credentials.user_id, device_id=device_id,
+                ip_address=session.ip_address, user_agent=session.user_agent, is_active=session.is_active
+            )
+        return token
+
+    @staticmethod
+    def _get_or_create_token(user_id: int) -> str:
+        """Issue an auth token unless a concurrent login already did, and return its key"""
+        connection = connections[Token.objects.db]
+        if not supports_returning_upserts(connection):
+            return Token.objects.get_or_create(user_id=user_id)[0].key
+
+        quote = connection.ops.quote_name
+        key_column = quote(Token._meta.get_field('key').column)
+        user_column = quote(Token._meta.get_field('user').column)
+        created_column = quote(Token._meta.get_field('created').column)
+        timestamp = connection.ops.adapt_datetimefield_value(timezone.now())
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {quote(Token._meta.db_table)} ({key_column}, {user_column}, {created_column}) "
+                f"VALUES (%s, %s, %s) ON CONFLICT ({user_column}) DO NOTHING RETURNING {key_column}",
+                [Token.generate_key(), user_id, timestamp]
+            )
+            row = cursor.fetchone()
+        if row is not None:
+            return row[0]
+        return Token.objects.values_list('key', flat=True).get(user_id=user_id)
+
+    def bulk_add(self, users: List[UserEntity]) -> List[UserEntity]:
+        """Add many users in batched INSERTs, hashing their passwords in parallel"""
+        django_users = [UserGateway.dto_to_model(UserGateway.entity_to_dto(user)) for user in users]
+        with_password = [(django_user, user.password) for django_user, user in zip(django_users, users) if user.password]
+        hashes = get_hashing_pool().hash_many([password for _, password in with_password])
+        for (django_user, _), encoded in zip(with_password, hashes):
+            django_user.password = encoded
+
+        # Join an enclosing unit of work's transaction rather than nesting a savepoint
+        with transaction.atomic(savepoint=False):
+            User.objects.bulk_create(django_users, batch_size=BULK_BATCH_SIZE)
+
+        return [UserGateway.model_to_entity(django_user) for django_user in django_users]
+
+    def bulk_delete(self, usernames: List[str]) -> None:
+        """Delete many users by username"""
+        User.objects.filter(username__in=usernames).delete()
+        evict_users(set(usernames))
 
 
 class DjangoDeviceRepositoryWithGateway(DeviceRepository):
@@ -51,124 +279,398 @@ class DjangoDeviceRepositoryWithGateway(DeviceRepository):
 
     def add(self, device: DeviceEntity) -> DeviceEntity:
         """Add a new device"""
-        # Get user for the device
-        user = User.objects.get(username=device.username)
-        
-        dto = DeviceGateway.entity_to_dto(device, user.id)
+        dto = DeviceGateway.entity_to_dto(device, resolve_user_id(device.username))
         django_device = DeviceGateway.dto_to_model(dto)
         django_device.save()
-        
-        return DeviceGateway.model_to_entity(django_device)
+
+        return register_devices([DeviceGateway.model_to_entity(django_device, username=device.username)])[0]
+
+    def get_or_register(self, device: DeviceEntity) -> Tuple[DeviceEntity, bool]:
+        """
+        Insert a device unless the user already has one with that name, and
+        return (device, created). The insert resolves the user itself and skips
+        a conflicting row in the same statement (INSERT ... SELECT ... ON
+        CONFLICT DO NOTHING), so registering a new device is one round trip and
+        concurrent registrations of one name never raise IntegrityError; only a
+        duplicate pays a second query, to read the existing device.
+        """
+        connection = connections[Device.objects.db]
+        if not supports_returning_upserts(connection):
+            return self._get_or_create(device)
+
+        quote = connection.ops.quote_name
+        now = timezone.now()
+        timestamp = connection.ops.adapt_datetimefield_value(now)
+        values = {
+            'name': device.name, 'device_type': device.device_type, 'platform': device.platform,
+            'is_active': device.is_active, 'created_at': timestamp, 'updated_at': timestamp,
+        }
+        columns = [quote(Device._meta.get_field(field).column) for field in values]
+        user_column = quote(Device._meta.get_field('user').column)
+        sql = (
+            f"INSERT INTO {quote(Device._meta.db_table)} ({', '.join(columns)}, {user_column}) "
+            f"SELECT {', '.join(['%s'] * len(values))}, {quote(User._meta.pk.column)} "
+            f"FROM {quote(User._meta.db_table)} WHERE {quote(User._meta.get_field('username').column)} = %s "
+            f"ON CONFLICT ({quote(Device._meta.get_field('name').column)}, {user_column}) DO NOTHING "
+            f"RETURNING {quote(Device._meta.pk.column)}"
+        )
+        params = [*values.values(), device.username]
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            row = cursor.fetchone()
+
+        if row is not None:
+            created = DeviceEntity(
+                name=device.name, device_type=device.device_type, platform=device.platform,
+                username=device.username, is_active=device.is_active, device_id=row[0],
+                created_at=now, updated_at=now
+            )
+            created.mark_clean()
+            return register_devices([created])[0], True
+
+        existing = self.find_by_name_and_user(device.name, device.username)
+        if existing is None:
+            # Nothing inserted and nothing to return: the user does not exist
+            raise User.DoesNotExist(f"User {device.username} not found")
+        return existing, False
+
+    def _get_or_create(self, device: DeviceEntity) -> Tuple[DeviceEntity, bool]:
+        """get_or_register for databases without INSERT ... ON CONFLICT ... RETURNING"""
+        django_device, created = Device.objects.get_or_create(
+            name=device.name, user_id=resolve_user_id(device.username),
+            defaults={'device_type': device.device_type, 'platform': device.platform, 'is_active': device.is_active}
+        )
+        entity = DeviceGateway.model_to_entity(django_device, username=device.username)
+        return register_devices([entity])[0], created
 
     def find_by_name_and_user(self, name: str, username: str) -> Optional[DeviceEntity]:
         """Find device by name and user"""
-        try:
-            django_device = Device.objects.get(name=name, user__username=username)
-            return DeviceGateway.model_to_entity(django_device)
-        except Device.DoesNotExist:
-            return None
+        uow = current_unit_of_work()
+        if uow is not None:
+            device = uow.find_device(lambda device: device.name == name and device.username == username)
+            if device is not None:
+                return device
+        rows = Device.objects.filter(name=name, user__username=username).values_list(*DeviceGateway.ROW_FIELDS)
+        entities = register_devices(DeviceGateway.rows_to_entities(rows))
+        return entities[0] if entities else None
 
     def find_by_id(self, device_id: int) -> Optional[DeviceEntity]:
         """Find device by ID"""
-        try:
-            django_device = Device.objects.get(id=device_id)
-            return DeviceGateway.model_to_entity(django_device)
-        except Device.DoesNotExist:
-            return None
+        uow = current_unit_of_work()
+        device = uow.device(device_id) if uow is not None else None
+        if device is not None:
+            return device
+        rows = Device.objects.filter(id=device_id).values_list(*DeviceGateway.ROW_FIELDS)
+        entities = register_devices(DeviceGateway.rows_to_entities(rows))
+        return entities[0] if entities else None
+
+    def find_by_user(self, username: str, after: Optional[Cursor] = None,
+                     limit: Optional[int] = None) -> List[DeviceEntity]:
+        """Find devices for a user, newest first, optionally after a (created_at, id) cursor"""
+        devices = paginate_queryset(Device.objects.filter(user__username=username), 'created_at', after, limit)
+        return register_devices(DeviceGateway.rows_to_entities(devices.values_list(*DeviceGateway.ROW_FIELDS)))
 
-    def find_by_user(self, username: str) -> List[DeviceEntity]:
-        """Find all devices for a user"""
-        devices = Device.objects.filter(user__username=username)
-        return [DeviceGateway.model_to_entity(device) for device in devices]
+    def iter_by_user(self, username: str, chunk_size: int = 1000) -> Iterator[DeviceEntity]:
+        """Yield all devices for a user, newest first, loading chunk_size rows at a time"""
+        devices = Device.objects.filter(user__username=username).order_by('-created_at', '-id')
+        return iter_entities(devices, DeviceGateway, chunk_size)
+
+    def iter_active_by_user(self, username: str, chunk_size: int = 1000) -> Iterator[DeviceEntity]:
+        """Yield active devices for a user, newest first, loading chunk_size rows at a time"""
+        devices = Device.objects.filter(user__username=username, is_active=True).order_by('-created_at', '-id')
+        return iter_entities(devices, DeviceGateway, chunk_size)
+
+    def iter_all(self, chunk_size: int = 1000) -> Iterator[DeviceEntity]:
+        """Yield every device in id order, loading chunk_size rows at a time"""
+        return iter_entities(Device.objects.order_by('id'), DeviceGateway, chunk_size)
 
     def update(self, device: DeviceEntity) -> DeviceEntity:
-        """Update an existing device"""
-        # Get user for the device
-        user = User.objects.get(username=device.username)
-        
-        dto = DeviceGateway.entity_to_dto(device, user.id)
-        django_device = DeviceGateway.dto_to_model(dto)
-        django_device.save()
-        
-        return DeviceGateway.model_to_entity(django_device)
+        """Update an existing device with a single UPDATE of its changed fields"""
+        values = DeviceGateway.entity_to_update_values(device)
+        if not values:
+            return device
+
+        values['updated_at'] = timezone.now()
+        devices = Device.objects.filter(known_user_filter(values, device.username), id=device.device_id)
+        if not devices.update(**values):
+            if 'user_id' in values and not User.objects.filter(username=device.username).exists():
+                raise User.DoesNotExist(f"User {device.username} not found")
+            raise Device.DoesNotExist(f"Device {device.device_id} does not exist")
+
+        device.updated_at = values['updated_at']
+        device.mark_clean()
+        return register_devices([device])[0]
 
     def delete(self, device_id: int) -> None:
         """Delete device by ID"""
         Device.objects.filter(id=device_id).delete()
+        evict_devices(lambda device: device.device_id == device_id)
 
     def delete_by_name_and_user(self, name: str, username: str) -> None:
         """Delete device by name and user"""
         Device.objects.filter(name=name, user__username=username).delete()
+        evict_devices(lambda device: device.name == name and device.username == username)
 
     def delete_by_id(self, device_id: int) -> None:
         """Delete device by ID"""
         Device.objects.filter(id=device_id).delete()
+        evict_devices(lambda device: device.device_id == device_id)
 
     def set_active_status(self, name: str, username: str, is_active: bool) -> None:
         """Set device active status"""
-        device = Device.objects.get(name=name, user__username=username)
-        device.is_active = is_active
-        device.save()
+        updated = Device.objects.filter(name=name, user__username=username).update(
+            is_active=is_active, updated_at=timezone.now()
+        )
+        if not updated:
+            raise Device.DoesNotExist(f"Device '{name}' does not exist for user '{username}'")
+        evict_devices(lambda device: device.name == name and device.username == username)
+
+    def bulk_add(self, devices: List[DeviceEntity]) -> List[DeviceEntity]:
+        """Add many devices, resolving their users in one query"""
+        user_ids = resolve_user_ids(device.username for device in devices)
+        django_devices = [
+            DeviceGateway.dto_to_model(DeviceGateway.entity_to_dto(device, user_ids[device.username]))
+            for device in devices
+        ]
+
+        # Join an enclosing unit of work's transaction rather than nesting a savepoint
+        with transaction.atomic(savepoint=False):
+            Device.objects.bulk_create(django_devices, batch_size=BULK_BATCH_SIZE)
+
+        return register_devices([
+            DeviceGateway.model_to_entity(django_device, username=device.username)
+            for device, django_device in zip(devices, django_devices)
+        ])
+
+    def bulk_register(self, devices: List[DeviceEntity]) -> List[DeviceEntity]:
+        """
+        Add many devices and return them, skipping any name its user already
+        has. Callers drop the names they know exist first, so this is one
+        bulk INSERT; when a concurrent registration wins a name in between,
+        the INSERT rolls back to a savepoint and each device goes through
+        get_or_register instead.
+        """
+        try:
+            with transaction.atomic():
+                return self.bulk_add(devices)
+        except IntegrityError:
+            registered = [self.get_or_register(device) for device in devices]
+            return [device for device, created in registered if created]
+
+    def bulk_deactivate(self, device_ids: List[int]) -> None:
+        """Deactivate many devices in a single UPDATE"""
+        Device.objects.filter(id__in=device_ids).update(is_active=False, updated_at=timezone.now())
+        evict_devices(lambda device, ids=set(device_ids): device.device_id in ids)
+
+    def bulk_delete(self, device_ids: List[int]) -> None:
+        """Delete many devices by ID"""
+        Device.objects.filter(id__in=device_ids).delete()
+        evict_devices(lambda device, ids=set(device_ids): device.device_id in ids)
+
+    def find_existing_names(self, username: str, names: List[str]) -> Set[str]:
+        """Return which of the given device names the user already has"""
+        return set(
+            Device.objects.filter(user__username=username, name__in=names)
+            .order_by().values_list('name', flat=True)
+        )
 
 
 class DjangoSessionRepositoryWithGateway(SessionRepository):
     """Session repository implementation using DTO/Gateway pattern"""
 
+    ACTIVITY_BATCH_SIZE = 500
+
     def add(self, session: SessionEntity) -> SessionEntity:
         """Add a new session"""
-        # Get user for the session
-        user = User.objects.get(username=session.username)
-        
+        user_id = resolve_user_id(session.username)
+
         # Get device if specified
         device_id = None
+        device_name = None
         if session.device_name:
-            try:
-                device = Device.objects.get(name=session.device_name, user=user)
-                device_id = device.id
-            except Device.DoesNotExist:
-                pass
-        
-        dto = SessionGateway.entity_to_dto(session, user.id, device_id)
+            device = DjangoDeviceRepositoryWithGateway().find_by_name_and_user(session.device_name, session.username)
+            if device is not None:
+                device_id = device.device_id
+                device_name = device.name
+
+        dto = SessionGateway.entity_to_dto(session, user_id, device_id)
         django_session = SessionGateway.dto_to_model(dto)
         django_session.save()
-        
-        return SessionGateway.model_to_entity(django_session)
+
+        return register_sessions([
+            SessionGateway.model_to_entity(django_session, username=session.username, device_name=device_name)
+        ])[0]
 
     def find_by_token(self, token: str) -> Optional[SessionEntity]:
         """Find session by token"""
-        try:
-            django_session = Session.objects.get(session_token=token)
-            return SessionGateway.model_to_entity(django_session)
-        except Session.DoesNotExist:
-            return None
+        uow = current_unit_of_work()
+        session = uow.session(token) if uow is not None else None
+        if session is not None:
+            return session
+        rows = Session.objects.filter(session_token=token).values_list(*SessionGateway.ROW_FIELDS)
+        entities = register_sessions(SessionGateway.rows_to_entities(rows))
+        return entities[0] if entities else None
+
+    def find_by_user(self, username: str, after: Optional[Cursor] = None,
+                     limit: Optional[int] = None) -> List[SessionEntity]:
+        """Find sessions for a user, most recently active first, optionally after a (last_activity, id) cursor"""
+        sessions = paginate_queryset(Session.objects.filter(user__username=username), 'last_activity', after, limit)
+        return register_sessions(SessionGateway.rows_to_entities(sessions.values_list(*SessionGateway.ROW_FIELDS)))
+
+    def iter_by_user(self, username: str, chunk_size: int = 1000) -> Iterator[SessionEntity]:
+        """Yield all sessions for a user, most recently active first, loading chunk_size rows at a time"""
+        sessions = Session.objects.filter(user__username=username).order_by('-last_activity', '-id')
+        return iter_entities(sessions, SessionGateway, chunk_size)
 
-    def find_by_user(self, username: str) -> List[SessionEntity]:
-        """Find all sessions for a user"""
-        sessions = Session.objects.filter(user__username=username)
-        return [SessionGateway.model_to_entity(session) for session in sessions]
+    def iter_active_by_user(self, username: str, chunk_size: int = 1000) -> Iterator[SessionEntity]:
+        """Yield active sessions for a user, most recently active first, loading chunk_size rows at a time"""
+        sessions = Session.objects.filter(user__username=username, is_active=True).order_by('-last_activity', '-id')
+        return iter_entities(sessions, SessionGateway, chunk_size)
 
-    def find_active_by_user(self, username: str) -> List[SessionEntity]:
-        """Find all active sessions for a user"""
-        sessions = Session.objects.filter(user__username=username, is_active=True)
-        return [SessionGateway.model_to_entity(session) for session in sessions]
+    def iter_all(self, chunk_size: int = 1000) -> Iterator[SessionEntity]:
+        """Yield every session in id order, loading chunk_size rows at a time"""
+        return iter_entities(Session.objects.order_by('id'), SessionGateway, chunk_size)
+
+    def iter_batches(self, chunk_size: int = 10000) -> Iterator[SessionBatch]:
+        """Yield every session in id order as columnar batches of up to chunk_size rows"""
+        rows = Session.objects.order_by('id').values_list(*SessionGateway.ROW_FIELDS).iterator(chunk_size=chunk_size)
+        while True:
+            chunk = list(islice(rows, chunk_size))
+            if not chunk:
+                return
+            yield SessionGateway.rows_to_batch(chunk)
+
+    def find_active_by_user(self, username: str, after: Optional[Cursor] = None,
+                            limit: Optional[int] = None) -> List[SessionEntity]:
+        """Find active sessions for a user, most recently active first, optionally after a cursor"""
+        sessions = paginate_queryset(
+            Session.objects.filter(user__username=username, is_active=True), 'last_activity', after, limit
+        )
+        return register_sessions(SessionGateway.rows_to_entities(sessions.values_list(*SessionGateway.ROW_FIELDS)))
+
+    def update(self, session: SessionEntity) -> SessionEntity:
+        """Update an existing session with a single UPDATE of its changed fields"""
+        values = SessionGateway.entity_to_update_values(session)
+        if not values:
+            return session
+
+        values['last_activity'] = timezone.now()
+        sessions = Session.objects.filter(known_user_filter(values, session.username), id=session.session_id)
+        if not sessions.update(**values):
+            if 'user_id' in values and not User.objects.filter(username=session.username).exists():
+                raise User.DoesNotExist(f"User {session.username} not found")
+            raise Session.DoesNotExist(f"Session {session.session_id} does not exist")
+
+        session.last_activity = values['last_activity']
+        session.mark_clean()
+        return register_sessions([session])[0]
 
     def update_last_activity(self, token: str) -> None:
         """Update session last activity"""
-        from django.utils import timezone
         Session.objects.filter(session_token=token).update(last_activity=timezone.now())
+        evict_sessions(lambda session: session.session_token == token)
+
+    def bulk_update_last_activity(self, activity: Dict[str, datetime]) -> None:
+        """Set last activity for many sessions, one UPDATE per batch of tokens"""
+        tokens = list(activity)
+        for start in range(0, len(tokens), self.ACTIVITY_BATCH_SIZE):
+            batch = tokens[start:start + self.ACTIVITY_BATCH_SIZE]
+            Session.objects.filter(session_token__in=batch).update(
+                last_activity=Case(
+                    *[When(session_token=token, then=Value(activity[token])) for token in batch],
+                    output_field=DateTimeField()
+                )
+            )
+        evict_sessions(lambda session: session.session_token in activity)
 
     def deactivate(self, token: str) -> None:
         """Deactivate session"""
         Session.objects.filter(session_token=token).update(is_active=False)
+        evict_sessions(lambda session: session.session_token == token)
 
-    def deactivate_user_sessions(self, username: str) -> None:
-        """Deactivate all sessions for a user"""
-        Session.objects.filter(user__username=username).update(is_active=False)
+    def deactivate_user_sessions(self, username: str) -> List[str]:
+        """Deactivate all active sessions of a user, returning their tokens"""
+        try:
+            user_id = resolve_user_id(username)
+        except User.DoesNotExist:
+            return []
+        return deactivate_sessions(user_id=user_id)
+
+    def deactivate_device_sessions(self, device_id: int) -> List[str]:
+        """Deactivate all active sessions on a device, returning their tokens"""
+        return deactivate_sessions(device_id=device_id)
+
+    def deactivate_sessions_created_before(self, cutoff: datetime) -> List[str]:
+        """Deactivate all active sessions created before the cutoff, returning their tokens"""
+        return deactivate_sessions(created_at__lt=cutoff)
 
     def delete(self, token: str) -> None:
         """Delete session by token"""
         Session.objects.filter(session_token=token).delete()
+        evict_sessions(lambda session: session.session_token == token)
 
     def delete_inactive_sessions(self) -> None:
         """Delete all inactive sessions"""
         Session.objects.filter(is_active=False).delete()
+        evict_sessions(lambda session: not session.is_active)
+
+    def delete_inactive_batch(self, batch_size: int) -> int:
+        """Delete up to batch_size inactive sessions, returning how many were deleted"""
+        ids = list(Session.objects.filter(is_active=False).order_by().values_list('id', flat=True)[:batch_size])
+        if not ids:
+            return 0
+        deleted, _ = Session.objects.filter(id__in=ids, is_active=False).delete()
+        evict_sessions(lambda session: not session.is_active)
+        return deleted
+
+    def delete_idle_batch(self, last_activity_before: datetime, batch_size: int) -> int:
+        """Delete up to batch_size sessions idle since before the cutoff, returning how many were deleted"""
+        ids = list(
+            Session.objects.filter(last_activity__lt=last_activity_before)
+            .order_by().values_list('id', flat=True)[:batch_size]
+        )
+        if not ids:
+            return 0
+        deleted, _ = Session.objects.filter(id__in=ids, last_activity__lt=last_activity_before).delete()
+        evict_sessions(lambda session: session.last_activity < last_activity_before)
+        return deleted
+
+    def bulk_add(self, sessions: List[SessionEntity]) -> List[SessionEntity]:
+        """Add many sessions, resolving users and devices in one query each"""
+        user_ids = resolve_user_ids(session.username for session in sessions)
+        device_ids = dict(
+            ((user_id, name), device_id)
+            for user_id, name, device_id in Device.objects.filter(
+                user_id__in=user_ids.values(),
+                name__in={session.device_name for session in sessions if session.device_name}
+            ).order_by().values_list('user_id', 'name', 'id')
+        )
+
+        django_sessions = []
+        device_names = []
+        for session in sessions:
+            user_id = user_ids[session.username]
+            device_id = device_ids.get((user_id, session.device_name))
+            django_sessions.append(
+                SessionGateway.dto_to_model(SessionGateway.entity_to_dto(session, user_id, device_id))
+            )
+            device_names.append(session.device_name if device_id else None)
+
+        # Join an enclosing unit of work's transaction rather than nesting a savepoint
+        with transaction.atomic(savepoint=False):
+            Session.objects.bulk_create(django_sessions, batch_size=BULK_BATCH_SIZE)
+
+        return register_sessions([
+            SessionGateway.model_to_entity(django_session, username=session.username, device_name=device_name)
+            for session, django_session, device_name in zip(sessions, django_sessions, device_names)
+        ])
+
+    def bulk_deactivate(self, tokens: List[str]) -> None:
+        """Deactivate many sessions in a single UPDATE"""
+        Session.objects.filter(session_token__in=tokens).update(is_active=False)
+        evict_sessions(lambda session, tokens=set(tokens): session.session_token in tokens)
+
+    def bulk_delete(self, tokens: List[str]) -> None:
+        """Delete many sessions by token"""
+        Session.objects.filter(session_token__in=tokens).delete()
+        evict_sessions(lambda session, tokens=set(tokens): session.session_token in tokens)
@@ -3,14 +3,17 @@ Gateways for converting between domain entities, DTOs, and Django models.
 This implements the Gateway pattern to isolate domain logic from infrastructure concerns.
 """
 
-from typing import List, Optional
+from typing import Any, Dict, Iterable, List, Optional
 from django.contrib.auth.models import User
+from django.db.models import Subquery
 
-from ..domain.entities import UserEntity, DeviceEntity, SessionEntity
+from ..domain.entities import UserEntity, DeviceEntity, SessionEntity, SessionBatch
 from ..domain.dtos import UserDTO, DeviceDTO, SessionDTO
 from ..models import Device, Session
+from .instrumentation import instrumented
 
 
+@instrumented('gateway')
 class UserGateway:
     """Gateway for User entity/DTO/model conversions"""
 
@@ -79,9 +82,16 @@ class UserGateway:
         return UserGateway.dto_to_model(dto)
 
 
+@instrumented('gateway')
 class DeviceGateway:
     """Gateway for Device entity/DTO/model conversions"""
 
+    # Column list for values_list() reads, in DeviceEntity positional order
+    ROW_FIELDS = (
+        'name', 'device_type', 'platform', 'user__username',
+        'is_active', 'id', 'created_at', 'updated_at',
+    )
+
     @staticmethod
     def entity_to_dto(entity: DeviceEntity, user_id: Optional[int] = None) -> DeviceDTO:
         """Convert DeviceEntity to DeviceDTO"""
@@ -148,18 +158,53 @@ class DeviceGateway:
         )
 
     @staticmethod
-    def model_to_entity(model: Device) -> DeviceEntity:
-        """Convert Django Device model to DeviceEntity"""
-        return DeviceEntity(
+    def model_to_entity(model: Device, username: Optional[str] = None) -> DeviceEntity:
+        """
+        Convert Django Device model to DeviceEntity.
+        Pass ``username`` when it is already known (or select_related the user)
+        to avoid an extra query for ``model.user``.
+        """
+        entity = DeviceEntity(
             device_id=model.id,
             name=model.name,
             device_type=model.device_type,
             platform=model.platform,
-            username=model.user.username,
+            username=username if username is not None else model.user.username,
             is_active=model.is_active,
             created_at=model.created_at,
             updated_at=model.updated_at
         )
+        entity.mark_clean()
+        return entity
+
+    @staticmethod
+    def rows_to_entities(rows: Iterable[tuple]) -> List[DeviceEntity]:
+        """
+        Convert ``values_list(*DeviceGateway.ROW_FIELDS)`` rows to DeviceEntities
+        without instantiating Device models.
+        """
+        entities = []
+        for row in rows:
+            entity = DeviceEntity(*row)
+            entity.mark_clean(row)
+            entities.append(entity)
+        return entities
+
+    @staticmethod
+    def entity_to_update_values(entity: DeviceEntity) -> Dict[str, Any]:
+        """
+        Column values for a single-statement UPDATE of the fields changed since
+        the entity was loaded (every updatable field if it was never loaded).
+        """
+        changed = entity.changed_fields()
+        values = {
+            field: getattr(entity, field)
+            for field in ('name', 'device_type', 'platform', 'is_active')
+            if changed is None or field in changed
+        }
+        if changed is None or 'username' in changed:
+            values['user_id'] = Subquery(User.objects.filter(username=entity.username).values('id')[:1])
+        return values
 
     @staticmethod
     def entity_to_model_via_dto(entity: DeviceEntity, user_id: int) -> Device:
@@ -168,9 +213,16 @@ class DeviceGateway:
         return DeviceGateway.dto_to_model(dto)
 
 
+@instrumented('gateway')
 class SessionGateway:
     """Gateway for Session entity/DTO/model conversions"""
 
+    # Column list for values_list() reads, in SessionEntity positional order
+    ROW_FIELDS = (
+        'session_token', 'user__username', 'device__name', 'ip_address',
+        'user_agent', 'is_active', 'id', 'created_at', 'last_activity',
+    )
+
     @staticmethod
     def entity_to_dto(entity: SessionEntity, user_id: Optional[int] = None, 
                      device_id: Optional[int] = None) -> SessionDTO:
@@ -245,19 +297,66 @@ class SessionGateway:
         )
 
     @staticmethod
-    def model_to_entity(model: Session) -> SessionEntity:
-        """Convert Django Session model to SessionEntity"""
-        return SessionEntity(
+    def model_to_entity(model: Session, username: Optional[str] = None,
+                        device_name: Optional[str] = None) -> SessionEntity:
+        """
+        Convert Django Session model to SessionEntity.
+        Pass ``username``/``device_name`` when they are already known (or
+        select_related the user and device) to avoid extra queries.
+        """
+        if device_name is None and model.device_id:
+            device_name = model.device.name
+        entity = SessionEntity(
             session_id=model.id,
             session_token=model.session_token,
-            username=model.user.username,
-            device_name=model.device.name if model.device else None,
+            username=username if username is not None else model.user.username,
+            device_name=device_name,
             ip_address=model.ip_address,
             user_agent=model.user_agent,
             is_active=model.is_active,
             created_at=model.created_at,
             last_activity=model.last_activity
         )
+        entity.mark_clean()
+        return entity
+
+    @staticmethod
+    def rows_to_entities(rows: Iterable[tuple]) -> List[SessionEntity]:
+        """
+        Convert ``values_list(*SessionGateway.ROW_FIELDS)`` rows to SessionEntities
+        without instantiating Session models.
+        """
+        entities = []
+        for row in rows:
+            entity = SessionEntity(*row)
+            entity.mark_clean(row)
+            entities.append(entity)
+        return entities
+
+    @staticmethod
+    def rows_to_batch(rows: Iterable[tuple]) -> SessionBatch:
+        """Build a columnar SessionBatch from ROW_FIELDS rows"""
+        return SessionBatch.from_rows(rows)
+
+    @staticmethod
+    def entity_to_update_values(entity: SessionEntity) -> Dict[str, Any]:
+        """
+        Column values for a single-statement UPDATE of the fields changed since
+        the entity was loaded (every updatable field if it was never loaded).
+        """
+        changed = entity.changed_fields()
+        values = {
+            field: getattr(entity, field)
+            for field in ('session_token', 'ip_address', 'user_agent', 'is_active')
+            if changed is None or field in changed
+        }
+        if changed is None or 'username' in changed:
+            values['user_id'] = Subquery(User.objects.filter(username=entity.username).values('id')[:1])
+        if changed is None or changed & {'username', 'device_name'}:
+            values['device_id'] = Subquery(
+                Device.objects.filter(name=entity.device_name, user__username=entity.username).values('id')[:1]
+            ) if entity.device_name else None
+        return values
 
     @staticmethod
     def entity_to_model_via_dto(entity: SessionEntity, user_id: int, 
@@ -0,0 +1,117 @@
+"""
+Per-request timing instrumentation.
+While a RequestTimings recorder is active (see record_timings), instrumented
+methods add their wall time to a category and the database execute wrapper
+counts and times every query. Categories are inclusive: service time contains
+the gateway and database time spent inside the service call. Nested calls in
+the same category are only counted once, at the outermost call.
+
+Classes opt in where they are defined, with the @instrumented class
+decorator; nothing is patched at runtime. The wrappers only record while a
+recorder is active in the current context (the timing middleware makes one
+active per request when it is enabled), and otherwise cost one context
+variable lookup.
+"""
+
+import functools
+import inspect
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterable, Iterator, Optional
+
+
+CATEGORIES = ('db', 'gateway', 'service', 'serialize')
+
+_current: ContextVar[Optional['RequestTimings']] = ContextVar('profile_request_timings', default=None)
+
+
+class RequestTimings:
+    """Query count and seconds per category for one request"""
+
+    def __init__(self):
+        self.queries = 0
+        self.durations: Dict[str, float] = dict.fromkeys(CATEGORIES, 0.0)
+        self._active = set()
+
+    def execute_wrapper(self, execute, sql, params, many, context):
+        """Database execute wrapper (see connection.execute_wrapper) counting and timing queries"""
+        self.queries += 1
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.durations['db'] += time.perf_counter() - start
+
+
+def current_timings() -> Optional[RequestTimings]:
+    """Return the active recorder, if any"""
+    return _current.get()
+
+
+@contextmanager
+def record_timings() -> Iterator[RequestTimings]:
+    """Make a fresh recorder active for the duration of the block"""
+    timings = RequestTimings()
+    token = _current.set(timings)
+    try:
+        yield timings
+    finally:
+        _current.reset(token)
+
+
+def timed(func: Callable, category: str) -> Callable:
+    """Wrap func so its wall time is added to category of the active recorder"""
+    if getattr(func, '__instrumented__', False):
+        return func
+
+    if inspect.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            timings = _current.get()
+            if timings is None or category in timings._active:
+                return await func(*args, **kwargs)
+            timings._active.add(category)
+            start = time.perf_counter()
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                timings.durations[category] += time.perf_counter() - start
+                timings._active.discard(category)
+    else:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            timings = _current.get()
+            if timings is None or category in timings._active:
+                return func(*args, **kwargs)
+            timings._active.add(category)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                timings.durations[category] += time.perf_counter() - start
+                timings._active.discard(category)
+
+    wrapper.__instrumented__ = True
+    return wrapper
+
+
+def instrumented(category: str, names: Optional[Iterable[str]] = None) -> Callable[[type], type]:
+    """
+    Class decorator timing the public methods and properties defined on the
+    class (or only those in names) under category
+    """
+    def decorate(cls: type) -> type:
+        for name, attribute in list(vars(cls).items()):
+            if name.startswith('_') or (names is not None and name not in names):
+                continue
+            if isinstance(attribute, staticmethod):
+                setattr(cls, name, staticmethod(timed(attribute.__func__, category)))
+            elif isinstance(attribute, classmethod):
+                setattr(cls, name, classmethod(timed(attribute.__func__, category)))
+            elif isinstance(attribute, property):
+                setattr(cls, name, attribute.getter(timed(attribute.fget, category)))
+            elif inspect.isfunction(attribute):
+                setattr(cls, name, timed(attribute, category))
+        return cls
+    return decorate
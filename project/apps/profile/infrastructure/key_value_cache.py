@@ -0,0 +1,162 @@
+"""
+Key-value caches shared by the token and device caches.
+Both are configured through a setting of this shape:
+
+    {
+        'BACKEND': 'local',     # 'local', 'django' or None to disable
+        'TIMEOUT': 60,          # seconds an entry stays valid
+        'MAX_ENTRIES': 10000,   # 'local' backend only
+        'CACHE_ALIAS': 'default',  # 'django' backend only
+        'WORKERS': 1,           # server processes sharing the database
+    }
+
+The 'local' backend lives in one process, so an invalidation only reaches
+the worker that made it. With more than one worker the cache has to be a
+Django cache shared between processes (not locmem).
+"""
+
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Iterable, Optional
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.exceptions import ImproperlyConfigured
+
+
+DEFAULT_SETTINGS = {
+    'BACKEND': 'local',
+    'TIMEOUT': 60,
+    'MAX_ENTRIES': 10000,
+    'CACHE_ALIAS': 'default',
+    'WORKERS': 1,
+}
+
+
+class KeyValueCache(ABC):
+    """String-keyed cache with a per-entry TTL and explicit invalidation"""
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[Any]:
+        ...
+
+    @abstractmethod
+    def set(self, key: str, value: Any) -> None:
+        ...
+
+    @abstractmethod
+    def invalidate(self, keys: Iterable[str]) -> None:
+        ...
+
+    @abstractmethod
+    def clear(self) -> None:
+        ...
+
+    async def aget(self, key: str) -> Optional[Any]:
+        # In-process caches never block, so they can be read on the event loop directly
+        return self.get(key)
+
+
+class NullCache(KeyValueCache):
+    """Cache that never stores anything (caching disabled)"""
+
+    def get(self, key: str) -> Optional[Any]:
+        return None
+
+    def set(self, key: str, value: Any) -> None:
+        pass
+
+    def invalidate(self, keys: Iterable[str]) -> None:
+        pass
+
+    def clear(self) -> None:
+        pass
+
+
+class LocalCache(KeyValueCache):
+    """In-process LRU cache with a per-entry TTL"""
+
+    def __init__(self, timeout: float = 60, max_entries: int = 10000):
+        self.timeout = timeout
+        self.max_entries = max_entries
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any) -> None:
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + self.timeout)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, keys: Iterable[str]) -> None:
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+class DjangoCache(KeyValueCache):
+    """Cache stored in a Django cache backend (locmem, Redis, memcached, ...)"""
+
+    def __init__(self, timeout: float = 60, cache_alias: str = 'default', key_prefix: str = ''):
+        self.timeout = timeout
+        self.cache = caches[cache_alias]
+        self.key_prefix = key_prefix
+
+    def get(self, key: str) -> Optional[Any]:
+        return self.cache.get(self.key_prefix + key)
+
+    async def aget(self, key: str) -> Optional[Any]:
+        return await self.cache.aget(self.key_prefix + key)
+
+    def set(self, key: str, value: Any) -> None:
+        self.cache.set(self.key_prefix + key, value, self.timeout)
+
+    def invalidate(self, keys: Iterable[str]) -> None:
+        self.cache.delete_many([self.key_prefix + key for key in keys])
+
+    def clear(self) -> None:
+        # Only entries written through this cache are addressable by key;
+        # clearing the whole backend would drop unrelated data.
+        pass
+
+
+def build_cache(setting_name: str, key_prefix: str, **defaults) -> KeyValueCache:
+    """Build a cache from a setting with the keys described above"""
+    options = {**DEFAULT_SETTINGS, **defaults, **getattr(settings, setting_name, {})}
+    backend = options['BACKEND']
+    if options['WORKERS'] > 1 and _per_process(backend, options['CACHE_ALIAS']):
+        raise ImproperlyConfigured(
+            f"{setting_name} needs a Django cache shared between processes when WORKERS > 1; "
+            f"invalidations made by one worker never reach the others' '{backend}' cache"
+        )
+    if backend == 'local':
+        return LocalCache(options['TIMEOUT'], options['MAX_ENTRIES'])
+    if backend == 'django':
+        return DjangoCache(options['TIMEOUT'], options['CACHE_ALIAS'], key_prefix)
+    if backend is None:
+        return NullCache()
+    raise ValueError(f"Unknown {setting_name} backend '{backend}'")
+
+
+def _per_process(backend: Optional[str], cache_alias: str) -> bool:
+    return backend == 'local' or (backend == 'django' and isinstance(caches[cache_alias], LocMemCache))
@@ -0,0 +1,205 @@
+"""
+Password hashing off the request threads.
+PasswordHashingPool hashes and verifies passwords with the configured Django
+hashers (PASSWORD_HASHERS), which are CPU bound for tens to hundreds of
+milliseconds per call. With WORKERS = 0 hashing runs on the calling thread;
+hashlib's PBKDF2, argon2-cffi and bcrypt release the GIL while hashing, so
+other request threads still run, but every request thread can be hashing at
+once. With WORKERS > 0 hashing runs in that many worker processes instead, so
+a burst of logins uses at most WORKERS cores, and at most MAX_PENDING jobs
+are queued before callers wait for a slot. The async methods never block the
+event loop either way.
+
+verify() also reports whether the stored hash should be replaced (a hash from
+an older algorithm or with a different cost), so the login path can upgrade
+legacy hashes transparently.
+
+The Tuned* hashers are Django's own with their cost read from this setting.
+They keep Django's algorithm names, so existing hashes keep verifying and are
+upgraded on the next login when the cost changes. Argon2 and bcrypt need the
+argon2-cffi and bcrypt packages.
+
+Worker processes are spawned and load the project settings themselves, so
+override_settings in the parent does not reach them.
+
+Configured through the ``PROFILE_PASSWORD_HASHING`` setting:
+
+    PROFILE_PASSWORD_HASHING = {
+        'WORKERS': 0,                # hashing processes; 0 hashes on the calling thread
+        'MAX_PENDING': 64,           # queued jobs before callers wait
+        'PBKDF2_ITERATIONS': None,   # None keeps Django's default cost
+        'BCRYPT_ROUNDS': None,
+        'ARGON2_TIME_COST': None,
+        'ARGON2_MEMORY_COST': None,  # KiB
+        'ARGON2_PARALLELISM': None,
+    }
+"""
+
+import asyncio
+import multiprocessing
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Callable, List, Optional, Tuple
+
+import django
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.hashers import (
+    Argon2PasswordHasher,
+    BCryptSHA256PasswordHasher,
+    PBKDF2PasswordHasher,
+    make_password,
+    verify_password,
+)
+
+from .shared_state import process_singleton
+
+
+DEFAULT_SETTINGS = {
+    'WORKERS': 0,
+    'MAX_PENDING': 64,
+    'PBKDF2_ITERATIONS': None,
+    'BCRYPT_ROUNDS': None,
+    'ARGON2_TIME_COST': None,
+    'ARGON2_MEMORY_COST': None,
+    'ARGON2_PARALLELISM': None,
+}
+
+
+def _options() -> dict:
+    return {**DEFAULT_SETTINGS, **getattr(settings, 'PROFILE_PASSWORD_HASHING', {})}
+
+
+def _cost(name: str, default: int) -> int:
+    value = _options()[name]
+    return default if value is None else value
+
+
+class TunedPBKDF2PasswordHasher(PBKDF2PasswordHasher):
+    """PBKDF2PasswordHasher with PBKDF2_ITERATIONS iterations"""
+
+    @property
+    def iterations(self) -> int:
+        return _cost('PBKDF2_ITERATIONS', PBKDF2PasswordHasher.iterations)
+
+
+class TunedBCryptSHA256PasswordHasher(BCryptSHA256PasswordHasher):
+    """BCryptSHA256PasswordHasher with BCRYPT_ROUNDS rounds"""
+
+    @property
+    def rounds(self) -> int:
+        return _cost('BCRYPT_ROUNDS', BCryptSHA256PasswordHasher.rounds)
+
+
+class TunedArgon2PasswordHasher(Argon2PasswordHasher):
+    """Argon2PasswordHasher with the ARGON2_* time, memory and parallelism costs"""
+
+    @property
+    def time_cost(self) -> int:
+        return _cost('ARGON2_TIME_COST', Argon2PasswordHasher.time_cost)
+
+    @property
+    def memory_cost(self) -> int:
+        return _cost('ARGON2_MEMORY_COST', Argon2PasswordHasher.memory_cost)
+
+    @property
+    def parallelism(self) -> int:
+        return _cost('ARGON2_PARALLELISM', Argon2PasswordHasher.parallelism)
+
+
+def hash_password(password: str) -> str:
+    """Hash password with the preferred hasher"""
+    return make_password(password)
+
+
+def check_password(password: str, encoded: Optional[str]) -> Tuple[bool, bool]:
+    """
+    Return (valid, must_update) for password against an encoded hash. A
+    missing hash (an unknown user) still costs one hash, like a wrong password.
+    """
+    return verify_password(password, encoded or '')
+
+
+def _init_worker() -> None:
+    django.setup()
+
+
+class PasswordHashingPool:
+    """Runs password hashing inline or in a bounded pool of worker processes"""
+
+    def __init__(self, workers: int = 0, max_pending: int = 64):
+        self.workers = workers
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._slots = threading.BoundedSemaphore(max(max_pending, 1))
+        self._lock = threading.Lock()
+
+    def hash(self, password: str) -> str:
+        """Hash a password with the preferred hasher"""
+        return self._run(hash_password, password)
+
+    def hash_many(self, passwords: List[str]) -> List[str]:
+        """Hash many passwords, in parallel across the worker processes"""
+        if not self.workers:
+            return [hash_password(password) for password in passwords]
+        futures = [self._submit(hash_password, password) for password in passwords]
+        return [future.result() for future in futures]
+
+    def verify(self, password: str, encoded: Optional[str]) -> Tuple[bool, bool]:
+        """Return (valid, must_update) for password against an encoded hash"""
+        return self._run(check_password, password, encoded)
+
+    async def ahash(self, password: str) -> str:
+        """Hash a password without blocking the event loop"""
+        return await self._arun(hash_password, password)
+
+    async def averify(self, password: str, encoded: Optional[str]) -> Tuple[bool, bool]:
+        """Verify a password without blocking the event loop"""
+        return await self._arun(check_password, password, encoded)
+
+    def shutdown(self) -> None:
+        """Stop the worker processes; the pool starts again on next use"""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown()
+
+    def _run(self, func: Callable, *args):
+        if not self.workers:
+            return func(*args)
+        return self._submit(func, *args).result()
+
+    async def _arun(self, func: Callable, *args):
+        if not self.workers:
+            return await sync_to_async(func, thread_sensitive=False)(*args)
+        # Waiting for a free slot blocks, so it happens off the event loop
+        future = await sync_to_async(self._submit, thread_sensitive=False)(func, *args)
+        return await asyncio.wrap_future(future)
+
+    def _submit(self, func: Callable, *args) -> Future:
+        self._slots.acquire()
+        try:
+            future = self._get_executor().submit(func, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    # Spawned rather than forked: forking copies the parent's threads' locks and open connections
+                    self._executor = ProcessPoolExecutor(
+                        max_workers=self.workers,
+                        mp_context=multiprocessing.get_context('spawn'),
+                        initializer=_init_worker,
+                    )
+        return self._executor
+
+
+@process_singleton
+def get_hashing_pool() -> PasswordHashingPool:
+    """Return the process-wide password hashing pool"""
+    options = _options()
+    return PasswordHashingPool(options['WORKERS'], options['MAX_PENDING'])
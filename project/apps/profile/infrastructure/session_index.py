@@ -0,0 +1,313 @@
+"""
+In-process hot-token index for session lookups.
+IndexedSessionRepository decorates another SessionRepository: find_by_token
+is answered from a bounded LRU of recently used sessions, keyed on token and
+holding the gateway row (see SessionGateway.ROW_FIELDS) with the username and
+device name already resolved, and falls back to the wrapped repository on a
+miss. Writes go to the wrapped repository and then drop (or, for activity
+updates, refresh) the entries they touched.
+
+Deactivations return the tokens they revoked, so only those entries are
+dropped. The index is per process, so entries also expire after ``TIMEOUT``
+seconds: that bounds how long a write made by another process, or through
+another aggregate (a renamed device, say), can go unseen.
+
+Configured through the ``PROFILE_SESSION_INDEX`` setting:
+
+    PROFILE_SESSION_INDEX = {
+        'MAX_ENTRIES': 10000,   # 0 disables the index
+        'TIMEOUT': 30,          # seconds an entry stays valid
+    }
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import fields, replace
+from datetime import datetime
+from operator import attrgetter
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Set
+
+from django.conf import settings
+from django.db import transaction
+
+from ..domain.entities import SessionBatch, SessionEntity
+from ..domain.repositories import Cursor, SessionRepository
+from .django_repositories_with_gateway import register_sessions
+from .gateways import SessionGateway
+from .shared_state import invalidate_now_and_on_commit, process_singleton
+from .unit_of_work import current_unit_of_work
+
+
+DEFAULT_SETTINGS = {
+    'MAX_ENTRIES': 10000,
+    'TIMEOUT': 30,
+}
+
+_TOKEN = SessionGateway.ROW_FIELDS.index('session_token')
+_USERNAME = SessionGateway.ROW_FIELDS.index('user__username')
+_IS_ACTIVE = SessionGateway.ROW_FIELDS.index('is_active')
+_LAST_ACTIVITY = SessionGateway.ROW_FIELDS.index('last_activity')
+
+# SessionEntity fields are declared in ROW_FIELDS order
+_entity_to_row = attrgetter(*(field.name for field in fields(SessionEntity)))
+
+
+class SessionTokenIndex:
+    """Bounded LRU of session rows keyed on token, with a per-entry TTL and hit/eviction counters"""
+
+    def __init__(self, max_entries: int = 10000, timeout: float = 30):
+        self.max_entries = max_entries
+        self.timeout = timeout
+        self._entries: OrderedDict = OrderedDict()
+        self._by_user: Dict[str, Set[str]] = {}
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.inserts = 0
+        self.evictions = self.expirations = self.invalidations = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, token: str) -> Optional[tuple]:
+        """Return the row for token, or None on a miss"""
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is not None:
+                row, expires_at = entry
+                if expires_at > time.monotonic():
+                    self._entries.move_to_end(token)
+                    self.hits += 1
+                    return row
+                self._remove(token)
+                self.expirations += 1
+            self.misses += 1
+            return None
+
+    def put(self, session: SessionEntity) -> None:
+        """Index a session, evicting the least recently used entries beyond max_entries"""
+        if self.max_entries <= 0:
+            return
+        row = _entity_to_row(session)
+        with self._lock:
+            self._store(row, time.monotonic() + self.timeout)
+            self.inserts += 1
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def set_last_activity(self, activity: Dict[str, datetime]) -> None:
+        """Refresh last_activity of the indexed sessions among the given tokens"""
+        with self._lock:
+            for token, last_activity in activity.items():
+                entry = self._entries.get(token)
+                if entry is not None:
+                    row, expires_at = entry
+                    self._entries[token] = (
+                        row[:_LAST_ACTIVITY] + (last_activity,) + row[_LAST_ACTIVITY + 1:], expires_at
+                    )
+
+    def invalidate(self, tokens: Iterable[str]) -> None:
+        with self._lock:
+            for token in tokens:
+                if token in self._entries:
+                    self._remove(token)
+                    self.invalidations += 1
+
+    def invalidate_user(self, username: str) -> None:
+        with self._lock:
+            for token in list(self._by_user.get(username, ())):
+                self._remove(token)
+                self.invalidations += 1
+
+    def invalidate_where(self, predicate: Callable[[tuple], bool]) -> None:
+        """Drop every entry whose row matches predicate (a full scan, for purges)"""
+        with self._lock:
+            for token in [token for token, (row, _) in self._entries.items() if predicate(row)]:
+                self._remove(token)
+                self.invalidations += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._by_user.clear()
+
+    def stats(self) -> dict:
+        """Counters since the index was created, with the hit ratio and evictions per insert"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': self.hits / lookups if lookups else 0.0,
+                'inserts': self.inserts,
+                'evictions': self.evictions,
+                'eviction_rate': self.evictions / self.inserts if self.inserts else 0.0,
+                'expirations': self.expirations,
+                'invalidations': self.invalidations,
+            }
+
+    def _store(self, row: tuple, expires_at: float) -> None:
+        token = row[_TOKEN]
+        if token in self._entries:
+            self._remove(token)
+        self._entries[token] = (row, expires_at)
+        self._by_user.setdefault(row[_USERNAME], set()).add(token)
+
+    def _remove(self, token: str) -> None:
+        row, _ = self._entries.pop(token)
+        tokens = self._by_user.get(row[_USERNAME])
+        if tokens is not None:
+            tokens.discard(token)
+            if not tokens:
+                del self._by_user[row[_USERNAME]]
+
+
+class IndexedSessionRepository(SessionRepository):
+    """SessionRepository decorator that answers token lookups from a SessionTokenIndex"""
+
+    def __init__(self, repository: SessionRepository, index: SessionTokenIndex):
+        self.repository = repository
+        self.index = index
+
+    def find_by_token(self, token: str) -> Optional[SessionEntity]:
+        """Find session by token, from the index when possible"""
+        uow = current_unit_of_work()
+        session = uow.session(token) if uow is not None else None
+        if session is not None:
+            return session
+
+        row = self.index.get(token)
+        if row is None:
+            session = self.repository.find_by_token(token)
+            if session is not None:
+                self.index.put(session)
+            return session
+        return register_sessions(SessionGateway.rows_to_entities([row]))[0]
+
+    def find_by_user(self, username: str, after: Optional[Cursor] = None,
+                     limit: Optional[int] = None) -> List[SessionEntity]:
+        """Find sessions for a user (not indexed)"""
+        return self.repository.find_by_user(username, after=after, limit=limit)
+
+    def find_active_by_user(self, username: str, after: Optional[Cursor] = None,
+                            limit: Optional[int] = None) -> List[SessionEntity]:
+        """Find active sessions for a user (not indexed)"""
+        return self.repository.find_active_by_user(username, after=after, limit=limit)
+
+    def iter_by_user(self, username: str, chunk_size: int = 1000) -> Iterator[SessionEntity]:
+        """Yield all sessions for a user (not indexed)"""
+        return self.repository.iter_by_user(username, chunk_size=chunk_size)
+
+    def iter_active_by_user(self, username: str, chunk_size: int = 1000) -> Iterator[SessionEntity]:
+        """Yield active sessions for a user (not indexed)"""
+        return self.repository.iter_active_by_user(username, chunk_size=chunk_size)
+
+    def iter_all(self, chunk_size: int = 1000) -> Iterator[SessionEntity]:
+        """Yield every session (not indexed)"""
+        return self.repository.iter_all(chunk_size=chunk_size)
+
+    def iter_batches(self, chunk_size: int = 10000) -> Iterator[SessionBatch]:
+        """Yield every session in columnar batches (not indexed)"""
+        return self.repository.iter_batches(chunk_size=chunk_size)
+
+    def add(self, session: SessionEntity) -> SessionEntity:
+        """Add a new session and index it once committed, as it is usually looked up right away"""
+        session = self.repository.add(session)
+        # Indexing before the commit would leave a phantom session behind a rollback
+        added = replace(session)
+        transaction.on_commit(lambda: self.index.put(added))
+        return session
+
+    def bulk_add(self, sessions: List[SessionEntity]) -> List[SessionEntity]:
+        """Add many sessions (not indexed)"""
+        return self.repository.bulk_add(sessions)
+
+    def update(self, session: SessionEntity) -> SessionEntity:
+        """Update a session and drop its indexed copy"""
+        session = self.repository.update(session)
+        self._invalidate([session.session_token])
+        return session
+
+    def update_last_activity(self, token: str) -> None:
+        """Update session last activity and drop its indexed copy"""
+        self.repository.update_last_activity(token)
+        self._invalidate([token])
+
+    def bulk_update_last_activity(self, activity: Dict[str, datetime]) -> None:
+        """Set last activity for many sessions, refreshing their indexed copies in place"""
+        self.repository.bulk_update_last_activity(activity)
+        self.index.set_last_activity(activity)
+
+    def deactivate(self, token: str) -> None:
+        """Deactivate session and drop its indexed copy"""
+        self.repository.deactivate(token)
+        self._invalidate([token])
+
+    def deactivate_user_sessions(self, username: str) -> List[str]:
+        """Deactivate all active sessions of a user and drop their indexed copies"""
+        tokens = self.repository.deactivate_user_sessions(username)
+        self._invalidate(tokens)
+        return tokens
+
+    def deactivate_device_sessions(self, device_id: int) -> List[str]:
+        """Deactivate all active sessions on a device and drop their indexed copies"""
+        tokens = self.repository.deactivate_device_sessions(device_id)
+        self._invalidate(tokens)
+        return tokens
+
+    def deactivate_sessions_created_before(self, cutoff: datetime) -> List[str]:
+        """Deactivate all active sessions created before the cutoff and drop their indexed copies"""
+        tokens = self.repository.deactivate_sessions_created_before(cutoff)
+        self._invalidate(tokens)
+        return tokens
+
+    def delete(self, token: str) -> None:
+        """Delete session and drop its indexed copy"""
+        self.repository.delete(token)
+        self._invalidate([token])
+
+    def delete_inactive_sessions(self) -> None:
+        """Delete all inactive sessions and drop the inactive indexed copies"""
+        self.repository.delete_inactive_sessions()
+        self.index.invalidate_where(lambda row: not row[_IS_ACTIVE])
+
+    def delete_inactive_batch(self, batch_size: int) -> int:
+        """Delete a batch of inactive sessions and drop the inactive indexed copies"""
+        deleted = self.repository.delete_inactive_batch(batch_size)
+        if deleted:
+            self.index.invalidate_where(lambda row: not row[_IS_ACTIVE])
+        return deleted
+
+    def delete_idle_batch(self, last_activity_before: datetime, batch_size: int) -> int:
+        """Delete a batch of idle sessions and drop the idle indexed copies"""
+        deleted = self.repository.delete_idle_batch(last_activity_before, batch_size)
+        if deleted:
+            self.index.invalidate_where(lambda row: row[_LAST_ACTIVITY] < last_activity_before)
+        return deleted
+
+    def bulk_deactivate(self, tokens: List[str]) -> None:
+        """Deactivate many sessions and drop their indexed copies"""
+        self.repository.bulk_deactivate(tokens)
+        self._invalidate(tokens)
+
+    def bulk_delete(self, tokens: List[str]) -> None:
+        """Delete many sessions and drop their indexed copies"""
+        self.repository.bulk_delete(tokens)
+        self._invalidate(tokens)
+
+    def _invalidate(self, tokens: List[str]) -> None:
+        invalidate_sessions(tokens, self.index)
+
+
+@process_singleton
+def get_session_index() -> SessionTokenIndex:
+    """Return the process-wide session token index"""
+    options = {**DEFAULT_SETTINGS, **getattr(settings, 'PROFILE_SESSION_INDEX', {})}
+    return SessionTokenIndex(options['MAX_ENTRIES'], options['TIMEOUT'])
+
+
+def invalidate_sessions(tokens: List[str], index: Optional[SessionTokenIndex] = None) -> None:
+    """Drop indexed sessions, now and again once the current transaction commits"""
+    index = index if index is not None else get_session_index()
+    invalidate_now_and_on_commit(index.invalidate, tokens)
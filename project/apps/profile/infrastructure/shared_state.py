@@ -0,0 +1,46 @@
+"""
+Helpers for the process-wide state of the infrastructure layer: the token
+and device caches, the session index, the password hashing pool and the
+session activity tracker.
+"""
+
+import functools
+import threading
+from typing import Callable, List, TypeVar
+
+from django.db import transaction
+
+
+T = TypeVar('T')
+
+
+def process_singleton(factory: Callable[[], T]) -> Callable[[], T]:
+    """Turn a factory into a getter that builds its instance once per process, on first use"""
+    lock = threading.Lock()
+    instance = None
+
+    @functools.wraps(factory)
+    def get() -> T:
+        nonlocal instance
+        if instance is None:
+            with lock:
+                if instance is None:
+                    instance = factory()
+        return instance
+
+    return get
+
+
+def invalidate_now_and_on_commit(invalidate: Callable[[List], None], keys: List) -> None:
+    """
+    Drop cached entries for keys now, and again once the current transaction
+    commits (at once outside atomic blocks).
+
+    The first drop keeps this request from reading back its own stale entry.
+    Until the commit, though, other requests still read the old row from the
+    database and may cache it again; the second drop removes that copy.
+    """
+    if not keys:
+        return
+    invalidate(keys)
+    transaction.on_commit(lambda: invalidate(keys))
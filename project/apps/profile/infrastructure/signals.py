@@ -0,0 +1,43 @@
+"""
+Signal receivers keeping the token authentication cache in step with writes
+made outside the services (the admin, shell scripts, other apps). Bulk
+updates and raw SQL send no signals; the services invalidate those
+themselves.
+"""
+
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from .token_cache import invalidate_tokens, user_token_keys
+
+
+# Saving only other fields (e.g. last_login) keeps cached credentials valid
+CREDENTIAL_FIELDS = ('password', 'is_active', 'username')
+
+
+def _credentials(user) -> tuple:
+    # Read __dict__ directly so deferred fields are not loaded just to be compared
+    return tuple(user.__dict__.get(field) for field in CREDENTIAL_FIELDS)
+
+
+@receiver(post_save, sender=Token, dispatch_uid='profile_token_saved')
+@receiver(post_delete, sender=Token, dispatch_uid='profile_token_deleted')
+def token_changed(sender, instance, **kwargs):
+    invalidate_tokens([instance.key])
+
+
+@receiver(post_init, sender=get_user_model(), dispatch_uid='profile_user_loaded')
+def user_loaded(sender, instance, **kwargs):
+    instance._profile_credentials = _credentials(instance)
+
+
+@receiver(post_save, sender=get_user_model(), dispatch_uid='profile_user_saved')
+def user_saved(sender, instance, created, **kwargs):
+    loaded = getattr(instance, '_profile_credentials', None)
+    instance._profile_credentials = _credentials(instance)
+    # Only look the user's tokens up when a credential differs from the values it was loaded with
+    if created or loaded == instance._profile_credentials:
+        return
+    invalidate_tokens(user_token_keys(instance.username))
@@ -0,0 +1,121 @@
+"""
+Request-scoped unit of work.
+While a unit of work is active the gateway repositories share one identity
+map: each user id, device and session is loaded at most once, and every
+write made by the request is committed together in a single transaction.
+The map keeps the persisted field values, not entity instances, and every
+lookup builds a fresh entity from them, so a caller's unsaved changes never
+show up in another lookup as if they had been written.
+"""
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import fields
+from typing import Callable, Dict, Iterable, List, Optional, Type, TypeVar
+from django.contrib.auth.models import User
+from django.db import transaction
+
+from ..domain.entities import DeviceEntity, SessionEntity
+
+
+Entity = TypeVar('Entity', DeviceEntity, SessionEntity)
+
+_current: ContextVar[Optional['UnitOfWork']] = ContextVar('profile_unit_of_work', default=None)
+
+
+class UnitOfWork:
+    """Identity map of the users, devices and sessions loaded by one request"""
+
+    def __init__(self):
+        self.user_ids: Dict[str, int] = {}
+        # Persisted field values, in entity field order
+        self.devices: Dict[int, tuple] = {}
+        self.sessions: Dict[str, tuple] = {}
+
+    def user_id(self, username: str) -> int:
+        """Resolve a username to its id, querying only the first time"""
+        if username not in self.user_ids:
+            self.user_ids[username] = User.objects.values_list('id', flat=True).get(username=username)
+        return self.user_ids[username]
+
+    def device(self, device_id: int) -> Optional[DeviceEntity]:
+        """A fresh copy of a loaded device"""
+        row = self.devices.get(device_id)
+        return _hydrate(DeviceEntity, row) if row is not None else None
+
+    def session(self, token: str) -> Optional[SessionEntity]:
+        """A fresh copy of a loaded session"""
+        row = self.sessions.get(token)
+        return _hydrate(SessionEntity, row) if row is not None else None
+
+    def find_device(self, predicate: Callable[[DeviceEntity], bool]) -> Optional[DeviceEntity]:
+        """A fresh copy of a loaded device matching the predicate"""
+        devices = (_hydrate(DeviceEntity, row) for row in self.devices.values())
+        return next((device for device in devices if predicate(device)), None)
+
+    def register_devices(self, devices: Iterable[DeviceEntity]) -> List[DeviceEntity]:
+        """Remember the persisted state of devices just read or written"""
+        return self._register(self.devices, devices, lambda device: device.device_id)
+
+    def register_sessions(self, sessions: Iterable[SessionEntity]) -> List[SessionEntity]:
+        """Remember the persisted state of sessions just read or written"""
+        return self._register(self.sessions, sessions, lambda session: session.session_token)
+
+    def evict_devices(self, predicate: Callable[[DeviceEntity], bool]) -> None:
+        """Forget loaded devices matching the predicate"""
+        self._evict(self.devices, DeviceEntity, predicate)
+
+    def evict_sessions(self, predicate: Callable[[SessionEntity], bool]) -> None:
+        """Forget loaded sessions matching the predicate"""
+        self._evict(self.sessions, SessionEntity, predicate)
+
+    @staticmethod
+    def _register(identity_map: Dict, entities: Iterable[Entity], key: Callable[[Entity], object]) -> List[Entity]:
+        entities = list(entities)
+        for entity in entities:
+            persisted = getattr(entity, '_persisted', None)
+            identity_map[key(entity)] = persisted if persisted is not None else _values(entity)
+        return entities
+
+    @staticmethod
+    def _evict(identity_map: Dict, entity_class: Type[Entity], predicate: Callable[[Entity], bool]) -> None:
+        for key in [key for key, row in identity_map.items() if predicate(_hydrate(entity_class, row))]:
+            del identity_map[key]
+
+
+def _values(entity) -> tuple:
+    return tuple(getattr(entity, field.name) for field in fields(entity))
+
+
+def _hydrate(entity_class: Type[Entity], row: tuple) -> Entity:
+    entity = entity_class(*row)
+    entity.mark_clean(row)
+    return entity
+
+
+def current_unit_of_work() -> Optional[UnitOfWork]:
+    """The unit of work active in this context, if any"""
+    return _current.get()
+
+
+@contextmanager
+def unit_of_work(atomic: bool = True):
+    """
+    Run the block in a unit of work, committed as one transaction when atomic.
+    Nested blocks join the outer unit of work.
+    """
+    active = _current.get()
+    if active is not None:
+        yield active
+        return
+
+    uow = UnitOfWork()
+    token = _current.set(uow)
+    try:
+        if atomic:
+            with transaction.atomic():
+                yield uow
+        else:
+            yield uow
+    finally:
+        _current.reset(token)
@@ -0,0 +1,135 @@
+"""
+Async views for the device and session endpoints.
+DRF's APIView is synchronous, so these are plain Django async views that
+reuse the DRF authentication classes, serializers and pagination helpers
+and answer with the same payloads as their synchronous counterparts.
+"""
+
+import json
+
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse, JsonResponse
+from django.utils.decorators import method_decorator
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import exceptions, status
+from rest_framework.settings import api_settings
+from rest_framework.utils.encoders import JSONEncoder
+
+from .entity_serializers import DeviceEntitySerializer, SessionEntitySerializer
+from .pagination import paginate, parse_page_params
+from .serializers import CreateDeviceSerializer
+from ..use_cases.async_services_with_gateway import (
+    AsyncDeviceServiceWithGateway,
+    AsyncSessionServiceWithGateway
+)
+
+
+device_service = AsyncDeviceServiceWithGateway()
+session_service = AsyncSessionServiceWithGateway()
+
+
+def api_response(data, status_code=status.HTTP_200_OK):
+    return JsonResponse(data, status=status_code, encoder=JSONEncoder, safe=False)
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class AsyncAPIView(View):
+    """Async view that authenticates with the configured DRF authentication classes"""
+
+    authentication_classes = api_settings.DEFAULT_AUTHENTICATION_CLASSES
+
+    async def dispatch(self, request, *args, **kwargs):
+        try:
+            user = await sync_to_async(self.authenticate)(request)
+        except exceptions.AuthenticationFailed as e:
+            return api_response({'detail': str(e.detail)}, status.HTTP_401_UNAUTHORIZED)
+        if user is None:
+            return api_response(
+                {'detail': 'Authentication credentials were not provided.'}, status.HTTP_401_UNAUTHORIZED
+            )
+        request.user = user
+        return await super().dispatch(request, *args, **kwargs)
+
+    def authenticate(self, request):
+        for authentication_class in self.authentication_classes:
+            result = authentication_class().authenticate(request)
+            if result is not None:
+                return result[0]
+        return None
+
+
+class AsyncDevicesView(AsyncAPIView):
+    async def get(self, request):
+        try:
+            after, limit = parse_page_params(request.GET)
+        except ValueError as e:
+            return api_response({'detail': str(e)}, status.HTTP_400_BAD_REQUEST)
+
+        devices = await device_service.get_user_devices(request.user.username, after=after, limit=limit + 1)
+        devices, next_cursor = paginate(devices, limit, lambda device: (device.created_at, device.device_id))
+        return api_response({'results': DeviceEntitySerializer(devices, many=True).data, 'next_cursor': next_cursor})
+
+    async def post(self, request):
+        try:
+            payload = json.loads(request.body or b'{}')
+        except ValueError:
+            return api_response({'detail': 'Invalid JSON'}, status.HTTP_400_BAD_REQUEST)
+
+        serializer = CreateDeviceSerializer(data=payload)
+        if not serializer.is_valid():
+            return api_response(serializer.errors, status.HTTP_400_BAD_REQUEST)
+        try:
+            device = await device_service.register_device(
+                username=request.user.username,
+                **serializer.validated_data
+            )
+        except ValueError as e:
+            return api_response({'detail': str(e)}, status.HTTP_400_BAD_REQUEST)
+        return api_response(DeviceEntitySerializer(device).data, status.HTTP_201_CREATED)
+
+
+class AsyncDeviceDetailView(AsyncAPIView):
+    async def _get_user_device(self, device_id, username):
+        """Helper method to get device and verify ownership"""
+        device = await device_service.get_device_by_id(device_id)
+        if device is None or device.username != username:
+            return None
+        return device
+
+    async def get(self, request, device_id):
+        device = await self._get_user_device(device_id, request.user.username)
+        if not device:
+            return api_response({'detail': 'Device not found'}, status.HTTP_404_NOT_FOUND)
+        return api_response(DeviceEntitySerializer(device).data)
+
+    async def delete(self, request, device_id):
+        device = await self._get_user_device(device_id, request.user.username)
+        if not device:
+            return api_response({'detail': 'Device not found'}, status.HTTP_404_NOT_FOUND)
+        await device_service.delete_device(device_id)
+        return HttpResponse(status=status.HTTP_204_NO_CONTENT)
+
+
+class AsyncDeactivateDeviceView(AsyncAPIView):
+    async def post(self, request, device_id):
+        device = await device_service.get_device_by_id(device_id)
+        if device is None or device.username != request.user.username:
+            return api_response({'detail': 'Device not found'}, status.HTTP_404_NOT_FOUND)
+        device = await device_service.deactivate_device(device_id)
+        return api_response(DeviceEntitySerializer(device).data)
+
+
+class AsyncUserSessionsView(AsyncAPIView):
+    async def get(self, request):
+        try:
+            after, limit = parse_page_params(request.GET)
+        except ValueError as e:
+            return api_response({'detail': str(e)}, status.HTTP_400_BAD_REQUEST)
+
+        active_only = request.GET.get('active_only', '').lower() in ('1', 'true')
+        sessions = await session_service.get_user_sessions(
+            request.user.username, active_only=active_only, after=after, limit=limit + 1
+        )
+        sessions, next_cursor = paginate(sessions, limit, lambda session: (session.last_activity, session.session_id))
+        return api_response({'results': SessionEntitySerializer(sessions, many=True).data, 'next_cursor': next_cursor})
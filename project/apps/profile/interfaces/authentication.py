@@ -1,10 +1,32 @@
+from django.db import router
 from rest_framework.authentication import TokenAuthentication
 from rest_framework import exceptions
 
+from ..infrastructure.activity_tracker import get_activity_tracker
+from ..infrastructure.token_cache import get_token_cache
+
+
+SESSION_COOKIE = 'session_token'
+SESSION_HEADER = 'HTTP_X_SESSION_TOKEN'
+
+
+def _field_values(instance) -> tuple:
+    return tuple(getattr(instance, field.attname) for field in instance._meta.concrete_fields)
+
+
+def _from_values(model, values: tuple):
+    field_names = [field.attname for field in model._meta.concrete_fields]
+    return model.from_db(router.db_for_read(model), field_names, values)
+
+
 class CookieTokenAuthentication(TokenAuthentication):
     """
     Reads the DRF Token from an HTTP-only cookie named 'auth_token'.
     Falls back to the standard Authorization header if not found.
+    Resolved credentials are cached per token key (see PROFILE_TOKEN_CACHE) as
+    field values, so every request gets its own User and Token instances.
+    An authenticated request that names its login session (the session_token
+    cookie or the X-Session-Token header) records activity on it.
     """
     def authenticate(self, request):
         # Try cookie first
@@ -12,6 +34,27 @@ class CookieTokenAuthentication(TokenAuthentication):
         if token:
             # prefix like "Token <key>" is optional here; DRF's TokenAuthentication
             # will accept raw key if prefix is omitted.
-            return self.authenticate_credentials(token)
-        # Fallback to normal header behavior
-        return super().authenticate(request)
+            result = self.authenticate_credentials(token)
+        else:
+            # Fallback to normal header behavior
+            result = super().authenticate(request)
+        if result is not None:
+            session_token = request.COOKIES.get(SESSION_COOKIE) or request.META.get(SESSION_HEADER)
+            if session_token:
+                # Buffered in memory; the activity tracker writes it in bulk later
+                get_activity_tracker().touch(session_token)
+        return result
+
+    def authenticate_credentials(self, key):
+        cache = get_token_cache()
+        values = cache.get(key)
+        if values is None:
+            user, token = super().authenticate_credentials(key)
+            cache.set(key, (_field_values(user), _field_values(token)))
+            return user, token
+
+        user_values, token_values = values
+        user = _from_values(self.get_model()._meta.get_field('user').related_model, user_values)
+        token = _from_values(self.get_model(), token_values)
+        token.user = user
+        return user, token
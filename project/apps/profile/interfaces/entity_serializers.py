@@ -0,0 +1,97 @@
+"""
+Output serializers for domain entities.
+Each serializer declares its output fields once; at class creation the
+declaration is compiled into a single attrgetter and the positions of the
+datetime fields, so serializing an entity is one getter call, a datetime
+format per timestamp and a dict build. Output matches what DRF renders for
+the same data (ISO 8601 datetimes with a 'Z' suffix for UTC).
+
+Read-only by design: input validation stays with the DRF serializers in
+serializers.py, which also remain the schemas shown in the API docs.
+"""
+
+from datetime import datetime
+from operator import attrgetter
+from typing import Any, Iterable, Iterator, Optional
+
+from ..infrastructure.instrumentation import instrumented
+
+
+def format_datetime(value: datetime) -> str:
+    """Format a datetime the way DRF's JSON encoder does"""
+    representation = value.isoformat()
+    if representation.endswith('+00:00'):
+        representation = representation[:-6] + 'Z'
+    return representation
+
+
+# Only data: streamed exports serialize while the response is sent, after the timings are reported
+@instrumented('serialize', names=('data',))
+class EntitySerializer:
+    """
+    Base class for entity serializers.
+
+    ``fields`` lists output keys; a ``(key, attribute)`` pair renames an
+    attribute. ``datetime_fields`` names the output keys holding datetimes.
+
+        DeviceEntitySerializer(device).data
+        DeviceEntitySerializer(devices, many=True).data     # list
+        DeviceEntitySerializer(devices, many=True).stream() # lazy iterator
+    """
+
+    fields: tuple = ()
+    datetime_fields: tuple = ()
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        pairs = [(field, field) if isinstance(field, str) else field for field in cls.fields]
+        cls._keys = tuple(key for key, _ in pairs)
+        # attrgetter with several names returns a tuple; wrap the single-field case to match
+        getter = attrgetter(*(attribute for _, attribute in pairs))
+        cls._getter = getter if len(pairs) > 1 else (lambda entity: (getter(entity),))
+        cls._datetime_positions = tuple(cls._keys.index(key) for key in cls.datetime_fields)
+
+    def __init__(self, instance: Any, many: bool = False):
+        self.instance = instance
+        self.many = many
+
+    @classmethod
+    def to_representation(cls, entity: Any) -> dict:
+        """Serialize one entity"""
+        values = cls._getter(entity)
+        if cls._datetime_positions:
+            values = list(values)
+            for position in cls._datetime_positions:
+                value = values[position]
+                if value is not None:
+                    values[position] = format_datetime(value)
+        return dict(zip(cls._keys, values))
+
+    @property
+    def data(self) -> Optional[Any]:
+        if self.many:
+            return list(self.stream())
+        return self.to_representation(self.instance)
+
+    def stream(self) -> Iterator[dict]:
+        """Serialize the entities one at a time as they are consumed"""
+        entities: Iterable = self.instance if self.many else [self.instance]
+        return map(self.to_representation, entities)
+
+
+class UserEntitySerializer(EntitySerializer):
+    fields = ('username', 'email')
+
+
+class DeviceEntitySerializer(EntitySerializer):
+    fields = (
+        ('id', 'device_id'), 'name', 'device_type', 'platform', 'username', 'is_active', 'created_at', 'updated_at'
+    )
+    datetime_fields = ('created_at', 'updated_at')
+
+
+class SessionEntitySerializer(EntitySerializer):
+    fields = (
+        ('id', 'session_id'), 'device_name', 'ip_address', 'user_agent', 'is_active', 'created_at', 'last_activity'
+    )
+    datetime_fields = ('created_at', 'last_activity')
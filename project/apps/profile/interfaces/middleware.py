@@ -0,0 +1,87 @@
+import json
+import logging
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+
+from ..infrastructure.instrumentation import CATEGORIES, record_timings
+
+
+@sync_to_async
+def _add_execute_wrapper(wrapper):
+    connection.execute_wrappers.append(wrapper)
+
+
+@sync_to_async
+def _remove_execute_wrapper(wrapper):
+    connection.execute_wrappers.remove(wrapper)
+
+
+class RequestTimingMiddleware:
+    """
+    Opt-in per-request instrumentation, enabled by PROFILE_REQUEST_TIMING['ENABLED'].
+    Records the number of queries and the time spent in the database, gateway
+    conversions, services and entity serialization, and reports them as a
+    Server-Timing header and as one JSON log line per request (see the
+    request_timing_summary command). Should be listed first, so the total
+    covers the other middleware. Works under WSGI and ASGI alike.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        config = getattr(settings, 'PROFILE_REQUEST_TIMING', {})
+        if not config.get('ENABLED', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.server_timing = config.get('SERVER_TIMING_HEADER', True)
+        self.logger = logging.getLogger(config.get('LOGGER', 'apps.profile.timing'))
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        start = time.perf_counter()
+        with record_timings() as timings, connection.execute_wrapper(timings.execute_wrapper):
+            response = self.get_response(request)
+        return self._report(request, response, timings, time.perf_counter() - start)
+
+    async def __acall__(self, request):
+        start = time.perf_counter()
+        with record_timings() as timings:
+            # Queries run on the request's thread-sensitive executor thread, so wrap that thread's connection
+            await _add_execute_wrapper(timings.execute_wrapper)
+            try:
+                response = await self.get_response(request)
+            finally:
+                await _remove_execute_wrapper(timings.execute_wrapper)
+        return self._report(request, response, timings, time.perf_counter() - start)
+
+    def _report(self, request, response, timings, total):
+        match = request.resolver_match
+        record = {
+            'event': 'request_timing',
+            'method': request.method,
+            'endpoint': f"/{match.route}" if match is not None else None,
+            'path': request.path,
+            'status': response.status_code,
+            'total_ms': round(total * 1e3, 3),
+            'db_queries': timings.queries,
+        }
+        record.update(
+            (f'{category}_ms', round(timings.durations[category] * 1e3, 3)) for category in CATEGORIES
+        )
+        self.logger.info(json.dumps(record), extra={'timing': record})
+
+        if self.server_timing:
+            metrics = [f'db;dur={record["db_ms"]};desc="{timings.queries} queries"']
+            metrics += [f'{category};dur={record[f"{category}_ms"]}' for category in CATEGORIES[1:]]
+            metrics.append(f'total;dur={record["total_ms"]}')
+            response['Server-Timing'] = ', '.join(metrics)
+        return response
+
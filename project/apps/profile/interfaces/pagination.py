@@ -0,0 +1,72 @@
+"""
+Keyset (cursor) pagination helpers for the profile API.
+Cursors are opaque to clients: a URL-safe base64 encoding of the
+(timestamp, id) position of the last item on the previous page.
+"""
+
+import base64
+import json
+from datetime import datetime
+from typing import Callable, List, Optional, Tuple
+
+from django.conf import settings
+from django.utils import timezone
+from drf_yasg import openapi
+
+from ..domain.repositories import Cursor
+
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+PAGE_PARAMETERS = [
+    openapi.Parameter('limit', openapi.IN_QUERY, type=openapi.TYPE_INTEGER,
+                      description=f'Page size (default {DEFAULT_PAGE_SIZE}, max {MAX_PAGE_SIZE})'),
+    openapi.Parameter('cursor', openapi.IN_QUERY, type=openapi.TYPE_STRING,
+                      description='Value of next_cursor from the previous page'),
+]
+
+
+def encode_cursor(position: Cursor) -> str:
+    """Encode a (timestamp, id) position as an opaque cursor"""
+    timestamp, row_id = position
+    raw = json.dumps([timestamp.isoformat(), row_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str) -> Cursor:
+    """Decode an opaque cursor, raising ValueError if it is malformed"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        timestamp, row_id = json.loads(raw)
+        timestamp, row_id = datetime.fromisoformat(timestamp), int(row_id)
+    except (TypeError, ValueError) as e:
+        raise ValueError('Invalid cursor') from e
+    # encode_cursor writes aware timestamps; a naive one would be compared in the wrong time zone
+    if settings.USE_TZ and timezone.is_naive(timestamp):
+        raise ValueError('Invalid cursor')
+    return timestamp, row_id
+
+
+def parse_page_params(query_params) -> Tuple[Optional[Cursor], int]:
+    """Read (after, limit) from request query params, raising ValueError on bad input"""
+    try:
+        limit = int(query_params.get('limit', DEFAULT_PAGE_SIZE))
+    except ValueError as e:
+        raise ValueError('limit must be an integer') from e
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        raise ValueError(f'limit must be between 1 and {MAX_PAGE_SIZE}')
+
+    cursor = query_params.get('cursor')
+    return (decode_cursor(cursor) if cursor else None), limit
+
+
+def paginate(items: List, limit: int, position: Callable[[object], Cursor]) -> Tuple[List, Optional[str]]:
+    """
+    Split a result fetched with ``limit + 1`` rows into the page and the
+    cursor for the next page (None on the last page).
+    """
+    if len(items) <= limit:
+        return items, None
+    page = items[:limit]
+    return page, encode_cursor(position(page[-1]))
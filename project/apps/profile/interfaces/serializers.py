@@ -10,6 +10,7 @@ class CreateUserSerializer(serializers.Serializer):
 class LoginSerializer(serializers.Serializer):
     username = serializers.CharField()
     password = serializers.CharField()
+    device_name = serializers.CharField(required=False, max_length=255)
 
 class ChangePasswordSerializer(serializers.Serializer):
     new_password = serializers.CharField()
@@ -25,6 +26,11 @@ class CreateDeviceSerializer(serializers.Serializer):
     device_type = serializers.CharField(max_length=100)
     platform = serializers.CharField(max_length=100)
 
+class BatchCreateDeviceSerializer(serializers.Serializer):
+    # Items are validated one by one with CreateDeviceSerializer so that
+    # invalid entries are reported per item instead of failing the batch
+    devices = serializers.ListField(child=serializers.DictField(), allow_empty=False, max_length=1000)
+
 class UpdateDeviceSerializer(serializers.Serializer):
     name = serializers.CharField(max_length=255, required=False)
     device_type = serializers.CharField(max_length=100, required=False)
@@ -0,0 +1,74 @@
+"""
+Streaming export responses.
+Entities are serialized and written as they are produced, a few hundred per
+write, so an export of any size is never held in memory at once. Under ASGI,
+Django buffers a synchronous iterator whole before sending it, so there the
+chunks are produced on a worker thread and handed over one at a time.
+"""
+
+import json
+from itertools import islice
+from typing import AsyncIterator, Iterable, Iterator, Type
+
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.http import StreamingHttpResponse
+
+from .entity_serializers import EntitySerializer
+
+
+EXPORT_FORMATS = ('json', 'ndjson')
+EXPORT_CHUNK_SIZE = 2000  # rows fetched from the database per round trip
+WRITE_BATCH_SIZE = 200    # serialized entities per chunk written to the client
+
+_encoder = json.JSONEncoder(separators=(',', ':'), ensure_ascii=False)
+_DONE = object()
+
+
+def _batches(items: Iterable[str]) -> Iterator[list]:
+    items = iter(items)
+    while True:
+        batch = list(islice(items, WRITE_BATCH_SIZE))
+        if not batch:
+            return
+        yield batch
+
+
+def ndjson_stream(entities: Iterable, serializer: Type[EntitySerializer]) -> Iterator[str]:
+    """One JSON document per line"""
+    lines = map(_encoder.encode, serializer(entities, many=True).stream())
+    for batch in _batches(lines):
+        yield '\n'.join(batch) + '\n'
+
+
+def json_array_stream(entities: Iterable, serializer: Type[EntitySerializer]) -> Iterator[str]:
+    """A single JSON array, written element by element"""
+    yield '['
+    separator = ''
+    for batch in _batches(map(_encoder.encode, serializer(entities, many=True).stream())):
+        yield separator + ','.join(batch)
+        separator = ','
+    yield ']'
+
+
+async def async_stream(chunks: Iterator[str]) -> AsyncIterator[str]:
+    """Yield a synchronous stream's chunks, producing each on the request's worker thread"""
+    # Thread sensitive, so the database reads run on the thread that ran the view
+    next_chunk = sync_to_async(next)
+    while (chunk := await next_chunk(chunks, _DONE)) is not _DONE:
+        yield chunk
+
+
+def export_response(request, entities: Iterable, serializer: Type[EntitySerializer], export_format: str,
+                    filename: str) -> StreamingHttpResponse:
+    """Stream entities as a downloadable JSON array or NDJSON file"""
+    if export_format == 'ndjson':
+        chunks, content_type = ndjson_stream(entities, serializer), 'application/x-ndjson'
+    else:
+        chunks, content_type = json_array_stream(entities, serializer), 'application/json'
+    # A DRF Request wraps the HttpRequest the server built
+    if isinstance(getattr(request, '_request', request), ASGIRequest):
+        chunks = async_stream(chunks)
+    response = StreamingHttpResponse(chunks, content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="{filename}.{export_format}"'
+    return response
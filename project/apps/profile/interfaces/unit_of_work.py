@@ -0,0 +1,26 @@
+from django.db import transaction
+
+from ..infrastructure.unit_of_work import unit_of_work
+
+
+class UnitOfWorkMixin:
+    """
+    Run a synchronous DRF view in a unit of work, so the repositories share one
+    identity map per request and the writes of an unsafe request (POST, PUT,
+    PATCH, DELETE) commit in one transaction. Safe requests skip the transaction.
+    The view is wrapped at dispatch, so the handler's own view wrapping
+    (ATOMIC_REQUESTS) and every middleware hook still run, and an uncaught
+    exception rolls the writes back, as does an error response (DRF turns
+    APIException and Http404 into one inside dispatch). Async views use the
+    async repositories and do not use this.
+    """
+
+    SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+    def dispatch(self, request, *args, **kwargs):
+        atomic = request.method not in self.SAFE_METHODS
+        with unit_of_work(atomic=atomic):
+            response = super().dispatch(request, *args, **kwargs)
+            if atomic and response.status_code >= 400:
+                transaction.set_rollback(True)
+            return response
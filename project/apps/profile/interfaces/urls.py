@@ -1,5 +1,11 @@
 from django.urls import path
 from .views import *
+from .async_views import (
+    AsyncDevicesView,
+    AsyncDeviceDetailView,
+    AsyncDeactivateDeviceView,
+    AsyncUserSessionsView,
+)
 
 urlpatterns = [
     # User endpoints
@@ -10,7 +16,19 @@ urlpatterns = [
     
     # Device endpoints
     path('devices/', CreateDeviceView.as_view()),  # POST to create device
+    path('devices/batch/', BatchCreateDeviceView.as_view()),  # POST to create many devices
     path('devices/list/', UserDevicesView.as_view()),  # GET to list user's devices
+    path('devices/export/', ExportDevicesView.as_view()),  # GET to stream all of the user's devices
     path('devices/<int:device_id>/', DeviceDetailView.as_view()),  # GET, PUT, DELETE specific device
     path('devices/<int:device_id>/deactivate/', DeactivateDeviceView.as_view()),  # POST to deactivate device
+
+    # Session endpoints
+    path('sessions/', UserSessionsView.as_view()),  # GET to list user's sessions
+    path('sessions/export/', ExportSessionsView.as_view()),  # GET to stream all of the user's sessions
+
+    # Async (ASGI) device and session endpoints
+    path('async/devices/', AsyncDevicesView.as_view()),  # GET to list, POST to create
+    path('async/devices/<int:device_id>/', AsyncDeviceDetailView.as_view()),  # GET, DELETE specific device
+    path('async/devices/<int:device_id>/deactivate/', AsyncDeactivateDeviceView.as_view()),  # POST to deactivate
+    path('async/sessions/', AsyncUserSessionsView.as_view()),  # GET to list user's sessions
 ]
@@ -10,9 +10,16 @@ from .serializers import (
     ChangePasswordSerializer,
     UserSerializer,
     CreateDeviceSerializer,
+    BatchCreateDeviceSerializer,
     UpdateDeviceSerializer,
     DeviceSerializer,
 )
+from .authentication import SESSION_COOKIE
+from .entity_serializers import DeviceEntitySerializer, SessionEntitySerializer, UserEntitySerializer
+from .pagination import PAGE_PARAMETERS, paginate, parse_page_params
+from .streaming import EXPORT_CHUNK_SIZE, EXPORT_FORMATS, export_response
+from .unit_of_work import UnitOfWorkMixin
+from ..domain.entities import DeviceEntity
 from ..use_cases.services_with_gateway import (
     UserServiceWithGateway,
     DeviceServiceWithGateway,
@@ -26,7 +33,7 @@ device_service = DeviceServiceWithGateway()
 session_service = SessionServiceWithGateway()
 
 
-class CreateUserView(APIView):
+class CreateUserView(UnitOfWorkMixin, APIView):
     @swagger_auto_schema(
         operation_summary="Create a new user",
         request_body=CreateUserSerializer,
@@ -39,18 +46,25 @@ class CreateUserView(APIView):
         serializer = CreateUserSerializer(data=request.data)
         if serializer.is_valid():
             user = user_service.create_user(**serializer.validated_data)
-            return Response(UserSerializer(user).data, status=status.HTTP_201_CREATED)
+            return Response(UserEntitySerializer(user).data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
-class LoginView(APIView):
+class LoginView(UnitOfWorkMixin, APIView):
     @swagger_auto_schema(
         operation_summary="Login and return token (also set cookie)",
         request_body=LoginSerializer,
         responses={
             200: openapi.Response('OK', schema=openapi.Schema(
                 type=openapi.TYPE_OBJECT,
-                properties={'token': openapi.Schema(type=openapi.TYPE_STRING)}
+                properties={
+                    'token': openapi.Schema(type=openapi.TYPE_STRING),
+                    'session_token': openapi.Schema(
+                        type=openapi.TYPE_STRING,
+                        description='Identifies this login; send it back as the session_token cookie or '
+                                    'X-Session-Token header to record activity on it'
+                    ),
+                }
             )),
             400: 'Validation Error',
             401: 'Invalid credentials'
@@ -62,24 +76,29 @@ class LoginView(APIView):
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
         try:
-            token = user_service.login_user(**serializer.validated_data)
+            token, session_token = user_service.login_user(
+                **serializer.validated_data,
+                ip_address=request.META.get('REMOTE_ADDR') or None,
+                user_agent=request.META.get('HTTP_USER_AGENT'),
+            )
         except ValueError:
             return Response({'detail': 'Invalid credentials'}, status=status.HTTP_401_UNAUTHORIZED)
 
-        resp = Response({'token': token}, status=status.HTTP_200_OK)
-        # set the token in a secure, HTTP-only cookie
-        resp.set_cookie(
-            key='auth_token',
-            value=token,
-            httponly=True,
-            secure=True,      # set False if you’re not on HTTPS in dev
-            samesite='Lax',   # or 'Strict' depending on your needs
-            max_age=60*60*24  # e.g. 1 day
-        )
+        resp = Response({'token': token, 'session_token': session_token}, status=status.HTTP_200_OK)
+        # set the tokens in secure, HTTP-only cookies
+        for key, value in (('auth_token', token), (SESSION_COOKIE, session_token)):
+            resp.set_cookie(
+                key=key,
+                value=value,
+                httponly=True,
+                secure=True,      # set False if you’re not on HTTPS in dev
+                samesite='Lax',   # or 'Strict' depending on your needs
+                max_age=60*60*24  # e.g. 1 day
+            )
         return resp
 
 
-class ChangePasswordView(APIView):
+class ChangePasswordView(UnitOfWorkMixin, APIView):
     permission_classes = [permissions.IsAuthenticated]
 
     @swagger_auto_schema(
@@ -94,12 +113,12 @@ class ChangePasswordView(APIView):
     def post(self, request):
         serializer = ChangePasswordSerializer(data=request.data)
         if serializer.is_valid():
-            user_service.change_password(request.user, serializer.validated_data['new_password'])
+            user_service.update_password(request.user.username, serializer.validated_data['new_password'])
             return Response({'detail': 'Password changed'}, status=status.HTTP_200_OK)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
-class DeleteUserView(APIView):
+class DeleteUserView(UnitOfWorkMixin, APIView):
     permission_classes = [permissions.IsAuthenticated]
 
     @swagger_auto_schema(
@@ -110,12 +129,12 @@ class DeleteUserView(APIView):
         },
     )
     def delete(self, request):
-        user_service.delete_user(request.user)
+        user_service.delete_user(request.user.username)
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
 # Device Views
-class CreateDeviceView(APIView):
+class CreateDeviceView(UnitOfWorkMixin, APIView):
     permission_classes = [permissions.IsAuthenticated]
 
     @swagger_auto_schema(
@@ -135,52 +154,185 @@ class CreateDeviceView(APIView):
                     username=request.user.username,
                     **serializer.validated_data
                 )
-                # Convert entity to dict for serializer
-                device_data = {
-                    'id': device.device_id,
-                    'name': device.name,
-                    'device_type': device.device_type,
-                    'platform': device.platform,
-                    'username': device.username,
-                    'is_active': device.is_active,
-                    'created_at': device.created_at,
-                    'updated_at': device.updated_at
-                }
-                return Response(device_data, status=status.HTTP_201_CREATED)
+                return Response(DeviceEntitySerializer(device).data, status=status.HTTP_201_CREATED)
             except ValueError as e:
                 return Response({'detail': str(e)}, status=status.HTTP_400_BAD_REQUEST)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
-class UserDevicesView(APIView):
+class BatchCreateDeviceView(UnitOfWorkMixin, APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    @swagger_auto_schema(
+        operation_summary="Create many devices for the authenticated user",
+        request_body=BatchCreateDeviceSerializer,
+        responses={
+            201: 'All devices created',
+            207: 'Some devices created; see per-item status',
+            400: 'Validation Error or no device created',
+            401: 'Authentication credentials were not provided or are invalid'
+        },
+    )
+    def post(self, request):
+        serializer = BatchCreateDeviceSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        username = request.user.username
+        results = []
+        valid_items = []
+        for index, item in enumerate(serializer.validated_data['devices']):
+            item_serializer = CreateDeviceSerializer(data=item)
+            if item_serializer.is_valid():
+                valid_items.append((index, DeviceEntity(username=username, **item_serializer.validated_data)))
+                results.append(None)
+            else:
+                results.append({'index': index, 'status': 'invalid', 'errors': item_serializer.errors})
+
+        created = device_service.register_devices_for_user(username, [device for _, device in valid_items])
+        for (index, device), created_device in zip(valid_items, created):
+            if created_device is None:
+                results[index] = {
+                    'index': index,
+                    'status': 'duplicate',
+                    'detail': f"Device with name '{device.name}' already exists for user '{username}'"
+                }
+            else:
+                results[index] = {
+                    'index': index,
+                    'status': 'created',
+                    'device': DeviceEntitySerializer(created_device).data
+                }
+
+        created_count = sum(1 for result in results if result['status'] == 'created')
+        if created_count == len(results):
+            response_status = status.HTTP_201_CREATED
+        elif created_count:
+            response_status = status.HTTP_207_MULTI_STATUS
+        else:
+            response_status = status.HTTP_400_BAD_REQUEST
+        return Response({'created': created_count, 'results': results}, status=response_status)
+
+
+class UserDevicesView(UnitOfWorkMixin, APIView):
     permission_classes = [permissions.IsAuthenticated]
 
     @swagger_auto_schema(
-        operation_summary="Get all devices for the authenticated user",
+        operation_summary="Get devices for the authenticated user, newest first, one page at a time",
+        manual_parameters=PAGE_PARAMETERS,
         responses={
             200: openapi.Response('OK', DeviceSerializer(many=True)),
+            400: 'Invalid limit or cursor',
             401: 'Authentication credentials were not provided or are invalid'
         },
     )
     def get(self, request):
-        devices = device_service.get_user_devices(request.user.username)
-        devices_data = [
-            {
-                'id': device.device_id,
-                'name': device.name,
-                'device_type': device.device_type,
-                'platform': device.platform,
-                'username': device.username,
-                'is_active': device.is_active,
-                'created_at': device.created_at,
-                'updated_at': device.updated_at
-            }
-            for device in devices
-        ]
-        return Response(devices_data, status=status.HTTP_200_OK)
-
-
-class DeviceDetailView(APIView):
+        try:
+            after, limit = parse_page_params(request.query_params)
+        except ValueError as e:
+            return Response({'detail': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        devices = device_service.get_user_devices(request.user.username, after=after, limit=limit + 1)
+        devices, next_cursor = paginate(devices, limit, lambda device: (device.created_at, device.device_id))
+        devices_data = DeviceEntitySerializer(devices, many=True).data
+        return Response({'results': devices_data, 'next_cursor': next_cursor}, status=status.HTTP_200_OK)
+
+
+class UserSessionsView(UnitOfWorkMixin, APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    @swagger_auto_schema(
+        operation_summary="Get sessions for the authenticated user, most recently active first, one page at a time",
+        manual_parameters=PAGE_PARAMETERS + [
+            openapi.Parameter('active_only', openapi.IN_QUERY, type=openapi.TYPE_BOOLEAN,
+                              description='Only return active sessions'),
+        ],
+        responses={
+            200: 'OK',
+            400: 'Invalid limit or cursor',
+            401: 'Authentication credentials were not provided or are invalid'
+        },
+    )
+    def get(self, request):
+        try:
+            after, limit = parse_page_params(request.query_params)
+        except ValueError as e:
+            return Response({'detail': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        active_only = request.query_params.get('active_only', '').lower() in ('1', 'true')
+        sessions = session_service.get_user_sessions(
+            request.user.username, active_only=active_only, after=after, limit=limit + 1
+        )
+        sessions, next_cursor = paginate(sessions, limit, lambda session: (session.last_activity, session.session_id))
+        sessions_data = SessionEntitySerializer(sessions, many=True).data
+        return Response({'results': sessions_data, 'next_cursor': next_cursor}, status=status.HTTP_200_OK)
+
+
+EXPORT_PARAMETERS = [
+    openapi.Parameter('export_format', openapi.IN_QUERY, type=openapi.TYPE_STRING, enum=list(EXPORT_FORMATS),
+                      description='json (a single array, default) or ndjson (one object per line)'),
+]
+
+
+def parse_export_format(query_params):
+    """Read and validate the export_format query parameter"""
+    export_format = query_params.get('export_format', 'json')
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f"export_format must be one of: {', '.join(EXPORT_FORMATS)}")
+    return export_format
+
+
+class ExportDevicesView(UnitOfWorkMixin, APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    @swagger_auto_schema(
+        operation_summary="Stream every device of the authenticated user as JSON or NDJSON",
+        manual_parameters=EXPORT_PARAMETERS,
+        responses={
+            200: 'Streamed export',
+            400: 'Invalid export_format',
+            401: 'Authentication credentials were not provided or are invalid'
+        },
+    )
+    def get(self, request):
+        try:
+            export_format = parse_export_format(request.query_params)
+        except ValueError as e:
+            return Response({'detail': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        devices = device_service.export_user_devices(request.user.username, chunk_size=EXPORT_CHUNK_SIZE)
+        return export_response(request, devices, DeviceEntitySerializer, export_format, 'devices')
+
+
+class ExportSessionsView(UnitOfWorkMixin, APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    @swagger_auto_schema(
+        operation_summary="Stream every session of the authenticated user as JSON or NDJSON",
+        manual_parameters=EXPORT_PARAMETERS + [
+            openapi.Parameter('active_only', openapi.IN_QUERY, type=openapi.TYPE_BOOLEAN,
+                              description='Only export active sessions'),
+        ],
+        responses={
+            200: 'Streamed export',
+            400: 'Invalid export_format',
+            401: 'Authentication credentials were not provided or are invalid'
+        },
+    )
+    def get(self, request):
+        try:
+            export_format = parse_export_format(request.query_params)
+        except ValueError as e:
+            return Response({'detail': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        active_only = request.query_params.get('active_only', '').lower() in ('1', 'true')
+        sessions = session_service.export_user_sessions(
+            request.user.username, active_only=active_only, chunk_size=EXPORT_CHUNK_SIZE
+        )
+        return export_response(request, sessions, SessionEntitySerializer, export_format, 'sessions')
+
+
+class DeviceDetailView(UnitOfWorkMixin, APIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def _get_user_device(self, device_id, username):
@@ -205,17 +357,7 @@ class DeviceDetailView(APIView):
         device = self._get_user_device(device_id, request.user.username)
         if not device:
             return Response({'detail': 'Device not found'}, status=status.HTTP_404_NOT_FOUND)
-        device_data = {
-            'id': device.device_id,
-            'name': device.name,
-            'device_type': device.device_type,
-            'platform': device.platform,
-            'username': device.username,
-            'is_active': device.is_active,
-            'created_at': device.created_at,
-            'updated_at': device.updated_at
-        }
-        return Response(device_data, status=status.HTTP_200_OK)
+        return Response(DeviceEntitySerializer(device).data, status=status.HTTP_200_OK)
 
     @swagger_auto_schema(
         operation_summary="Update a specific device by ID",
@@ -235,18 +377,10 @@ class DeviceDetailView(APIView):
         serializer = UpdateDeviceSerializer(data=request.data)
         if serializer.is_valid():
             try:
-                updated_device = device_service.update_device(device_id, **serializer.validated_data)
-                device_data = {
-                    'id': updated_device.device_id,
-                    'name': updated_device.name,
-                    'device_type': updated_device.device_type,
-                    'platform': updated_device.platform,
-                    'username': updated_device.username,
-                    'is_active': updated_device.is_active,
-                    'created_at': updated_device.created_at,
-                    'updated_at': updated_device.updated_at
-                }
-                return Response(device_data, status=status.HTTP_200_OK)
+                for field, value in serializer.validated_data.items():
+                    setattr(device, field, value)
+                updated_device = device_service.update_device(device)
+                return Response(DeviceEntitySerializer(updated_device).data, status=status.HTTP_200_OK)
             except ValueError as e:
                 return Response({'detail': str(e)}, status=status.HTTP_400_BAD_REQUEST)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
@@ -268,7 +402,7 @@ class DeviceDetailView(APIView):
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
-class DeactivateDeviceView(APIView):
+class DeactivateDeviceView(UnitOfWorkMixin, APIView):
     permission_classes = [permissions.IsAuthenticated]
 
     @swagger_auto_schema(
@@ -286,16 +420,6 @@ class DeactivateDeviceView(APIView):
                 return Response({'detail': 'Device not found'}, status=status.HTTP_404_NOT_FOUND)
             
             updated_device = device_service.deactivate_device(device_id)
-            device_data = {
-                'id': updated_device.device_id,
-                'name': updated_device.name,
-                'device_type': updated_device.device_type,
-                'platform': updated_device.platform,
-                'username': updated_device.username,
-                'is_active': updated_device.is_active,
-                'created_at': updated_device.created_at,
-                'updated_at': updated_device.updated_at
-            }
-            return Response(device_data, status=status.HTTP_200_OK)
+            return Response(DeviceEntitySerializer(updated_device).data, status=status.HTTP_200_OK)
         except ValueError:
             return Response({'detail': 'Device not found'}, status=status.HTTP_404_NOT_FOUND)
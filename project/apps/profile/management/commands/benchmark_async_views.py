@@ -0,0 +1,77 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, connection
+from django.test import AsyncClient, Client, override_settings
+from django.test.utils import setup_databases, teardown_databases
+from rest_framework.authtoken.models import Token
+
+from apps.profile.models import Device
+
+
+class Command(BaseCommand):
+    help = ('Compare sync (WSGI) and async (ASGI) device listing throughput at a given concurrency, '
+            'against a throwaway test database')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=2000, help='Requests per run')
+        parser.add_argument('--concurrency', type=int, default=64, help='Concurrent in-flight requests')
+        parser.add_argument('--devices', type=int, default=50, help='Devices seeded for the benchmark user')
+
+    def handle(self, *args, **options):
+        # The request threads have their own connections, which would not see rows seeded in a
+        # transaction that is rolled back afterwards, so seed a test database that is dropped afterwards
+        old_config = setup_databases(verbosity=0, interactive=False, aliases={DEFAULT_DB_ALIAS})
+        try:
+            user = User.objects.create(username='__benchmark_async__')
+            Device.objects.bulk_create(
+                Device(name=f'bench-{i}', device_type='mobile', platform='iOS', user=user)
+                for i in range(options['devices'])
+            )
+            token = Token.objects.create(user=user).key
+
+            total = options['requests']
+            concurrency = options['concurrency']
+            self.stdout.write(f"{total} requests, concurrency {concurrency}, {options['devices']} devices per page")
+
+            # The test clients send Host: testserver
+            with override_settings(ALLOWED_HOSTS=['testserver']):
+                elapsed = self._run_wsgi(token, total, concurrency)
+                self.stdout.write(f"sync/WSGI   {elapsed:8.2f}s {total / elapsed:9.1f} req/s")
+
+                elapsed = asyncio.run(self._run_asgi(token, total, concurrency))
+                self.stdout.write(f"async/ASGI  {elapsed:8.2f}s {total / elapsed:9.1f} req/s")
+        finally:
+            teardown_databases(old_config, verbosity=0)
+
+    @staticmethod
+    def _run_wsgi(token, total, concurrency):
+        def worker(count):
+            client = Client(headers={'Authorization': f'Token {token}'})
+            try:
+                for _ in range(count):
+                    client.get('/api/profile/devices/list/')
+            finally:
+                connection.close()
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(concurrency) as pool:
+            shares = [total // concurrency + (i < total % concurrency) for i in range(concurrency)]
+            list(pool.map(worker, shares))
+        return time.perf_counter() - start
+
+    @staticmethod
+    async def _run_asgi(token, total, concurrency):
+        client = AsyncClient()
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def request():
+            async with semaphore:
+                await client.get('/api/profile/async/devices/', headers={'Authorization': f'Token {token}'})
+
+        start = time.perf_counter()
+        await asyncio.gather(*(request() for _ in range(total)))
+        return time.perf_counter() - start
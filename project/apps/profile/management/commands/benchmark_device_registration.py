@@ -0,0 +1,43 @@
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from rest_framework.test import APIClient
+
+
+class Command(BaseCommand):
+    help = 'Compare registering devices one request at a time against the batch endpoint'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--devices', type=int, default=200, help='Number of devices to register per run')
+
+    def handle(self, *args, **options):
+        count = options['devices']
+        devices = [
+            {'name': f'bench-{i}', 'device_type': 'mobile', 'platform': 'iOS'}
+            for i in range(count)
+        ]
+
+        # Everything runs inside a transaction that is always rolled back
+        with transaction.atomic():
+            # DEBUG only allows localhost when ALLOWED_HOSTS is empty
+            client = APIClient(HTTP_HOST='localhost')
+            client.force_authenticate(User.objects.create(username='__benchmark_single__'))
+            start = time.perf_counter()
+            for device in devices:
+                client.post('/api/profile/devices/', device, format='json')
+            single = time.perf_counter() - start
+
+            client.force_authenticate(User.objects.create(username='__benchmark_batch__'))
+            start = time.perf_counter()
+            response = client.post('/api/profile/devices/batch/', {'devices': devices}, format='json')
+            batch = time.perf_counter() - start
+
+            transaction.set_rollback(True)
+
+        self.stdout.write(f"Registering {count} devices")
+        self.stdout.write(f"single endpoint {single * 1e3:9.2f} ms ({count / single:9.1f} devices/s)")
+        self.stdout.write(f"batch endpoint  {batch * 1e3:9.2f} ms ({count / batch:9.1f} devices/s), "
+                          f"{response.data['created']} created")
+        self.stdout.write(f"speedup         {single / batch:9.1f}x")
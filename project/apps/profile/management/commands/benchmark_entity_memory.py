@@ -0,0 +1,71 @@
+import gc
+import time
+import tracemalloc
+from dataclasses import fields, make_dataclass
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from apps.profile.domain.entities import SessionEntity
+from apps.profile.infrastructure.gateways import SessionGateway
+
+
+# The session entity as it was before slots, for comparison
+LegacySessionEntity = make_dataclass('LegacySessionEntity', [(f.name, f.type, f) for f in fields(SessionEntity)])
+
+
+class Command(BaseCommand):
+    help = 'Compare memory and hydration time of dict-backed, slotted and columnar session containers'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=200000, help='Number of sessions to hydrate')
+        parser.add_argument('--repeat', type=int, default=3, help='Number of timed runs per path (best is reported)')
+
+    def handle(self, *args, **options):
+        count = options['rows']
+        repeat = options['repeat']
+
+        # Rows shaped like SessionGateway.ROW_FIELDS; they exist before measuring,
+        # so only the memory each container adds on top of the values is counted
+        now = timezone.now()
+        rows = [
+            (f'token-{i}', f'user-{i % 1000}', f'device-{i % 5}', '10.0.0.1', 'Mozilla/5.0', True, i,
+             now - timedelta(seconds=i), now)
+            for i in range(count)
+        ]
+
+        cases = [
+            ('dataclass', lambda: [LegacySessionEntity(*row) for row in rows]),
+            ('slotted', lambda: SessionGateway.rows_to_entities(rows)),
+            ('SessionBatch', lambda: SessionGateway.rows_to_batch(rows)),
+        ]
+
+        self.stdout.write(f"Hydrating {count} sessions, best of {repeat} runs")
+        self.stdout.write(f"{'container':<14} {'memory':>10} {'bytes/row':>10} {'time':>10} {'us/row':>8}")
+        for name, build in cases:
+            size = self._measure(build)
+            best = min(self._time(build) for _ in range(repeat))
+            self.stdout.write(
+                f"{name:<14} {size / 2 ** 20:8.1f}MB {size / count:10.1f} "
+                f"{best * 1e3:8.1f}ms {best / count * 1e6:8.2f}"
+            )
+
+    @staticmethod
+    def _measure(build):
+        gc.collect()
+        tracemalloc.start()
+        try:
+            result = build()
+            size, _ = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        del result
+        return size
+
+    @staticmethod
+    def _time(build):
+        gc.collect()
+        start = time.perf_counter()
+        build()
+        return time.perf_counter() - start
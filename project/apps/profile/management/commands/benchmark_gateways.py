@@ -0,0 +1,431 @@
+import inspect
+import itertools
+import json
+import platform
+import statistics
+import time
+import tracemalloc
+from datetime import timedelta
+
+import django
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, reset_queries, transaction
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+
+from apps.profile.domain.entities import DeviceEntity, SessionEntity, UserEntity
+from apps.profile.infrastructure.django_repositories_with_gateway import (
+    DjangoUserRepositoryWithGateway,
+    DjangoDeviceRepositoryWithGateway,
+    DjangoSessionRepositoryWithGateway
+)
+from apps.profile.infrastructure.gateways import DeviceGateway, SessionGateway, UserGateway
+from apps.profile.infrastructure.session_index import IndexedSessionRepository, SessionTokenIndex
+from apps.profile.models import Device, Session
+
+
+ROWS_PER_USER = 100
+BENCHMARKED_CLASSES = {
+    'UserGateway': UserGateway,
+    'DeviceGateway': DeviceGateway,
+    'SessionGateway': SessionGateway,
+    'UserRepository': DjangoUserRepositoryWithGateway,
+    'DeviceRepository': DjangoDeviceRepositoryWithGateway,
+    'SessionRepository': DjangoSessionRepositoryWithGateway,
+}
+
+
+class Case:
+    """One benchmarked operation; setup, if given, runs untimed before every call and returns its arguments"""
+
+    def __init__(self, name, run, setup=None):
+        self.name = name
+        self.run = run
+        self.setup = setup
+
+    def call(self):
+        args = self.setup() if self.setup else ()
+        start = time.perf_counter()
+        self.run(*args)
+        return time.perf_counter() - start
+
+
+class Command(BaseCommand):
+    help = ('Benchmark every gateway conversion and repository method against a seeded database, '
+            'reporting time, queries and allocations per operation')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 100000, 1000000],
+                            help='Devices and sessions to seed per run (default: 1000 100000 1000000; '
+                                 'the 1M run takes a while, pass --sizes 1000 for a quick check)')
+        parser.add_argument('--rounds', type=int, default=5, help='Timed rounds per benchmark')
+        parser.add_argument('--min-time', type=float, default=0.02, help='Minimum seconds per round')
+        parser.add_argument('--filter', default='', help='Only run benchmarks whose name contains this')
+        parser.add_argument('--save', help='Write the results to this JSON file as a baseline')
+        parser.add_argument('--compare', help='Compare against a baseline JSON file')
+        parser.add_argument('--threshold', type=float, default=0.25,
+                            help='Fail when the fastest round slows by more than this fraction of the baseline')
+
+    def handle(self, *args, **options):
+        if settings.DEBUG:
+            self.stderr.write(self.style.WARNING('DEBUG is on: query logging inflates the database timings'))
+
+        results = []
+        for size in options['sizes']:
+            # Seed inside a transaction that is always rolled back
+            with transaction.atomic():
+                context = self._seed(size)
+                cases = [case for case in self._cases(context) if options['filter'] in case.name]
+                missing = self._uncovered(cases) if not options['filter'] else []
+                if missing:
+                    raise CommandError(f"No benchmark for: {', '.join(missing)}")
+
+                size_results = [self._benchmark(case, size, options) for case in cases]
+                transaction.set_rollback(True)
+            self._report(size, size_results)
+            results.extend(size_results)
+
+        if options['save']:
+            with open(options['save'], 'w') as baseline:
+                json.dump({'machine_info': self._machine_info(), 'benchmarks': results}, baseline, indent=2)
+            self.stdout.write(f"Saved baseline to {options['save']}")
+        if options['compare']:
+            self._compare(results, options['compare'], options['threshold'])
+
+    # Seeding
+
+    def _seed(self, size):
+        user_count = max(1, size // ROWS_PER_USER)
+        users = User.objects.bulk_create(
+            (User(username=f'__bench_{i}__', email=f'bench{i}@example.com') for i in range(user_count)),
+            batch_size=5000
+        )
+        devices = Device.objects.bulk_create(
+            (Device(name=f'device-{i}', device_type='mobile', platform='iOS', user=users[i % user_count])
+             for i in range(size)),
+            batch_size=5000
+        )
+        Session.objects.bulk_create(
+            (Session(session_token=f'bench-{i}', user=users[i % user_count], device=devices[i],
+                     ip_address='10.0.0.1', user_agent='benchmark', is_active=i % 3 != 0)
+             for i in range(size)),
+            batch_size=5000
+        )
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+        user = users[0]
+        return {
+            'user': user,
+            'username': user.username,
+            'device': Device.objects.select_related('user').filter(user=user).first(),
+            'session': Session.objects.select_related('user', 'device').filter(user=user).first(),
+            'device_rows': list(Device.objects.filter(user=user).values_list(*DeviceGateway.ROW_FIELDS)),
+            'session_rows': list(Session.objects.filter(user=user).values_list(*SessionGateway.ROW_FIELDS)),
+            'device_ids': list(Device.objects.filter(user=user).values_list('id', flat=True)),
+            'tokens': list(Session.objects.filter(user=user).values_list('session_token', flat=True)),
+            'counter': itertools.count(),
+        }
+
+    # Cases
+
+    def _cases(self, ctx):
+        users = DjangoUserRepositoryWithGateway()
+        devices = DjangoDeviceRepositoryWithGateway()
+        sessions = DjangoSessionRepositoryWithGateway()
+        user, username, counter = ctx['user'], ctx['username'], ctx['counter']
+        device_model, session_model = ctx['device'], ctx['session']
+
+        user_entity = UserGateway.model_to_entity(user)
+        user_dto = UserGateway.model_to_dto(user)
+        device_entity = devices.find_by_id(device_model.id)
+        device_dto = DeviceGateway.model_to_dto(device_model)
+        session_entity = sessions.find_by_token(session_model.session_token)
+        session_dto = SessionGateway.model_to_dto(session_model)
+        cursor = (timezone.now() + timedelta(days=1), 1 << 62)
+        indexed_sessions = IndexedSessionRepository(sessions, SessionTokenIndex())
+        Token.objects.get_or_create(user=user)
+        credentials = users.find_login_credentials(username)
+
+        def unique(prefix):
+            return f'{prefix}-{next(counter)}'
+
+        def new_user():
+            return (User.objects.create(username=unique('__bench_new__')).username,)
+
+        def new_users():
+            names = [unique('__bench_new__') for _ in range(ROWS_PER_USER)]
+            User.objects.bulk_create(User(username=name) for name in names)
+            return (names,)
+
+        def new_device():
+            return (Device.objects.create(name=unique('new'), device_type='mobile', platform='iOS', user=user),)
+
+        def new_devices():
+            created = Device.objects.bulk_create(
+                Device(name=unique('new'), device_type='mobile', platform='iOS', user=user)
+                for _ in range(ROWS_PER_USER)
+            )
+            return ([device.id for device in created],)
+
+        def new_sessions(count=ROWS_PER_USER, **fields):
+            created = Session.objects.bulk_create(
+                Session(session_token=unique('new'), user=user, **fields) for _ in range(count)
+            )
+            return [session.session_token for session in created]
+
+        def toggle(entity, field, values):
+            setattr(entity, field, values[getattr(entity, field) == values[0]])
+            return entity
+
+        def first(iterator):
+            return next(iter(iterator), None)
+
+        return [
+            Case('UserGateway.entity_to_dto', lambda: UserGateway.entity_to_dto(user_entity)),
+            Case('UserGateway.dto_to_entity', lambda: UserGateway.dto_to_entity(user_dto)),
+            Case('UserGateway.dto_to_model', lambda: UserGateway.dto_to_model(user_dto)),
+            Case('UserGateway.model_to_dto', lambda: UserGateway.model_to_dto(user)),
+            Case('UserGateway.model_to_entity', lambda: UserGateway.model_to_entity(user)),
+            Case('UserGateway.entity_to_model_via_dto', lambda: UserGateway.entity_to_model_via_dto(user_entity)),
+
+            Case('DeviceGateway.entity_to_dto', lambda: DeviceGateway.entity_to_dto(device_entity, user.id)),
+            Case('DeviceGateway.dto_to_entity', lambda: DeviceGateway.dto_to_entity(device_dto, username)),
+            Case('DeviceGateway.dto_to_model', lambda: DeviceGateway.dto_to_model(device_dto)),
+            Case('DeviceGateway.model_to_dto', lambda: DeviceGateway.model_to_dto(device_model)),
+            Case('DeviceGateway.model_to_entity', lambda: DeviceGateway.model_to_entity(device_model)),
+            Case('DeviceGateway.rows_to_entities(100)', lambda: DeviceGateway.rows_to_entities(ctx['device_rows'])),
+            Case('DeviceGateway.entity_to_update_values',
+                 lambda: DeviceGateway.entity_to_update_values(toggle(device_entity, 'platform', ('iOS', 'Android')))),
+            Case('DeviceGateway.entity_to_model_via_dto',
+                 lambda: DeviceGateway.entity_to_model_via_dto(device_entity, user.id)),
+
+            Case('SessionGateway.entity_to_dto',
+                 lambda: SessionGateway.entity_to_dto(session_entity, user.id, device_model.id)),
+            Case('SessionGateway.dto_to_entity',
+                 lambda: SessionGateway.dto_to_entity(session_dto, username, device_model.name)),
+            Case('SessionGateway.dto_to_model', lambda: SessionGateway.dto_to_model(session_dto)),
+            Case('SessionGateway.model_to_dto', lambda: SessionGateway.model_to_dto(session_model)),
+            Case('SessionGateway.model_to_entity', lambda: SessionGateway.model_to_entity(session_model)),
+            Case('SessionGateway.rows_to_entities(100)',
+                 lambda: SessionGateway.rows_to_entities(ctx['session_rows'])),
+            Case('SessionGateway.rows_to_batch(100)', lambda: SessionGateway.rows_to_batch(ctx['session_rows'])),
+            Case('SessionGateway.entity_to_update_values',
+                 lambda: SessionGateway.entity_to_update_values(toggle(session_entity, 'user_agent', ('a', 'b')))),
+            Case('SessionGateway.entity_to_model_via_dto',
+                 lambda: SessionGateway.entity_to_model_via_dto(session_entity, user.id, device_model.id)),
+
+            # Empty passwords skip hashing, which would otherwise dominate the user writes
+            Case('UserRepository.add', lambda: users.add(UserEntity(username=unique('__bench_new__'), email=''))),
+            Case('UserRepository.find_by_username', lambda: users.find_by_username(username)),
+            Case('UserRepository.delete', users.delete, setup=new_user),
+            Case('UserRepository.change_password', lambda: users.change_password(username, 'benchmark-password')),
+            Case('UserRepository.find_password_hash', lambda: users.find_password_hash(username)),
+            Case('UserRepository.set_password_hash', lambda: users.set_password_hash(username, '!benchmark')),
+            Case('UserRepository.find_login_credentials', lambda: users.find_login_credentials(username)),
+            Case('UserRepository.record_login', lambda: users.record_login(credentials, SessionEntity(
+                session_token=unique('login'), username=username, device_name=device_model.name
+            ))),
+            Case('UserRepository.bulk_add(100)', lambda: users.bulk_add(
+                [UserEntity(username=unique('__bench_new__'), email='') for _ in range(ROWS_PER_USER)]
+            )),
+            Case('UserRepository.bulk_delete(100)', users.bulk_delete, setup=new_users),
+
+            Case('DeviceRepository.add', lambda: devices.add(
+                DeviceEntity(name=unique('new'), device_type='mobile', platform='iOS', username=username)
+            )),
+            Case('DeviceRepository.get_or_register(new)', lambda: devices.get_or_register(
+                DeviceEntity(name=unique('new'), device_type='mobile', platform='iOS', username=username)
+            )),
+            Case('DeviceRepository.get_or_register(existing)', lambda: devices.get_or_register(
+                DeviceEntity(name=device_model.name, device_type='mobile', platform='iOS', username=username)
+            )),
+            Case('DeviceRepository.find_by_id', lambda: devices.find_by_id(device_model.id)),
+            Case('DeviceRepository.find_by_name_and_user',
+                 lambda: devices.find_by_name_and_user(device_model.name, username)),
+            Case('DeviceRepository.find_by_user(100)', lambda: devices.find_by_user(username, limit=100)),
+            Case('DeviceRepository.find_by_user(after)',
+                 lambda: devices.find_by_user(username, after=cursor, limit=100)),
+            Case('DeviceRepository.iter_by_user', lambda: list(devices.iter_by_user(username))),
+            Case('DeviceRepository.iter_active_by_user', lambda: list(devices.iter_active_by_user(username))),
+            Case('DeviceRepository.iter_all(first chunk)', lambda: first(devices.iter_all(chunk_size=100))),
+            Case('DeviceRepository.update',
+                 lambda: devices.update(toggle(device_entity, 'platform', ('iOS', 'Android')))),
+            Case('DeviceRepository.delete', lambda device: devices.delete(device.id), setup=new_device),
+            Case('DeviceRepository.delete_by_name_and_user',
+                 lambda device: devices.delete_by_name_and_user(device.name, username), setup=new_device),
+            Case('DeviceRepository.delete_by_id', lambda device: devices.delete_by_id(device.id), setup=new_device),
+            Case('DeviceRepository.set_active_status', lambda: devices.set_active_status(
+                device_model.name, username, next(counter) % 2 == 0
+            )),
+            Case('DeviceRepository.bulk_add(100)', lambda: devices.bulk_add([
+                DeviceEntity(name=unique('new'), device_type='mobile', platform='iOS', username=username)
+                for _ in range(ROWS_PER_USER)
+            ])),
+            Case('DeviceRepository.bulk_register(100)', lambda: devices.bulk_register([
+                DeviceEntity(name=unique('new'), device_type='mobile', platform='iOS', username=username)
+                for _ in range(ROWS_PER_USER)
+            ])),
+            Case('DeviceRepository.bulk_deactivate(100)', lambda: devices.bulk_deactivate(ctx['device_ids'])),
+            Case('DeviceRepository.bulk_delete(100)', devices.bulk_delete, setup=new_devices),
+            Case('DeviceRepository.find_existing_names(10)', lambda: devices.find_existing_names(
+                username, [row[0] for row in ctx['device_rows'][:10]]
+            )),
+
+            Case('SessionRepository.add', lambda: sessions.add(
+                SessionEntity(session_token=unique('new'), username=username, device_name=device_model.name)
+            )),
+            Case('SessionRepository.find_by_token', lambda: sessions.find_by_token(session_model.session_token)),
+            Case('IndexedSessionRepository.find_by_token(hit)',
+                 lambda: indexed_sessions.find_by_token(session_model.session_token)),
+            Case('SessionRepository.find_by_user(100)', lambda: sessions.find_by_user(username, limit=100)),
+            Case('SessionRepository.find_active_by_user(100)',
+                 lambda: sessions.find_active_by_user(username, limit=100)),
+            Case('SessionRepository.iter_by_user', lambda: list(sessions.iter_by_user(username))),
+            Case('SessionRepository.iter_active_by_user', lambda: list(sessions.iter_active_by_user(username))),
+            Case('SessionRepository.iter_all(first chunk)', lambda: first(sessions.iter_all(chunk_size=100))),
+            Case('SessionRepository.iter_batches(first batch)',
+                 lambda: first(sessions.iter_batches(chunk_size=100))),
+            Case('SessionRepository.update',
+                 lambda: sessions.update(toggle(session_entity, 'user_agent', ('a', 'b')))),
+            Case('SessionRepository.update_last_activity',
+                 lambda: sessions.update_last_activity(session_model.session_token)),
+            Case('SessionRepository.bulk_update_last_activity(100)', lambda: sessions.bulk_update_last_activity(
+                dict.fromkeys(ctx['tokens'], timezone.now())
+            )),
+            Case('SessionRepository.deactivate', sessions.deactivate, setup=lambda: new_sessions(1)),
+            Case('SessionRepository.deactivate_user_sessions', lambda: sessions.deactivate_user_sessions(username)),
+            Case('SessionRepository.deactivate_device_sessions',
+                 lambda: sessions.deactivate_device_sessions(device_model.id)),
+            Case('SessionRepository.deactivate_sessions_created_before',
+                 lambda: sessions.deactivate_sessions_created_before(timezone.now() - timedelta(days=30))),
+            Case('SessionRepository.delete', sessions.delete, setup=lambda: new_sessions(1)),
+            Case('SessionRepository.delete_inactive_sessions', sessions.delete_inactive_sessions,
+                 setup=lambda: new_sessions(10, is_active=False) and ()),
+            Case('SessionRepository.delete_inactive_batch(100)', lambda: sessions.delete_inactive_batch(100),
+                 setup=lambda: new_sessions(is_active=False) and ()),
+            Case('SessionRepository.delete_idle_batch(100)',
+                 lambda: sessions.delete_idle_batch(timezone.now() - timedelta(days=30), 100),
+                 setup=lambda: Session.objects.filter(session_token__in=new_sessions()).update(
+                     last_activity=timezone.now() - timedelta(days=60)
+                 ) and ()),
+            Case('SessionRepository.bulk_add(100)', lambda: sessions.bulk_add([
+                SessionEntity(session_token=unique('new'), username=username, device_name=device_model.name)
+                for _ in range(ROWS_PER_USER)
+            ])),
+            Case('SessionRepository.bulk_deactivate(100)', lambda: sessions.bulk_deactivate(ctx['tokens'])),
+            Case('SessionRepository.bulk_delete(100)', sessions.bulk_delete, setup=lambda: (new_sessions(),)),
+        ]
+
+    @staticmethod
+    def _uncovered(cases):
+        covered = {case.name.split('(')[0] for case in cases}
+        return [
+            f'{label}.{name}'
+            for label, cls in BENCHMARKED_CLASSES.items()
+            for name, member in inspect.getmembers(cls, callable)
+            if not name.startswith('_') and not inspect.isclass(member) and f'{label}.{name}' not in covered
+        ]
+
+    # Measurement
+
+    def _benchmark(self, case, size, options):
+        case.call()  # warm up caches and lazy imports
+
+        # Calibrate how many calls make up one round
+        iterations, elapsed = 1, case.call()
+        while elapsed < options['min_time'] and iterations < 100000:
+            iterations *= 2
+            elapsed = sum(case.call() for _ in range(iterations))
+
+        rounds = [sum(case.call() for _ in range(iterations)) / iterations for _ in range(options['rounds'])]
+
+        calls = min(iterations, 100)
+        executed = []
+        for _ in range(calls):
+            args = case.setup() if case.setup else ()
+            with connection.execute_wrapper(lambda execute, *query: executed.append(1) or execute(*query)):
+                case.run(*args)
+        reset_queries()
+
+        allocated = 0
+        for _ in range(calls):
+            args = case.setup() if case.setup else ()
+            tracemalloc.start()
+            try:
+                case.run(*args)
+                allocated += tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+
+        mean = statistics.fmean(rounds)
+        return {
+            'name': case.name,
+            'size': size,
+            'stats': {
+                'min': min(rounds),
+                'max': max(rounds),
+                'mean': mean,
+                'stddev': statistics.stdev(rounds) if len(rounds) > 1 else 0.0,
+                'median': statistics.median(rounds),
+                'ops': 1 / mean if mean else 0.0,
+                'rounds': len(rounds),
+                'iterations': iterations,
+            },
+            'queries_per_op': len(executed) / calls,
+            'peak_bytes_per_op': allocated / calls,
+        }
+
+    # Reporting
+
+    def _report(self, size, results):
+        header = (f"{'Name (time in us)':<52}{'Min':>10}{'Max':>10}{'Mean':>10}{'StdDev':>10}{'Median':>10}"
+                  f"{'OPS':>12}{'Queries':>9}{'Peak KiB':>10}{'Rounds':>8}")
+        title = f" benchmark 'rows={size}': {len(results)} tests "
+        self.stdout.write(title.center(len(header), '-'))
+        self.stdout.write(header)
+        self.stdout.write('-' * len(header))
+        for result in sorted(results, key=lambda result: result['stats']['mean']):
+            stats = result['stats']
+            self.stdout.write(
+                f"{result['name']:<52}"
+                + ''.join(f"{stats[key] * 1e6:10.2f}" for key in ('min', 'max', 'mean', 'stddev', 'median'))
+                + f"{stats['ops']:12.1f}{result['queries_per_op']:9.2f}"
+                + f"{result['peak_bytes_per_op'] / 1024:10.2f}{stats['rounds']:8d}"
+            )
+        self.stdout.write('-' * len(header))
+
+    @staticmethod
+    def _machine_info():
+        return {
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+            'machine': platform.machine(),
+            'processor': platform.processor(),
+        }
+
+    def _compare(self, results, path, threshold):
+        with open(path) as baseline_file:
+            baseline = {(item['name'], item['size']): item for item in json.load(baseline_file)['benchmarks']}
+
+        regressions = []
+        for result in results:
+            previous = baseline.get((result['name'], result['size']))
+            if previous is None:
+                continue
+            # The fastest round is the least disturbed by the rest of the machine
+            ratio = result['stats']['min'] / previous['stats']['min']
+            label = f"{result['name']} [rows={result['size']}]"
+            if ratio > 1 + threshold:
+                regressions.append(f"{label}: {ratio:.2f}x slower than baseline")
+            if result['queries_per_op'] > previous['queries_per_op']:
+                regressions.append(
+                    f"{label}: {result['queries_per_op']:g} queries/op, baseline {previous['queries_per_op']:g}"
+                )
+
+        if regressions:
+            raise CommandError("Regressions against baseline:\n" + "\n".join(regressions))
+        self.stdout.write(self.style.SUCCESS(f"No regressions beyond {threshold:.0%} against {path}"))
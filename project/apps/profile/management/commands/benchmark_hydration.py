@@ -0,0 +1,63 @@
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from apps.profile.infrastructure.gateways import DeviceGateway, SessionGateway
+from apps.profile.models import Device, Session
+
+
+class Command(BaseCommand):
+    help = 'Compare per-row cost of model-based and values-based entity hydration'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=2000, help='Number of devices/sessions to seed')
+        parser.add_argument('--repeat', type=int, default=5, help='Number of timed runs per path (best is reported)')
+
+    def handle(self, *args, **options):
+        rows = options['rows']
+        repeat = options['repeat']
+
+        # Seed inside a transaction that is always rolled back
+        with transaction.atomic():
+            user = User.objects.create(username='__benchmark_hydration__')
+            devices = Device.objects.bulk_create(
+                Device(name=f'bench-{i}', device_type='mobile', platform='iOS', user=user)
+                for i in range(rows)
+            )
+            Session.objects.bulk_create(
+                Session(session_token=f'bench-{i}', user=user, device=device)
+                for i, device in enumerate(devices)
+            )
+
+            username = user.username
+            cases = [
+                ('device/model', lambda: [
+                    DeviceGateway.model_to_entity(d)
+                    for d in Device.objects.filter(user__username=username).select_related('user')
+                ]),
+                ('device/values', lambda: DeviceGateway.rows_to_entities(
+                    Device.objects.filter(user__username=username).values_list(*DeviceGateway.ROW_FIELDS)
+                )),
+                ('session/model', lambda: [
+                    SessionGateway.model_to_entity(s)
+                    for s in Session.objects.filter(user__username=username).select_related('user', 'device')
+                ]),
+                ('session/values', lambda: SessionGateway.rows_to_entities(
+                    Session.objects.filter(user__username=username).values_list(*SessionGateway.ROW_FIELDS)
+                )),
+            ]
+
+            self.stdout.write(f"Hydrating {rows} rows, best of {repeat} runs")
+            for name, run in cases:
+                best = min(self._time(run) for _ in range(repeat))
+                self.stdout.write(f"{name:<16} {best * 1e3:9.2f} ms total {best / rows * 1e6:9.2f} us/row")
+
+            transaction.set_rollback(True)
+
+    @staticmethod
+    def _time(run):
+        start = time.perf_counter()
+        run()
+        return time.perf_counter() - start
@@ -0,0 +1,105 @@
+import secrets
+import statistics
+import time
+
+from django.contrib.auth import authenticate
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import override_settings
+from rest_framework.authtoken.models import Token
+
+from apps.profile.infrastructure.password_hashing import PasswordHashingPool
+from apps.profile.models import Device
+from apps.profile.use_cases.services_with_gateway import SessionServiceWithGateway, UserServiceWithGateway
+
+
+PASSWORD = 'benchmark-password'
+IP_ADDRESS = '203.0.113.7'
+USER_AGENT = 'benchmark_login/1.0'
+
+
+class Command(BaseCommand):
+    help = ('Compare queries per login and logins/sec of UserServiceWithGateway.login_user against '
+            'a naive login (authenticate, Token get_or_create, create_session)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=50, help='Users per login path')
+        parser.add_argument('--logins', type=int, default=500, help='Repeat logins per path, spread over the users')
+        parser.add_argument('--iterations', type=int, default=1000,
+                            help='PBKDF2 iterations for the benchmark users, so the database round trips '
+                                 'are what is measured; 0 keeps the configured hashing cost')
+
+    def handle(self, *args, **options):
+        if options['users'] < 1 or options['logins'] < 1:
+            raise CommandError("--users and --logins must be positive")
+
+        cost = ({'PROFILE_PASSWORD_HASHING': {'PBKDF2_ITERATIONS': options['iterations']}}
+                if options['iterations'] else {})
+        user_service = UserServiceWithGateway()
+        # Hash on this thread, so the cost above also applies when verifying
+        user_service.hashing_pool = PasswordHashingPool()
+        session_service = SessionServiceWithGateway()
+
+        def naive_login(username):
+            user = authenticate(username=username, password=PASSWORD)
+            if user is None:
+                raise CommandError(f"Login failed for {username}")
+            token, _ = Token.objects.get_or_create(user=user)
+            session_service.create_session(secrets.token_hex(20), username, 'phone', IP_ADDRESS, USER_AGENT)
+            return token.key
+
+        def fast_login(username):
+            return user_service.login_user(username, PASSWORD, 'phone', IP_ADDRESS, USER_AGENT)[0]
+
+        paths = [('naive', naive_login), ('login_user', fast_login)]
+        results = []
+        # Everything runs inside a transaction that is always rolled back
+        with override_settings(**cost), transaction.atomic():
+            encoded = make_password(PASSWORD)
+            for name, login in paths:
+                usernames = self._seed(f'__login_{name}', options['users'], encoded)
+                # First logins issue the tokens, repeat logins reuse them
+                results.append((name, 'first', self._measure(login, usernames)))
+                repeats = [usernames[i % len(usernames)] for i in range(options['logins'])]
+                results.append((name, 'repeat', self._measure(login, repeats)))
+            transaction.set_rollback(True)
+
+        header = (f"{'path':<12}{'logins':<8}{'count':>7}{'queries/login':>15}{'logins/s':>11}"
+                  f"{'mean ms':>10}{'p95 ms':>10}")
+        self.stdout.write(header)
+        self.stdout.write('-' * len(header))
+        for name, phase, (count, queries, elapsed, latencies) in results:
+            p95 = statistics.quantiles(latencies, n=20, method='inclusive')[18] if count > 1 else latencies[0]
+            self.stdout.write(
+                f"{name:<12}{phase:<8}{count:>7}{queries / count:15.2f}{count / elapsed:11.1f}"
+                f"{statistics.fmean(latencies) * 1e3:10.2f}{p95 * 1e3:10.2f}"
+            )
+
+    @staticmethod
+    def _seed(prefix, count, encoded):
+        users = User.objects.bulk_create(User(username=f'{prefix}_{i}', password=encoded) for i in range(count))
+        Device.objects.bulk_create(
+            Device(name='phone', device_type='mobile', platform='iOS', user=user) for user in users
+        )
+        return [user.username for user in users]
+
+    @staticmethod
+    def _measure(login, usernames):
+        queries = 0
+
+        def count_queries(execute, sql, params, many, context):
+            nonlocal queries
+            queries += 1
+            return execute(sql, params, many, context)
+
+        latencies = []
+        with connection.execute_wrapper(count_queries):
+            start = time.perf_counter()
+            for username in usernames:
+                login_start = time.perf_counter()
+                login(username)
+                latencies.append(time.perf_counter() - login_start)
+            elapsed = time.perf_counter() - start
+        return len(usernames), queries, elapsed, latencies
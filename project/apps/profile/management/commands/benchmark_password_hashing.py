@@ -0,0 +1,105 @@
+import os
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth.hashers import get_hasher
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.profile.infrastructure.password_hashing import PasswordHashingPool, hash_password
+
+
+PASSWORD = 'benchmark-password'
+
+
+class Command(BaseCommand):
+    help = ('Measure password verification (the CPU-bound part of a login) per second and per core, '
+            'hashing inline and in worker process pools of the given sizes')
+
+    def add_arguments(self, parser):
+        cores = os.cpu_count() or 1
+        parser.add_argument('--workers', type=int, nargs='+', default=[0, cores],
+                            help='Pool sizes to compare; 0 hashes on the request threads (default: 0 and the core count)')
+        parser.add_argument('--threads', type=int, default=2 * cores,
+                            help='Concurrent request threads verifying passwords (default: twice the core count)')
+        parser.add_argument('--logins', type=int, default=50, help='Verifications per run')
+
+    def handle(self, *args, **options):
+        if options['logins'] < 1 or options['threads'] < 1 or min(options['workers']) < 0:
+            raise CommandError("--logins and --threads must be positive and --workers not negative")
+
+        cores = os.cpu_count() or 1
+        hasher = get_hasher()
+        encoded = hash_password(PASSWORD)
+        idle = self._probe_rate(lambda: time.sleep(0.5))
+        cost = ', '.join(
+            f"{key}={value}" for key, value in hasher.safe_summary(encoded).items()
+            if key not in ('algorithm', 'salt', 'hash', 'checksum')
+        )
+        self.stdout.write(f"Hasher {hasher.algorithm} ({cost})")
+        self.stdout.write(f"{cores} cores, {options['threads']} request threads, {options['logins']} logins per run")
+        self.stdout.write("'other threads' is how fast a pure-Python thread progresses during the run, against idle")
+        self.stdout.write('')
+
+        header = (f"{'workers':>8}{'logins/s':>11}{'per core':>10}{'mean ms':>10}{'p95 ms':>10}"
+                  f"{'max ms':>10}{'other threads':>15}")
+        self.stdout.write(header)
+        self.stdout.write('-' * len(header))
+        for workers in options['workers']:
+            pool = PasswordHashingPool(workers)
+            try:
+                # Start the worker processes before timing
+                pool.hash_many([PASSWORD] * workers)
+                latencies = []
+                elapsed = []
+                rate = self._probe_rate(lambda: elapsed.append(
+                    self._run(pool, encoded, options['threads'], options['logins'], latencies)
+                ))
+            finally:
+                pool.shutdown()
+
+            throughput = options['logins'] / elapsed[0]
+            # Hashing runs on at most this many cores at once
+            busy_cores = min(workers or options['threads'], cores)
+            latencies.sort()
+            p95 = statistics.quantiles(latencies, n=20, method='inclusive')[18] if len(latencies) > 1 else latencies[0]
+            self.stdout.write(
+                f"{workers:>8}{throughput:11.1f}{throughput / busy_cores:10.1f}"
+                f"{statistics.fmean(latencies) * 1e3:10.1f}{p95 * 1e3:10.1f}{latencies[-1] * 1e3:10.1f}"
+                f"{rate / idle:14.0%}"
+            )
+
+    @staticmethod
+    def _run(pool, encoded, threads, logins, latencies):
+        def login(_):
+            start = time.perf_counter()
+            valid, _ = pool.verify(PASSWORD, encoded)
+            latencies.append(time.perf_counter() - start)
+            if not valid:
+                raise CommandError("Password verification failed")
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            list(executor.map(login, range(logins)))
+        return time.perf_counter() - start
+
+    @staticmethod
+    def _probe_rate(workload):
+        """Run workload while a pure-Python thread counts, and return the count per second"""
+        stop = threading.Event()
+        count = [0]
+
+        def probe():
+            while not stop.is_set():
+                count[0] += 1
+
+        thread = threading.Thread(target=probe, daemon=True)
+        start = time.perf_counter()
+        thread.start()
+        try:
+            workload()
+        finally:
+            stop.set()
+            thread.join()
+        return count[0] / (time.perf_counter() - start)
@@ -0,0 +1,65 @@
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+from apps.profile.domain.entities import DeviceEntity
+from apps.profile.interfaces.entity_serializers import DeviceEntitySerializer
+from apps.profile.interfaces.serializers import DeviceSerializer
+from apps.profile.models import Device
+
+
+class Command(BaseCommand):
+    help = 'Compare DeviceEntitySerializer with the DRF DeviceSerializer (ModelSerializer) on a device list'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--devices', type=int, default=10000, help='Number of devices in the list')
+        parser.add_argument('--repeat', type=int, default=5, help='Number of timed runs per path (best is reported)')
+
+    def handle(self, *args, **options):
+        count = options['devices']
+        repeat = options['repeat']
+
+        # Nothing touches the database: both paths serialize in-memory objects
+        now = timezone.now()
+        user = User(id=1, username='__benchmark_serializers__')
+        models = [
+            Device(id=i, name=f'bench-{i}', device_type='mobile', platform='iOS', user=user,
+                   is_active=True, created_at=now, updated_at=now)
+            for i in range(count)
+        ]
+        entities = [
+            DeviceEntity(name=f'bench-{i}', device_type='mobile', platform='iOS', username=user.username,
+                         is_active=True, device_id=i, created_at=now, updated_at=now)
+            for i in range(count)
+        ]
+
+        renderer = JSONRenderer()
+        if renderer.render(DeviceSerializer(models, many=True).data) != \
+                renderer.render(DeviceEntitySerializer(entities, many=True).data):
+            raise CommandError("Serializers disagree on the output")
+
+        cases = [
+            ('ModelSerializer', lambda: DeviceSerializer(models, many=True).data),
+            ('EntitySerializer', lambda: DeviceEntitySerializer(entities, many=True).data),
+            ('ModelSerializer+json', lambda: renderer.render(DeviceSerializer(models, many=True).data)),
+            ('EntitySerializer+json', lambda: renderer.render(DeviceEntitySerializer(entities, many=True).data)),
+        ]
+
+        self.stdout.write(f"Serializing {count} devices, best of {repeat} runs")
+        results = {}
+        for name, run in cases:
+            results[name] = best = min(self._time(run) for _ in range(repeat))
+            self.stdout.write(f"{name:<22} {best * 1e3:9.2f} ms total {best / count * 1e6:9.2f} us/device")
+        self.stdout.write(
+            f"Speedup: {results['ModelSerializer'] / results['EntitySerializer']:.1f}x, "
+            f"{results['ModelSerializer+json'] / results['EntitySerializer+json']:.1f}x including JSON rendering"
+        )
+
+    @staticmethod
+    def _time(run):
+        start = time.perf_counter()
+        run()
+        return time.perf_counter() - start
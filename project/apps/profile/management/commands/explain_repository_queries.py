@@ -0,0 +1,165 @@
+import re
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from apps.profile.domain.entities import DeviceEntity
+from apps.profile.infrastructure.django_repositories_with_gateway import (
+    DjangoUserRepositoryWithGateway,
+    DjangoDeviceRepositoryWithGateway,
+    DjangoSessionRepositoryWithGateway
+)
+from apps.profile.models import Device, Session
+
+
+class Command(BaseCommand):
+    help = 'EXPLAIN every repository query against a seeded database and fail on large sequential scans'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=200, help='Number of users to seed')
+        parser.add_argument('--devices-per-user', type=int, default=10)
+        parser.add_argument('--sessions-per-user', type=int, default=20)
+        parser.add_argument('--threshold', type=int, default=1000,
+                            help='Fail when a table with more rows than this is scanned sequentially')
+
+    def handle(self, *args, **options):
+        if connection.vendor not in ('sqlite', 'postgresql'):
+            raise CommandError(f"EXPLAIN parsing is not implemented for {connection.vendor}")
+
+        # Seed inside a transaction that is always rolled back
+        with transaction.atomic():
+            username = self._seed(options)
+            table_sizes = {
+                'auth_user': User.objects.count(),
+                Device._meta.db_table: Device.objects.count(),
+                Session._meta.db_table: Session.objects.count(),
+            }
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE')
+
+            failures = []
+            for name, run in self._cases(username):
+                for sql, params in self._capture(run):
+                    plan = self._explain(sql, params)
+                    scanned = [
+                        table for table in self._sequential_scans(plan)
+                        if table_sizes.get(table, 0) > options['threshold']
+                    ]
+                    if options['verbosity'] > 1 or scanned:
+                        self.stdout.write(f"\n{name}: {sql}")
+                        for line in plan:
+                            self.stdout.write(f"    {line}")
+                    if scanned:
+                        failures.append(f"{name} scans {', '.join(scanned)}")
+                        self.stdout.write(self.style.ERROR(f"  sequential scan on {', '.join(scanned)}"))
+                    elif options['verbosity'] > 1:
+                        self.stdout.write(self.style.SUCCESS("  ok"))
+
+            transaction.set_rollback(True)
+
+        if failures:
+            raise CommandError("Sequential scans found:\n" + "\n".join(failures))
+        self.stdout.write(self.style.SUCCESS("No sequential scans above the threshold"))
+
+    def _seed(self, options):
+        users = User.objects.bulk_create(
+            User(username=f'__explain_{i}__', email=f'explain{i}@example.com')
+            for i in range(options['users'])
+        )
+        devices = Device.objects.bulk_create(
+            Device(name=f'device-{d}', device_type='mobile', platform='iOS', user=user)
+            for user in users for d in range(options['devices_per_user'])
+        )
+        devices_by_user = {}
+        for device in devices:
+            devices_by_user.setdefault(device.user_id, []).append(device)
+        Session.objects.bulk_create(
+            Session(
+                session_token=f'explain-{user.id}-{s}',
+                user=user,
+                device=devices_by_user[user.id][s % len(devices_by_user[user.id])] if devices_by_user else None,
+                is_active=s % 3 != 0,
+            )
+            for user in users for s in range(options['sessions_per_user'])
+        )
+        return users[0].username
+
+    def _cases(self, username):
+        users = DjangoUserRepositoryWithGateway()
+        devices = DjangoDeviceRepositoryWithGateway()
+        sessions = DjangoSessionRepositoryWithGateway()
+        device = Device.objects.filter(user__username=username).first()
+        token = Session.objects.filter(user__username=username).values_list('session_token', flat=True).first()
+        cursor = (timezone.now() - timedelta(days=1), 1 << 62)
+
+        return [
+            ('UserRepository.find_by_username', lambda: users.find_by_username(username)),
+            ('DeviceRepository.find_by_id', lambda: devices.find_by_id(device.id)),
+            ('DeviceRepository.find_by_name_and_user', lambda: devices.find_by_name_and_user(device.name, username)),
+            ('DeviceRepository.find_by_user', lambda: devices.find_by_user(username, limit=10)),
+            ('DeviceRepository.find_by_user(after)', lambda: devices.find_by_user(username, after=cursor, limit=10)),
+            ('DeviceRepository.iter_by_user', lambda: list(devices.iter_by_user(username))),
+            ('DeviceRepository.find_existing_names', lambda: devices.find_existing_names(username, [device.name])),
+            ('DeviceRepository.get_or_register(existing)', lambda: devices.get_or_register(DeviceEntity(
+                name=device.name, device_type='mobile', platform='iOS', username=username
+            ))),
+            ('DeviceRepository.set_active_status', lambda: devices.set_active_status(device.name, username, True)),
+            ('DeviceRepository.bulk_deactivate', lambda: devices.bulk_deactivate([device.id])),
+            ('SessionRepository.find_by_token', lambda: sessions.find_by_token(token)),
+            ('SessionRepository.find_by_user', lambda: sessions.find_by_user(username, limit=10)),
+            ('SessionRepository.find_by_user(after)', lambda: sessions.find_by_user(username, after=cursor, limit=10)),
+            ('SessionRepository.iter_by_user', lambda: list(sessions.iter_by_user(username))),
+            ('SessionRepository.iter_active_by_user', lambda: list(sessions.iter_active_by_user(username))),
+            ('SessionRepository.find_active_by_user', lambda: sessions.find_active_by_user(username, limit=10)),
+            ('SessionRepository.find_active_by_user(after)',
+             lambda: sessions.find_active_by_user(username, after=cursor, limit=10)),
+            ('SessionRepository.update_last_activity', lambda: sessions.update_last_activity(token)),
+            ('SessionRepository.bulk_update_last_activity',
+             lambda: sessions.bulk_update_last_activity({token: timezone.now()})),
+            ('SessionRepository.deactivate', lambda: sessions.deactivate(token)),
+            ('SessionRepository.deactivate_user_sessions', lambda: sessions.deactivate_user_sessions(username)),
+            ('SessionRepository.deactivate_device_sessions', lambda: sessions.deactivate_device_sessions(device.id)),
+            ('SessionRepository.deactivate_sessions_created_before',
+             lambda: sessions.deactivate_sessions_created_before(timezone.now() - timedelta(days=30))),
+            ('SessionRepository.delete', lambda: sessions.delete(token)),
+            ('SessionRepository.delete_inactive_batch', lambda: sessions.delete_inactive_batch(100)),
+            ('SessionRepository.delete_idle_batch',
+             lambda: sessions.delete_idle_batch(timezone.now() - timedelta(days=30), 100)),
+            ('SessionRepository.delete_inactive_sessions', lambda: sessions.delete_inactive_sessions()),
+            ('DeviceRepository.delete', lambda: devices.delete(device.id)),
+        ]
+
+    @staticmethod
+    def _capture(run):
+        statements = []
+
+        def capture(execute, sql, params, many, context):
+            if sql.lstrip().split(None, 1)[0].upper() in ('SELECT', 'UPDATE', 'DELETE'):
+                statements.append((sql, params))
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(capture):
+            run()
+        return statements
+
+    @staticmethod
+    def _explain(sql, params):
+        prefix = 'EXPLAIN QUERY PLAN ' if connection.vendor == 'sqlite' else 'EXPLAIN '
+        with connection.cursor() as cursor:
+            cursor.execute(prefix + sql, params)
+            rows = cursor.fetchall()
+        if connection.vendor == 'sqlite':
+            return [row[-1] for row in rows]
+        return [row[0] for row in rows]
+
+    @staticmethod
+    def _sequential_scans(plan):
+        if connection.vendor == 'sqlite':
+            # "SCAN <table>" without an index is a full table scan
+            pattern = re.compile(r'^SCAN (\w+)$')
+        else:
+            pattern = re.compile(r'Seq Scan on (\w+)')
+        return {match.group(1) for line in plan for match in [pattern.search(line.strip())] if match}
@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.profile.interfaces.entity_serializers import SessionEntitySerializer
+from apps.profile.interfaces.streaming import ndjson_stream
+from apps.profile.use_cases.services_with_gateway import SessionServiceWithGateway
+
+
+class Command(BaseCommand):
+    help = 'Write sessions as NDJSON for audits, in constant memory regardless of table size'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--username', help='Only export this user\'s sessions')
+        parser.add_argument('--active-only', action='store_true', help='Only export active sessions (needs --username)')
+        parser.add_argument('--chunk-size', type=int, default=2000, help='Rows fetched per database round trip')
+        parser.add_argument('--output', help='File to write (default: stdout)')
+
+    def handle(self, *args, **options):
+        if options['chunk_size'] < 1:
+            raise CommandError('--chunk-size must be at least 1')
+        if options['active_only'] and not options['username']:
+            raise CommandError('--active-only requires --username')
+
+        service = SessionServiceWithGateway()
+        if options['username']:
+            sessions = service.export_user_sessions(
+                options['username'], active_only=options['active_only'], chunk_size=options['chunk_size']
+            )
+        else:
+            sessions = service.export_all_sessions(chunk_size=options['chunk_size'])
+
+        written = 0
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as output:
+                for chunk in ndjson_stream(sessions, SessionEntitySerializer):
+                    output.write(chunk)
+                    written += chunk.count('\n')
+        else:
+            for chunk in ndjson_stream(sessions, SessionEntitySerializer):
+                self.stdout.write(chunk, ending='')
+                written += chunk.count('\n')
+        self.stderr.write(f"Exported {written} sessions")
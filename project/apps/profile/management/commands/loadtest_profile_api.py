@@ -0,0 +1,415 @@
+import asyncio
+import contextvars
+import http.client
+import json
+import random
+import statistics
+import threading
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.core.servers.basehttp import ThreadedWSGIServer, WSGIRequestHandler
+from django.db import DEFAULT_DB_ALIAS, connection
+from django.db.backends.signals import connection_created
+from django.test import override_settings
+from django.test.utils import setup_databases, teardown_databases
+from rest_framework.authtoken.models import Token
+
+from apps.profile.models import Device, Session
+
+
+API_PREFIX = '/api/profile'
+USER_PREFIX = '__load_'
+PASSWORD = 'load-test-password'
+ENDPOINT_HEADER = 'X-Loadtest-Endpoint'
+DEFAULT_MIX = 'list=30,get=20,sessions=10,create=15,update=10,delete=5,login=5,register=5'
+
+# The endpoint label of the request being served, for per-endpoint query counts
+current_endpoint = contextvars.ContextVar('current_endpoint', default=None)
+
+
+class QueryCounter:
+    """Count server-side queries and requests per endpoint label, across every server thread"""
+
+    def __init__(self):
+        self.queries = Counter()
+        self.requests = Counter()
+        self._lock = threading.Lock()
+
+    def install(self):
+        connection_created.connect(self._on_connection_created)
+
+    def uninstall(self):
+        connection_created.disconnect(self._on_connection_created)
+
+    def _on_connection_created(self, sender, connection, **kwargs):
+        if self._count not in connection.execute_wrappers:
+            connection.execute_wrappers.append(self._count)
+
+    def _count(self, execute, sql, params, many, context):
+        label = current_endpoint.get()
+        if label is not None:
+            with self._lock:
+                self.queries[label] += 1
+        return execute(sql, params, many, context)
+
+    def wrap_wsgi(self, application):
+        def app(environ, start_response):
+            label = environ.get('HTTP_' + ENDPOINT_HEADER.upper().replace('-', '_'))
+            self._count_request(label)
+            reset = current_endpoint.set(label)
+            try:
+                return application(environ, start_response)
+            finally:
+                current_endpoint.reset(reset)
+        return app
+
+    def wrap_asgi(self, application):
+        header = ENDPOINT_HEADER.lower().encode()
+
+        async def app(scope, receive, send):
+            label = None
+            if scope['type'] == 'http':
+                label = next((value.decode() for name, value in scope['headers'] if name == header), None)
+                self._count_request(label)
+            reset = current_endpoint.set(label)
+            try:
+                await application(scope, receive, send)
+            finally:
+                current_endpoint.reset(reset)
+        return app
+
+    def _count_request(self, label):
+        if label is not None:
+            with self._lock:
+                self.requests[label] += 1
+
+
+class QuietWSGIRequestHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+class WSGIServerThread:
+    """Django's threaded development WSGI server, on an ephemeral port in a background thread"""
+
+    def __init__(self, application):
+        self.server = ThreadedWSGIServer(('127.0.0.1', 0), QuietWSGIRequestHandler, allow_reuse_address=False)
+        self.server.set_app(application)
+        self.url = f'http://127.0.0.1:{self.server.server_address[1]}'
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+
+
+class ASGIServerThread:
+    """uvicorn serving the ASGI application in a background thread"""
+
+    def __init__(self, application):
+        try:
+            import uvicorn
+        except ImportError:
+            raise CommandError("--server asgi needs uvicorn (pip install uvicorn)")
+        config = uvicorn.Config(application, host='127.0.0.1', port=0, log_level='warning', lifespan='off')
+        self.server = uvicorn.Server(config)
+        self.url = None
+        self.thread = threading.Thread(target=asyncio.run, args=(self.server.serve(),), daemon=True)
+
+    def start(self):
+        self.thread.start()
+        while not self.server.started:
+            if not self.thread.is_alive():
+                raise CommandError("uvicorn failed to start")
+            time.sleep(0.01)
+        port = self.server.servers[0].sockets[0].getsockname()[1]
+        self.url = f'http://127.0.0.1:{port}'
+
+    def stop(self):
+        self.server.should_exit = True
+        self.thread.join()
+
+
+class VirtualUser:
+    """One client connection acting as a seeded user; each endpoint method returns (method, path, body)"""
+
+    def __init__(self, base_url, username, token, device_ids, rng):
+        parts = urlsplit(base_url)
+        self.connection = http.client.HTTPConnection(parts.hostname, parts.port, timeout=60)
+        self.prefix = parts.path.rstrip('/') + API_PREFIX
+        self.username = username
+        self.token = token
+        self.device_ids = device_ids
+        self.created_ids = []
+        self.rng = rng
+
+    def request(self, label, method, path, body=None):
+        """Send one request over the keep-alive connection and return (status, seconds, payload)"""
+        headers = {'Authorization': f'Token {self.token}', ENDPOINT_HEADER: label}
+        data = None
+        if body is not None:
+            data = json.dumps(body).encode()
+            headers['Content-Type'] = 'application/json'
+
+        start = time.perf_counter()
+        try:
+            self.connection.request(method, self.prefix + path, body=data, headers=headers)
+            response = self.connection.getresponse()
+            payload = response.read()
+        except (http.client.HTTPException, OSError):
+            # The server dropped the keep-alive connection; the next request reconnects
+            self.connection.close()
+            return None, time.perf_counter() - start, b''
+        elapsed = time.perf_counter() - start
+        if response.getheader('Connection', '').lower() == 'close':
+            self.connection.close()
+        return response.status, elapsed, payload
+
+    def close(self):
+        self.connection.close()
+
+    def list(self):
+        return 'GET', '/devices/list/?limit=20', None
+
+    def get(self):
+        return 'GET', f'/devices/{self.rng.choice(self.device_ids)}/', None
+
+    def sessions(self):
+        return 'GET', '/sessions/?limit=20', None
+
+    def create(self):
+        return 'POST', '/devices/', {
+            'name': f'load-{self.rng.getrandbits(64):x}', 'device_type': 'mobile', 'platform': 'iOS'
+        }
+
+    def update(self):
+        return 'PUT', f'/devices/{self.rng.choice(self.device_ids)}/', {
+            'platform': self.rng.choice(('iOS', 'Android'))
+        }
+
+    def delete(self):
+        # Only delete devices this client created, so reads never race a delete
+        if not self.created_ids:
+            return self.create()
+        return 'DELETE', f'/devices/{self.created_ids.pop()}/', None
+
+    def login(self):
+        return 'POST', '/login/', {'username': self.username, 'password': PASSWORD}
+
+    def register(self):
+        return 'POST', '/register/', {
+            'username': f'{USER_PREFIX}new_{self.rng.getrandbits(64):x}__',
+            'email': 'load@example.com',
+            'password': PASSWORD
+        }
+
+
+ENDPOINTS = ('list', 'get', 'sessions', 'create', 'update', 'delete', 'login', 'register')
+
+
+class Command(BaseCommand):
+    help = ('Seed users, tokens and devices in a throwaway test database, then drive the profile API through '
+            'a local WSGI or ASGI server at a given concurrency and report latency percentiles, throughput and '
+            'queries per endpoint')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--server', choices=('wsgi', 'asgi'), default='wsgi',
+                            help='Server started in-process: Django\'s threaded WSGI server, or uvicorn for ASGI')
+        parser.add_argument('--url', help='Target an already running server instead (queries are not counted); '
+                                          'needs --use-configured-database')
+        parser.add_argument('--use-configured-database', action='store_true',
+                            help=f'Seed and afterwards delete {USER_PREFIX}* users in the configured database, '
+                                 f'which the server behind --url reads')
+        parser.add_argument('--users', type=int, default=50, help='Users seeded, each with a token')
+        parser.add_argument('--devices', type=int, default=20, help='Devices (and sessions) seeded per user')
+        parser.add_argument('--requests', type=int, default=2000, help='Total requests sent')
+        parser.add_argument('--concurrency', type=int, default=16, help='Concurrent client connections')
+        parser.add_argument('--mix', default=DEFAULT_MIX,
+                            help=f'Endpoint weights, from {", ".join(ENDPOINTS)} (default: {DEFAULT_MIX})')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed for the request sequence')
+
+    def handle(self, *args, **options):
+        if options['users'] < 1 or options['devices'] < 1 or options['concurrency'] < 1:
+            raise CommandError('--users, --devices and --concurrency must be at least 1')
+        mix = self._parse_mix(options['mix'])
+        if options['url'] and not options['use_configured_database']:
+            raise CommandError(
+                f"--url seeds {USER_PREFIX}* users in the configured database the server reads; "
+                f"pass --use-configured-database to allow it"
+            )
+        if connection.vendor == 'sqlite':
+            self.stderr.write(self.style.WARNING(
+                'SQLite serializes writers: concurrent writes queue and may fail with "database is locked"'
+            ))
+
+        old_config = None
+        if options['use_configured_database']:
+            self._cleanup()
+        else:
+            old_config = setup_databases(verbosity=0, interactive=False, aliases={DEFAULT_DB_ALIAS})
+        try:
+            clients = self._seed(options['users'], options['devices'])
+            self.stdout.write(
+                f"Seeded {options['users']} users with {options['devices']} devices each; "
+                f"{options['requests']} requests, concurrency {options['concurrency']}"
+            )
+            if options['url']:
+                elapsed, results = self._drive(options['url'], clients, mix, options)
+                self._report(elapsed, results, counter=None)
+            else:
+                self._run_local_server(clients, mix, options)
+        finally:
+            # Under the test runner the in-memory test database is the one already in use, so clean up either way
+            self._cleanup()
+            if old_config is not None:
+                teardown_databases(old_config, verbosity=0)
+
+    @staticmethod
+    def _parse_mix(value):
+        mix = {}
+        for item in value.split(','):
+            name, _, weight = item.partition('=')
+            name = name.strip()
+            if name not in ENDPOINTS:
+                raise CommandError(f"Unknown endpoint '{name}' in --mix; choose from {', '.join(ENDPOINTS)}")
+            try:
+                mix[name] = float(weight)
+            except ValueError:
+                raise CommandError(f"Invalid weight for '{name}' in --mix")
+        if not any(weight > 0 for weight in mix.values()):
+            raise CommandError('--mix needs at least one positive weight')
+        return mix
+
+    @staticmethod
+    def _cleanup():
+        User.objects.filter(username__startswith=USER_PREFIX).delete()
+
+    @staticmethod
+    def _seed(user_count, devices_per_user):
+        # Hash once: every seeded user shares the password
+        password = make_password(PASSWORD)
+        users = User.objects.bulk_create(
+            User(username=f'{USER_PREFIX}{i}__', email=f'load{i}@example.com', password=password)
+            for i in range(user_count)
+        )
+        tokens = Token.objects.bulk_create(Token(key=Token.generate_key(), user=user) for user in users)
+        devices = Device.objects.bulk_create(
+            Device(name=f'device-{i}', device_type='mobile', platform='iOS', user=user)
+            for user in users for i in range(devices_per_user)
+        )
+        Session.objects.bulk_create(
+            Session(session_token=f'load-{device.id}', user_id=device.user_id, device=device,
+                    ip_address='127.0.0.1', user_agent='loadtest')
+            for device in devices
+        )
+
+        device_ids = defaultdict(list)
+        for device in devices:
+            device_ids[device.user_id].append(device.id)
+        return [(user.username, token.key, device_ids[user.id]) for user, token in zip(users, tokens)]
+
+    def _run_local_server(self, clients, mix, options):
+        counter = QueryCounter()
+        if options['server'] == 'wsgi':
+            server = WSGIServerThread(counter.wrap_wsgi(WSGIHandler()))
+        else:
+            server = ASGIServerThread(counter.wrap_asgi(ASGIHandler()))
+
+        with override_settings(ALLOWED_HOSTS=['127.0.0.1']):
+            counter.install()
+            # Server threads open their own connections; this one stays out of the counts
+            connection.close()
+            server.start()
+            try:
+                self.stdout.write(f"Serving {options['server'].upper()} on {server.url}")
+                elapsed, results = self._drive(server.url, clients, mix, options)
+            finally:
+                server.stop()
+                counter.uninstall()
+        self._report(elapsed, results, counter)
+
+    @staticmethod
+    def _drive(base_url, clients, mix, options):
+        """Send the requests from concurrent virtual users; return the wall time and per-endpoint samples"""
+        names, weights = zip(*mix.items())
+        concurrency = options['concurrency']
+        total = options['requests']
+        shares = [total // concurrency + (i < total % concurrency) for i in range(concurrency)]
+
+        def worker(index):
+            username, token, device_ids = clients[index % len(clients)]
+            rng = random.Random(options['seed'] * 1000003 + index)
+            user = VirtualUser(base_url, username, token, device_ids, rng)
+            samples = defaultdict(list)
+            try:
+                for label in rng.choices(names, weights, k=shares[index]):
+                    method, path, body = getattr(user, label)()
+                    if method == 'POST' and path == '/devices/':
+                        label = 'create'
+                    status, seconds, payload = user.request(label, method, path, body)
+                    samples[label].append((status, seconds))
+                    if label == 'create' and status == 201:
+                        user.created_ids.append(json.loads(payload)['id'])
+            finally:
+                user.close()
+            return samples
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(concurrency) as pool:
+            per_worker = list(pool.map(worker, range(concurrency)))
+        elapsed = time.perf_counter() - start
+
+        results = defaultdict(list)
+        for samples in per_worker:
+            for label, items in samples.items():
+                results[label].extend(items)
+        return elapsed, results
+
+    def _report(self, elapsed, results, counter):
+        header = (f"{'endpoint':<10}{'requests':>9}{'errors':>8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}"
+                  f"{'max ms':>9}{'req/s':>9}{'queries':>9}  statuses")
+        self.stdout.write(header)
+        self.stdout.write('-' * len(header))
+
+        total = errors = 0
+        for label in ENDPOINTS:
+            samples = results.get(label)
+            if not samples:
+                continue
+            latencies = sorted(seconds * 1e3 for _, seconds in samples)
+            statuses = Counter(status for status, _ in samples)
+            failed = sum(count for status, count in statuses.items() if status is None or status >= 500)
+            p50, p95, p99 = self._percentiles(latencies)
+            queries = '-'
+            if counter is not None and counter.requests[label]:
+                queries = f"{counter.queries[label] / counter.requests[label]:.1f}"
+
+            total += len(samples)
+            errors += failed
+            self.stdout.write(
+                f"{label:<10}{len(samples):>9}{failed:>8}{p50:9.1f}{p95:9.1f}{p99:9.1f}{latencies[-1]:9.1f}"
+                f"{len(samples) / elapsed:9.1f}{queries:>9}  "
+                + ' '.join(f"{status or 'conn'}:{count}" for status, count in sorted(statuses.items(), key=str))
+            )
+
+        self.stdout.write('-' * len(header))
+        self.stdout.write(f"{total} requests in {elapsed:.2f}s: {total / elapsed:.1f} req/s, {errors} errors")
+
+    @staticmethod
+    def _percentiles(latencies):
+        if len(latencies) == 1:
+            return latencies * 3
+        cuts = statistics.quantiles(latencies, n=100, method='inclusive')
+        return cuts[49], cuts[94], cuts[98]
@@ -0,0 +1,50 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.profile.use_cases.services_with_gateway import SessionServiceWithGateway
+
+
+class Command(BaseCommand):
+    help = 'Delete inactive (and optionally idle) sessions in bounded, rate-limited batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Rows deleted per statement')
+        parser.add_argument('--sleep', type=float, default=0.1, help='Seconds to pause between batches')
+        parser.add_argument('--max-idle-days', type=float, default=None,
+                            help='Also delete sessions whose last activity is older than this many days')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be at least 1')
+        max_idle = None
+        if options['max_idle_days'] is not None:
+            max_idle = timedelta(days=options['max_idle_days'])
+
+        start = time.perf_counter()
+        deleted = 0
+
+        def report(count):
+            nonlocal deleted
+            deleted += count
+            elapsed = time.perf_counter() - start
+            self.stdout.write(f"deleted {deleted} sessions ({deleted / elapsed:.0f} rows/s)")
+
+        try:
+            SessionServiceWithGateway().purge_sessions(
+                max_idle=max_idle,
+                batch_size=options['batch_size'],
+                pause=options['sleep'],
+                on_batch=report,
+            )
+        except KeyboardInterrupt:
+            # Completed batches are already committed; re-running continues from here
+            self.stdout.write(self.style.WARNING(
+                f"Interrupted after {deleted} sessions; run the command again to resume"
+            ))
+            return
+
+        elapsed = time.perf_counter() - start
+        rate = deleted / elapsed if elapsed else 0
+        self.stdout.write(self.style.SUCCESS(f"Purged {deleted} sessions in {elapsed:.1f}s ({rate:.0f} rows/s)"))
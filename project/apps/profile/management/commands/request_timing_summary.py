@@ -0,0 +1,86 @@
+import json
+import statistics
+import sys
+from collections import defaultdict
+from contextlib import nullcontext
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.profile.infrastructure.instrumentation import CATEGORIES
+
+
+SORT_KEYS = ('time', 'count', 'mean', 'p95', 'queries')
+
+
+class Command(BaseCommand):
+    help = ('Aggregate the request_timing log lines written by RequestTimingMiddleware '
+            '(PROFILE_REQUEST_TIMING) into a per-endpoint summary')
+
+    def add_arguments(self, parser):
+        parser.add_argument('logs', nargs='*', default=['-'], help='Log files to read (default: stdin)')
+        parser.add_argument('--sort', choices=SORT_KEYS, default='time',
+                            help='time: total time spent (default), count, mean, p95 or queries per request')
+        parser.add_argument('--limit', type=int, help='Only show the first N endpoints')
+
+    def handle(self, *args, **options):
+        endpoints = defaultdict(list)
+        for path in options['logs']:
+            try:
+                source = nullcontext(sys.stdin) if path == '-' else open(path, encoding='utf-8')
+            except OSError as e:
+                raise CommandError(f"Cannot read {path}: {e}")
+            with source as lines:
+                for record in self._records(lines):
+                    endpoint = record['endpoint'] or record['path']
+                    endpoints[(record['method'], endpoint)].append(record)
+
+        if not endpoints:
+            raise CommandError("No request_timing records found; is PROFILE_REQUEST_TIMING enabled?")
+
+        rows = [self._summarize(method, endpoint, records) for (method, endpoint), records in endpoints.items()]
+        sort_key = {'time': 'total_s', 'count': 'count', 'mean': 'mean_ms', 'p95': 'p95_ms', 'queries': 'queries'}
+        rows.sort(key=lambda row: row[sort_key[options['sort']]], reverse=True)
+        if options['limit']:
+            rows = rows[:options['limit']]
+
+        header = (f"{'endpoint':<48}{'count':>7}{'total s':>9}{'mean ms':>9}{'p95 ms':>9}{'max ms':>9}"
+                  f"{'queries':>9}" + ''.join(f"{category + ' ms':>13}" for category in CATEGORIES))
+        self.stdout.write(header)
+        self.stdout.write('-' * len(header))
+        for row in rows:
+            self.stdout.write(
+                f"{row['name'][:47]:<48}{row['count']:>7}{row['total_s']:9.2f}{row['mean_ms']:9.1f}"
+                f"{row['p95_ms']:9.1f}{row['max_ms']:9.1f}{row['queries']:9.1f}"
+                + ''.join(f"{row[category]:13.1f}" for category in CATEGORIES)
+            )
+
+    @staticmethod
+    def _records(lines):
+        """Yield the request_timing objects in lines, skipping any other log output"""
+        for line in lines:
+            start = line.find('{')
+            if start == -1:
+                continue
+            try:
+                record = json.loads(line[start:])
+            except ValueError:
+                continue
+            if isinstance(record, dict) and record.get('event') == 'request_timing':
+                yield record
+
+    @staticmethod
+    def _summarize(method, endpoint, records):
+        totals = sorted(record['total_ms'] for record in records)
+        count = len(records)
+        row = {
+            'name': f"{method} {endpoint}",
+            'count': count,
+            'total_s': sum(totals) / 1e3,
+            'mean_ms': statistics.fmean(totals),
+            'p95_ms': statistics.quantiles(totals, n=20, method='inclusive')[18] if count > 1 else totals[0],
+            'max_ms': totals[-1],
+            'queries': statistics.fmean(record['db_queries'] for record in records),
+        }
+        for category in CATEGORIES:
+            row[category] = statistics.fmean(record[f'{category}_ms'] for record in records)
+        return row
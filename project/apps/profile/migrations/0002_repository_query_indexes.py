@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:33
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('profile', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='device',
+            index=models.Index(fields=['user', '-created_at', '-id'], name='device_user_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='session',
+            index=models.Index(fields=['user', '-last_activity', '-id'], name='session_user_activity_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='session',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['user', '-last_activity', '-id'], name='session_user_active_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='session',
+            index=models.Index(condition=models.Q(('is_active', False)), fields=['id'], name='session_inactive_idx'),
+        ),
+    ]
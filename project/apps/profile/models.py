@@ -21,6 +21,10 @@ class Device(models.Model):
         db_table = 'device'
         unique_together = ('name', 'user')
         ordering = ['-created_at']
+        indexes = [
+            # find_by_user: filter by user, newest first with id tie-breaker
+            models.Index(fields=['user', '-created_at', '-id'], name='device_user_created_idx'),
+        ]
 
     def __str__(self):
         return f"{self.name} - {self.user.username}"
@@ -40,6 +44,24 @@ class Session(models.Model):
     class Meta:
         db_table = 'session'
         ordering = ['-last_activity']
+        indexes = [
+            # find_by_user: filter by user, most recently active first
+            models.Index(fields=['user', '-last_activity', '-id'], name='session_user_activity_idx'),
+            # find_active_by_user: same order, active rows only
+            models.Index(
+                fields=['user', '-last_activity', '-id'],
+                condition=models.Q(is_active=True),
+                name='session_user_active_idx',
+            ),
+            # delete_inactive_sessions: locate inactive rows without a full scan
+            models.Index(fields=['id'], condition=models.Q(is_active=False), name='session_inactive_idx'),
+            # purge_sessions: locate sessions idle past a cutoff
+            models.Index(fields=['last_activity'], name='session_last_activity_idx'),
+            # deactivate_sessions_created_before: active sessions older than a cutoff
+            models.Index(
+                fields=['created_at'], condition=models.Q(is_active=True), name='session_active_created_idx'
+            ),
+        ]
 
     def __str__(self):
         return f"Session for {self.user.username} - {self.session_token[:10]}..."
\ No newline at end of file
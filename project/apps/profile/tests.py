@@ -1,15 +1,53 @@
-from django.test import TestCase
+import asyncio
+import base64
+import json
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from asgiref.sync import SyncToAsync, async_to_sync
+from django.core.handlers.asgi import ASGIHandler
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import CommandError, call_command
+from django.db import OperationalError, connection, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.contrib.auth.hashers import PBKDF2SHA1PasswordHasher
 from django.contrib.auth.models import User
 from rest_framework.test import APITestCase
 from rest_framework import status
 from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import ValidationError
 from apps.profile.models import Device, Session
-from apps.profile.domain.entities import DeviceEntity, SessionEntity
+from apps.profile.domain.entities import UserEntity, DeviceEntity, SessionEntity
+from apps.profile.infrastructure.gateways import DeviceGateway, SessionGateway
+from apps.profile.infrastructure.activity_tracker import SessionActivityTracker, get_activity_tracker
+from apps.profile.infrastructure.cached_repositories import CachedDeviceRepository, get_device_cache
+from apps.profile.infrastructure.password_hashing import PasswordHashingPool
+from apps.profile.infrastructure.session_index import IndexedSessionRepository, SessionTokenIndex, get_session_index
+from apps.profile.infrastructure.key_value_cache import LocalCache
+from apps.profile.infrastructure.token_cache import build_token_cache, get_token_cache
+from apps.profile.infrastructure.unit_of_work import unit_of_work
+from apps.profile.interfaces.authentication import CookieTokenAuthentication
+from apps.profile.interfaces.entity_serializers import DeviceEntitySerializer, SessionEntitySerializer
+from apps.profile.interfaces.middleware import RequestTimingMiddleware
+from apps.profile.interfaces.pagination import encode_cursor
+from apps.profile.interfaces.serializers import DeviceSerializer
 from apps.profile.infrastructure.django_repositories_with_gateway import (
     DjangoUserRepositoryWithGateway, 
     DjangoDeviceRepositoryWithGateway,
     DjangoSessionRepositoryWithGateway
 )
+from apps.profile.use_cases.async_services_with_gateway import (
+    AsyncDeviceServiceWithGateway,
+    AsyncSessionServiceWithGateway
+)
 from apps.profile.use_cases.services_with_gateway import (
     UserServiceWithGateway, 
     DeviceServiceWithGateway,
@@ -120,9 +158,1560 @@ class DeviceAPITestCase(APITestCase):
         
         response = self.client.get('/api/profile/devices/list/')
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 1)
+        self.assertEqual(len(response.data['results']), 1)
+        self.assertIsNone(response.data['next_cursor'])
 
     def test_unauthorized_access(self):
         self.client.credentials()  # Remove credentials
         response = self.client.get('/api/profile/devices/list/')
         self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+class RepositoryQueryCountTestCase(TestCase):
+    """Each repository read must cost a constant number of queries regardless of row count"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="testuser", email="test@example.com")
+        self.device_repo = DjangoDeviceRepositoryWithGateway()
+        self.session_repo = DjangoSessionRepositoryWithGateway()
+
+    def _seed(self, count):
+        for i in range(count):
+            device = Device.objects.create(
+                name=f"Device {i}", device_type="mobile", platform="iOS", user=self.user
+            )
+            Session.objects.create(
+                session_token=f"token-{i}", user=self.user, device=device
+            )
+
+    def test_device_find_by_user(self):
+        self._seed(5)
+        with self.assertNumQueries(1):
+            devices = self.device_repo.find_by_user("testuser")
+            self.assertEqual({d.username for d in devices}, {"testuser"})
+
+    def test_device_find_by_id(self):
+        self._seed(1)
+        device = Device.objects.get()
+        with self.assertNumQueries(1):
+            self.assertEqual(self.device_repo.find_by_id(device.id).username, "testuser")
+
+    def test_device_find_by_name_and_user(self):
+        self._seed(1)
+        with self.assertNumQueries(1):
+            self.assertEqual(self.device_repo.find_by_name_and_user("Device 0", "testuser").username, "testuser")
+
+    def test_device_add(self):
+        device = DeviceEntity(name="New", device_type="laptop", platform="Linux", username="testuser")
+        with self.assertNumQueries(2):
+            self.assertEqual(self.device_repo.add(device).username, "testuser")
+
+    def test_session_find_by_user(self):
+        self._seed(5)
+        with self.assertNumQueries(1):
+            sessions = self.session_repo.find_by_user("testuser")
+            self.assertEqual(len(sessions), 5)
+            self.assertTrue(all(s.device_name for s in sessions))
+
+    def test_session_find_active_by_user(self):
+        self._seed(5)
+        with self.assertNumQueries(1):
+            self.assertEqual(len(self.session_repo.find_active_by_user("testuser")), 5)
+
+    def test_session_find_by_token(self):
+        self._seed(1)
+        with self.assertNumQueries(1):
+            session = self.session_repo.find_by_token("token-0")
+            self.assertEqual(session.username, "testuser")
+            self.assertEqual(session.device_name, "Device 0")
+
+    def test_session_add(self):
+        self._seed(1)
+        session = SessionEntity(session_token="new-token", username="testuser", device_name="Device 0")
+        with self.assertNumQueries(3):
+            self.assertEqual(self.session_repo.add(session).device_name, "Device 0")
+
+class DirtyFieldUpdateTestCase(TestCase):
+    """Updates are a single UPDATE that writes only the fields changed since load"""
+
+    def setUp(self):
+        get_device_cache().clear()
+        self.user = User.objects.create_user(username="testuser", email="test@example.com")
+        self.device = Device.objects.create(name="Laptop", device_type="laptop", platform="Linux", user=self.user)
+        self.session = Session.objects.create(session_token="token", user=self.user, device=self.device)
+        self.device_repo = DjangoDeviceRepositoryWithGateway()
+        self.session_repo = DjangoSessionRepositoryWithGateway()
+
+    def test_device_update_writes_changed_fields_only(self):
+        device = self.device_repo.find_by_id(self.device.id)
+        device.platform = "Windows"
+        with CaptureQueriesContext(connection) as queries:
+            updated = self.device_repo.update(device)
+        self.assertEqual(len(queries), 1)
+        sql = queries[0]['sql']
+        self.assertTrue(sql.startswith('UPDATE'))
+        self.assertIn('"platform"', sql)
+        self.assertNotIn('"name"', sql)
+        self.assertNotIn('"user_id"', sql)
+        self.assertEqual(updated.changed_fields(), set())
+        self.device.refresh_from_db()
+        self.assertEqual(self.device.platform, "Windows")
+        self.assertEqual(self.device.updated_at, updated.updated_at)
+
+    def test_device_update_without_changes_skips_query(self):
+        device = self.device_repo.find_by_id(self.device.id)
+        with self.assertNumQueries(0):
+            self.device_repo.update(device)
+
+    def test_fresh_device_entity_writes_all_fields(self):
+        other = User.objects.create_user(username="other")
+        device = DeviceEntity(name="Renamed", device_type="tablet", platform="iOS", username="other",
+                              is_active=False, device_id=self.device.id)
+        with self.assertNumQueries(1):
+            self.device_repo.update(device)
+        self.device.refresh_from_db()
+        self.assertEqual(
+            (self.device.name, self.device.device_type, self.device.user_id, self.device.is_active),
+            ("Renamed", "tablet", other.id, False)
+        )
+
+    def test_update_of_missing_device_raises(self):
+        device = DeviceEntity(name="Gone", device_type="laptop", platform="Linux", username="testuser",
+                              device_id=self.device.id + 100)
+        with self.assertRaises(Device.DoesNotExist):
+            self.device_repo.update(device)
+
+    def test_update_to_unknown_user_raises(self):
+        device = self.device_repo.find_by_id(self.device.id)
+        device.username = "nobody"
+        with self.assertRaisesMessage(User.DoesNotExist, "User nobody not found"):
+            self.device_repo.update(device)
+        with self.assertRaisesMessage(User.DoesNotExist, "User nobody not found"):
+            async_to_sync(AsyncDeviceServiceWithGateway().device_repository.update)(device)
+        session = self.session_repo.find_by_token("token")
+        session.username = "nobody"
+        with self.assertRaisesMessage(User.DoesNotExist, "User nobody not found"):
+            self.session_repo.update(session)
+        self.assertEqual(Device.objects.get().user_id, self.user.id)
+        self.assertEqual(Session.objects.get().user_id, self.user.id)
+
+    def test_set_active_status_is_one_update(self):
+        with self.assertNumQueries(1):
+            self.device_repo.set_active_status("Laptop", "testuser", False)
+        self.assertFalse(Device.objects.get().is_active)
+
+    def test_session_update_writes_changed_fields_only(self):
+        session = self.session_repo.find_by_token("token")
+        session.is_active = False
+        with CaptureQueriesContext(connection) as queries:
+            self.session_repo.update(session)
+        self.assertEqual(len(queries), 1)
+        self.assertNotIn('"device_id"', queries[0]['sql'])
+        self.assertFalse(Session.objects.get().is_active)
+
+    def test_session_update_moves_device(self):
+        Device.objects.create(name="Phone", device_type="mobile", platform="iOS", user=self.user)
+        session = self.session_repo.find_by_token("token")
+        session.device_name = "Phone"
+        with self.assertNumQueries(1):
+            self.session_repo.update(session)
+        self.assertEqual(Session.objects.get().device.name, "Phone")
+
+    def test_deactivate_device_returns_updated_device(self):
+        device = DeviceServiceWithGateway().deactivate_device(self.device.id)
+        self.assertFalse(device.is_active)
+        self.assertFalse(Device.objects.get().is_active)
+
+
+class GatewayRowHydrationTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="testuser", email="test@example.com")
+        device = Device.objects.create(name="Laptop", device_type="laptop", platform="Linux", user=self.user)
+        Session.objects.create(session_token="with-device", user=self.user, device=device, ip_address="127.0.0.1")
+        Session.objects.create(session_token="without-device", user=self.user)
+
+    def test_device_rows_match_model_conversion(self):
+        rows = Device.objects.values_list(*DeviceGateway.ROW_FIELDS)
+        self.assertEqual(
+            DeviceGateway.rows_to_entities(rows),
+            [DeviceGateway.model_to_entity(d) for d in Device.objects.all()]
+        )
+
+    def test_session_rows_match_model_conversion(self):
+        rows = Session.objects.values_list(*SessionGateway.ROW_FIELDS)
+        self.assertEqual(
+            SessionGateway.rows_to_entities(rows),
+            [SessionGateway.model_to_entity(s) for s in Session.objects.all()]
+        )
+
+class LocalCacheTestCase(TestCase):
+    def test_entries_expire_after_timeout(self):
+        cache = LocalCache(timeout=0)
+        cache.set("key", "value")
+        self.assertIsNone(cache.get("key"))
+
+    def test_least_recently_used_entry_is_evicted(self):
+        cache = LocalCache(timeout=60, max_entries=2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+        self.assertEqual(cache.get("a"), 1)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("c"), 3)
+
+    def test_several_workers_need_a_shared_cache(self):
+        with override_settings(PROFILE_TOKEN_CACHE={'BACKEND': 'local', 'WORKERS': 4}):
+            with self.assertRaises(ImproperlyConfigured):
+                build_token_cache()
+        with override_settings(PROFILE_TOKEN_CACHE={'BACKEND': 'django', 'WORKERS': 4}):
+            # The default cache is locmem, itself per process
+            with self.assertRaises(ImproperlyConfigured):
+                build_token_cache()
+        with override_settings(PROFILE_TOKEN_CACHE={'BACKEND': 'local', 'WORKERS': 1}):
+            self.assertIsInstance(build_token_cache(), LocalCache)
+
+
+class CachedTokenAuthenticationTestCase(APITestCase):
+    def setUp(self):
+        get_token_cache().clear()
+        self.user = User.objects.create_user(username="testuser", email="test@example.com", password="testpass123")
+        self.token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.key)
+
+    def test_repeated_requests_skip_token_lookup(self):
+        self.client.get('/api/profile/devices/list/')
+        # Only the device listing itself hits the database
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/profile/devices/list/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_delete_user_invalidates_cached_token(self):
+        self.client.get('/api/profile/devices/list/')
+        UserServiceWithGateway().delete_user("testuser")
+        response = self.client.get('/api/profile/devices/list/')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_password_change_invalidates_cached_token(self):
+        self.client.get('/api/profile/devices/list/')
+        response = self.client.post('/api/profile/change-password/', {"new_password": "newpass456"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIsNone(get_token_cache().get(self.token.key))
+
+    def test_password_change_invalidates_again_on_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            UserServiceWithGateway().update_password("testuser", "newpass456")
+            # A concurrent request re-caches the old credentials before the commit
+            get_token_cache().set(self.token.key, "stale")
+        self.assertIsNone(get_token_cache().get(self.token.key))
+
+    def test_logout_deletes_and_invalidates_the_token(self):
+        self.client.get('/api/profile/devices/list/')
+        SessionServiceWithGateway().logout_user("testuser")
+        self.assertIsNone(get_token_cache().get(self.token.key))
+        self.assertFalse(Token.objects.filter(user=self.user).exists())
+        response = self.client.get('/api/profile/devices/list/')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_async_logout_deletes_the_token(self):
+        async_to_sync(AsyncSessionServiceWithGateway().logout_user)("testuser")
+        self.assertFalse(Token.objects.filter(user=self.user).exists())
+        response = self.client.get('/api/profile/devices/list/')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_each_request_gets_its_own_user(self):
+        authentication = CookieTokenAuthentication()
+        first_user, first_token = authentication.authenticate_credentials(self.token.key)
+        second_user, second_token = authentication.authenticate_credentials(self.token.key)
+        self.assertIsNot(first_user, second_user)
+        self.assertEqual(second_user, self.user)
+        self.assertEqual(second_token.key, self.token.key)
+        self.assertIs(second_token.user, second_user)
+        first_user.is_active = False
+        self.assertTrue(authentication.authenticate_credentials(self.token.key)[0].is_active)
+
+    def test_deleting_the_token_invalidates_it(self):
+        self.client.get('/api/profile/devices/list/')
+        self.token.delete()
+        self.assertIsNone(get_token_cache().get(self.token.key))
+        response = self.client.get('/api/profile/devices/list/')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_deactivating_the_user_invalidates_its_tokens(self):
+        self.client.get('/api/profile/devices/list/')
+        self.user.is_active = False
+        self.user.save(update_fields=['is_active'])
+        response = self.client.get('/api/profile/devices/list/')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_password_set_on_the_model_invalidates_its_tokens(self):
+        self.client.get('/api/profile/devices/list/')
+        self.user.set_password("newpass456")
+        self.user.save()
+        self.assertIsNone(get_token_cache().get(self.token.key))
+
+    def test_saving_other_fields_keeps_the_cache(self):
+        self.client.get('/api/profile/devices/list/')
+        self.user.last_login = timezone.now()
+        self.user.save(update_fields=['last_login'])
+        self.assertIsNotNone(get_token_cache().get(self.token.key))
+
+    def test_saving_unchanged_credentials_skips_the_token_lookup(self):
+        self.client.get('/api/profile/devices/list/')
+        self.user.email = "new@example.com"
+        # Only the UPDATE runs; the user's token keys are not looked up
+        with self.assertNumQueries(1):
+            self.user.save()
+        self.assertIsNotNone(get_token_cache().get(self.token.key))
+
+        user = User.objects.get(username="testuser")
+        user.is_active = False
+        user.save()
+        self.assertIsNone(get_token_cache().get(self.token.key))
+
+class SessionActivityTrackerTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="testuser", email="test@example.com")
+        for i in range(3):
+            Session.objects.create(session_token=f"token-{i}", user=self.user)
+        self.repo = DjangoSessionRepositoryWithGateway()
+
+    def _tracker(self, **options):
+        options = {"flush_interval": 3600, "max_pending": 100, "min_resolution": 60, **options}
+        tracker = SessionActivityTracker(options.pop("repository", self.repo), **options)
+        self.addCleanup(tracker.shutdown)
+        return tracker
+
+    def test_touches_are_buffered_and_flushed_in_one_update(self):
+        tracker = self._tracker()
+        before = Session.objects.get(session_token="token-0").last_activity
+        with self.assertNumQueries(0):
+            for i in range(3):
+                tracker.touch(f"token-{i}")
+        with self.assertNumQueries(1):
+            tracker.flush()
+        self.assertGreater(Session.objects.get(session_token="token-0").last_activity, before)
+        self.assertEqual(tracker.pending_count(), 0)
+
+    def test_touch_within_resolution_is_ignored(self):
+        tracker = self._tracker()
+        tracker.touch("token-0")
+        tracker.flush()
+        tracker.touch("token-0")
+        self.assertEqual(tracker.pending_count(), 0)
+
+    def test_max_pending_wakes_the_flush_thread(self):
+        repository = RecordingActivityRepository()
+        tracker = self._tracker(max_pending=2, repository=repository)
+        with self.assertNumQueries(0):
+            tracker.touch("token-0")
+            tracker.touch("token-1")
+        self.assertTrue(repository.flushed.wait(5))
+        self.assertEqual(set(repository.writes[0]), {"token-0", "token-1"})
+
+    def test_failed_background_flush_is_logged_and_retried(self):
+        repository = RecordingActivityRepository(fail=True)
+        tracker = self._tracker(max_pending=1, repository=repository)
+        with self.assertLogs('apps.profile.infrastructure.activity_tracker', 'ERROR'):
+            tracker.touch("token-0")
+            self.assertTrue(repository.flushed.wait(5))
+            # The failure is logged once the flush returns; wait for it before leaving the block
+            for _ in range(100):
+                if tracker.pending_count():
+                    break
+                time.sleep(0.01)
+        self.assertEqual(tracker.pending_count(), 1)
+        repository.fail = False
+
+    def test_shutdown_flushes_pending_touches(self):
+        tracker = self._tracker()
+        tracker.touch("token-0")
+        tracker.shutdown()
+        self.assertEqual(tracker.pending_count(), 0)
+
+    def test_thread_starts_on_first_touch_in_each_process(self):
+        tracker = self._tracker(repository=RecordingActivityRepository())
+        self.assertIsNone(tracker._thread)
+        tracker.touch("token-0")
+        first = tracker._thread
+        self.assertTrue(first.is_alive())
+        # As if forked: the child inherits the parent's state, but not its thread
+        tracker._pid = -1
+        tracker.touch("token-1")
+        self.assertIsNot(tracker._thread, first)
+        self.assertEqual(tracker.pending_count(), 1)
+        tracker._stop.set()
+        tracker._wake.set()
+        first.join()
+
+    def test_services_share_one_tracker(self):
+        tracker = get_activity_tracker()
+        self.assertIs(SessionServiceWithGateway().activity_tracker, tracker)
+        self.assertIs(SessionServiceWithGateway().activity_tracker, tracker)
+
+
+class RecordingActivityRepository:
+    """Stands in for the session repository behind a SessionActivityTracker"""
+
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.writes = []
+        self.flushed = threading.Event()
+
+    def bulk_update_last_activity(self, activity):
+        self.flushed.set()
+        if self.fail:
+            raise OperationalError("database is locked")
+        self.writes.append(activity)
+
+class BulkRepositoryTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="testuser", email="test@example.com")
+        self.other = User.objects.create_user(username="otheruser", email="other@example.com")
+        self.device_repo = DjangoDeviceRepositoryWithGateway()
+        self.session_repo = DjangoSessionRepositoryWithGateway()
+
+    def _devices(self, count):
+        return [
+            DeviceEntity(name=f"Device {i}", device_type="mobile", platform="iOS",
+                         username="testuser" if i % 2 else "otheruser")
+            for i in range(count)
+        ]
+
+    def test_device_bulk_add_resolves_users_once(self):
+        # One SELECT for the users and one INSERT, joining the enclosing transaction
+        with self.assertNumQueries(2):
+            saved = self.device_repo.bulk_add(self._devices(10))
+        self.assertEqual(Device.objects.count(), 10)
+        self.assertTrue(all(device.device_id for device in saved))
+        self.assertEqual(Device.objects.get(id=saved[1].device_id).user, self.user)
+
+    def test_device_bulk_add_unknown_user(self):
+        device = DeviceEntity(name="Ghost", device_type="mobile", platform="iOS", username="nobody")
+        with self.assertRaises(User.DoesNotExist):
+            self.device_repo.bulk_add([device])
+
+    def test_device_bulk_deactivate_and_delete(self):
+        ids = [device.device_id for device in self.device_repo.bulk_add(self._devices(4))]
+        with self.assertNumQueries(1):
+            self.device_repo.bulk_deactivate(ids[:2])
+        self.assertEqual(Device.objects.filter(is_active=False).count(), 2)
+        self.device_repo.bulk_delete(ids[2:])
+        self.assertEqual(Device.objects.count(), 2)
+
+    def test_session_bulk_add_links_devices(self):
+        self.device_repo.bulk_add(self._devices(2))
+        sessions = [
+            SessionEntity(session_token="a", username="otheruser", device_name="Device 0"),
+            SessionEntity(session_token="b", username="testuser", device_name="Device 1"),
+            SessionEntity(session_token="c", username="testuser", device_name="Device 0"),
+        ]
+        with self.assertNumQueries(3):
+            saved = self.session_repo.bulk_add(sessions)
+        self.assertEqual([s.device_name for s in saved], ["Device 0", "Device 1", None])
+        self.assertEqual(Session.objects.get(session_token="b").device.name, "Device 1")
+
+    def test_session_bulk_deactivate_and_delete(self):
+        self.session_repo.bulk_add([SessionEntity(session_token=t, username="testuser") for t in "abc"])
+        self.session_repo.bulk_deactivate(["a", "b"])
+        self.assertEqual(Session.objects.filter(is_active=True).count(), 1)
+        self.session_repo.bulk_delete(["a", "c"])
+        self.assertEqual(list(Session.objects.values_list("session_token", flat=True)), ["b"])
+
+    def test_user_bulk_add_and_delete(self):
+        repo = DjangoUserRepositoryWithGateway()
+        repo.bulk_add([UserEntity(username=f"bulk{i}", email=f"bulk{i}@example.com", password="pw") for i in range(3)])
+        self.assertTrue(User.objects.get(username="bulk0").check_password("pw"))
+        repo.bulk_delete(["bulk0", "bulk1"])
+        self.assertEqual(User.objects.filter(username__startswith="bulk").count(), 1)
+
+class DeviceDetailAPITestCase(APITestCase):
+    def setUp(self):
+        get_device_cache().clear()
+        self.user = User.objects.create_user(username="testuser", email="test@example.com", password="testpass123")
+        self.client.force_authenticate(self.user)
+        self.device = Device.objects.create(name="Laptop", device_type="laptop", platform="Linux", user=self.user)
+
+    def test_put_updates_given_fields(self):
+        response = self.client.put(f'/api/profile/devices/{self.device.id}/', {"platform": "Windows"}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual((response.data['name'], response.data['platform']), ("Laptop", "Windows"))
+        self.device.refresh_from_db()
+        self.assertEqual(self.device.platform, "Windows")
+
+    def test_deactivate_returns_device(self):
+        response = self.client.post(f'/api/profile/devices/{self.device.id}/deactivate/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse(response.data['is_active'])
+
+    def test_other_users_device_is_not_found(self):
+        other = User.objects.create_user(username="other")
+        device = Device.objects.create(name="Phone", device_type="mobile", platform="iOS", user=other)
+        response = self.client.get(f'/api/profile/devices/{device.id}/')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class BatchDeviceAPITestCase(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="testuser", email="test@example.com", password="testpass123")
+        self.client.force_authenticate(self.user)
+        Device.objects.create(name="Existing", device_type="laptop", platform="Linux", user=self.user)
+
+    def test_batch_create_reports_per_item_status(self):
+        devices = [
+            {"name": "Phone", "device_type": "mobile", "platform": "iOS"},
+            {"name": "Existing", "device_type": "laptop", "platform": "Linux"},
+            {"name": "Phone", "device_type": "mobile", "platform": "Android"},
+            {"name": "Tablet"},
+        ]
+        response = self.client.post('/api/profile/devices/batch/', {"devices": devices}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_207_MULTI_STATUS)
+        self.assertEqual(response.data['created'], 1)
+        self.assertEqual(
+            [result['status'] for result in response.data['results']],
+            ['created', 'duplicate', 'duplicate', 'invalid']
+        )
+        self.assertEqual(response.data['results'][0]['device']['username'], "testuser")
+        self.assertEqual(Device.objects.filter(user=self.user).count(), 2)
+
+    def test_batch_create_query_count_is_constant(self):
+        devices = [{"name": f"Device {i}", "device_type": "mobile", "platform": "iOS"} for i in range(50)]
+        # duplicate check, user lookup, INSERT, and the request's and the INSERT's savepoints
+        with self.assertNumQueries(7):
+            response = self.client.post('/api/profile/devices/batch/', {"devices": devices}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['created'], 50)
+
+    def test_batch_create_rejects_empty_list(self):
+        response = self.client.post('/api/profile/devices/batch/', {"devices": []}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+class CursorPaginationTestCase(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="testuser", email="test@example.com")
+        self.client.force_authenticate(self.user)
+        # Identical timestamps force the id tie-breaker to be used
+        Device.objects.bulk_create(
+            Device(name=f"Device {i}", device_type="mobile", platform="iOS", user=self.user)
+            for i in range(7)
+        )
+        Device.objects.update(created_at=timezone.now())
+        Session.objects.bulk_create(
+            Session(session_token=f"token-{i}", user=self.user, is_active=i % 2 == 0)
+            for i in range(5)
+        )
+
+    def _collect(self, url, **extra):
+        ids, cursor = [], None
+        while True:
+            params = {'limit': 3, **extra}
+            if cursor:
+                params['cursor'] = cursor
+            response = self.client.get(url, params)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertLessEqual(len(response.data['results']), 3)
+            ids.extend(item['id'] for item in response.data['results'])
+            cursor = response.data['next_cursor']
+            if cursor is None:
+                return ids
+
+    def test_device_pages_cover_every_device_once(self):
+        ids = self._collect('/api/profile/devices/list/')
+        self.assertEqual(ids, list(Device.objects.order_by('-id').values_list('id', flat=True)))
+
+    def test_session_pages_respect_active_filter(self):
+        ids = self._collect('/api/profile/sessions/', active_only='true')
+        self.assertEqual(len(ids), 3)
+
+    def test_repository_keyset_query_count(self):
+        repo = DjangoDeviceRepositoryWithGateway()
+        first = repo.find_by_user("testuser", limit=2)
+        with self.assertNumQueries(1):
+            second = repo.find_by_user("testuser", after=(first[-1].created_at, first[-1].device_id), limit=2)
+        self.assertTrue(set(d.device_id for d in first).isdisjoint(d.device_id for d in second))
+
+    def test_invalid_cursor_is_rejected(self):
+        response = self.client.get('/api/profile/devices/list/', {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_naive_cursor_is_rejected(self):
+        naive = base64.urlsafe_b64encode(json.dumps(["2024-01-01T00:00:00", 1]).encode()).decode()
+        response = self.client.get('/api/profile/devices/list/', {'cursor': naive})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        aware = encode_cursor((timezone.now(), 1))
+        self.assertEqual(self.client.get('/api/profile/devices/list/', {'cursor': aware}).status_code,
+                         status.HTTP_200_OK)
+
+class RepositoryQueryPlanTestCase(TestCase):
+    def test_repository_queries_use_indexes(self):
+        out = StringIO()
+        call_command('explain_repository_queries', users=50, threshold=100, stdout=out)
+        self.assertIn("No sequential scans", out.getvalue())
+
+class PurgeSessionsTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="testuser", email="test@example.com")
+        Session.objects.bulk_create(
+            Session(session_token=f"inactive-{i}", user=self.user, is_active=False) for i in range(7)
+        )
+        Session.objects.bulk_create(
+            Session(session_token=f"active-{i}", user=self.user) for i in range(3)
+        )
+        Session.objects.filter(session_token__in=["active-0", "active-1"]).update(
+            last_activity=timezone.now() - timedelta(days=40)
+        )
+        self.service = SessionServiceWithGateway()
+
+    def test_purge_deletes_inactive_sessions_in_batches(self):
+        batches = []
+        deleted = self.service.purge_sessions(batch_size=3, on_batch=batches.append)
+        self.assertEqual(deleted, 7)
+        self.assertEqual(batches, [3, 3, 1])
+        self.assertEqual(Session.objects.count(), 3)
+
+    def test_purge_expires_idle_sessions(self):
+        deleted = self.service.purge_sessions(max_idle=timedelta(days=30), batch_size=100)
+        self.assertEqual(deleted, 9)
+        self.assertEqual(list(Session.objects.values_list("session_token", flat=True)), ["active-2"])
+
+    def test_purge_command_reports_progress(self):
+        out = StringIO()
+        call_command('purge_sessions', batch_size=5, sleep=0, stdout=out)
+        self.assertIn("Purged 7 sessions", out.getvalue())
+
+class AsyncDeviceAPITestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="testuser", email="test@example.com")
+        self.token = Token.objects.create(user=self.user)
+        self.auth = {"headers": {"Authorization": f"Token {self.token.key}"}}
+
+    async def test_create_list_deactivate_and_delete(self):
+        response = await self.async_client.post(
+            '/api/profile/async/devices/',
+            {"name": "iPhone 15", "device_type": "mobile", "platform": "iOS"},
+            content_type='application/json', **self.auth
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        device_id = response.json()['id']
+
+        response = await self.async_client.post(
+            '/api/profile/async/devices/',
+            {"name": "iPhone 15", "device_type": "mobile", "platform": "iOS"},
+            content_type='application/json', **self.auth
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        response = await self.async_client.get('/api/profile/async/devices/', **self.auth)
+        self.assertEqual([d['name'] for d in response.json()['results']], ["iPhone 15"])
+
+        response = await self.async_client.post(f'/api/profile/async/devices/{device_id}/deactivate/', **self.auth)
+        self.assertFalse(response.json()['is_active'])
+
+        response = await self.async_client.delete(f'/api/profile/async/devices/{device_id}/', **self.auth)
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(response.content, b"")
+        self.assertFalse(await Device.objects.filter(id=device_id).aexists())
+
+    async def test_requires_authentication(self):
+        response = await self.async_client.get('/api/profile/async/devices/')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        response = await self.async_client.get('/api/profile/async/sessions/', headers={"Authorization": "Token bogus"})
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    async def test_other_users_device_is_not_found(self):
+        other = await User.objects.acreate(username="otheruser")
+        device = await Device.objects.acreate(name="Theirs", device_type="mobile", platform="iOS", user=other)
+        response = await self.async_client.get(f'/api/profile/async/devices/{device.id}/', **self.auth)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    async def test_list_sessions(self):
+        await Session.objects.acreate(session_token="active", user=self.user)
+        await Session.objects.acreate(session_token="inactive", user=self.user, is_active=False)
+        response = await self.async_client.get('/api/profile/async/sessions/', {"active_only": "true"}, **self.auth)
+        self.assertEqual(len(response.json()['results']), 1)
+
+
+class UnitOfWorkTestCase(APITestCase):
+    def setUp(self):
+        get_device_cache().clear()
+        self.user = User.objects.create_user(username="testuser", email="test@example.com", password="testpass123")
+        self.device = Device.objects.create(name="Laptop", device_type="laptop", platform="Linux", user=self.user)
+        self.device_repo = DjangoDeviceRepositoryWithGateway()
+        self.session_repo = DjangoSessionRepositoryWithGateway()
+
+    def test_repeated_loads_are_served_from_the_identity_map(self):
+        with unit_of_work():
+            with self.assertNumQueries(1):
+                device = self.device_repo.find_by_id(self.device.id)
+                self.assertEqual(self.device_repo.find_by_id(self.device.id), device)
+                self.assertEqual(self.device_repo.find_by_name_and_user("Laptop", "testuser"), device)
+            self.assertEqual(self.device_repo.find_by_user("testuser")[0], device)
+
+    def test_unsaved_changes_do_not_leak_into_later_lookups(self):
+        with unit_of_work():
+            device = self.device_repo.find_by_id(self.device.id)
+            device.name = "Renamed"
+            with self.assertNumQueries(0):
+                reloaded = self.device_repo.find_by_id(self.device.id)
+                self.assertIsNot(reloaded, device)
+                self.assertEqual(reloaded.name, "Laptop")
+                self.assertEqual(reloaded.changed_fields(), set())
+            self.device_repo.update(device)
+            self.assertEqual(self.device_repo.find_by_id(self.device.id).name, "Renamed")
+
+    def test_users_and_devices_are_resolved_once(self):
+        with unit_of_work():
+            self.device_repo.add(DeviceEntity(name="Phone", device_type="mobile", platform="iOS", username="testuser"))
+            # The user id and the device both come from the identity map; only the INSERT runs
+            with self.assertNumQueries(1):
+                session = self.session_repo.add(
+                    SessionEntity(session_token="token", username="testuser", device_name="Phone")
+                )
+        self.assertEqual(session.device_name, "Phone")
+        self.assertEqual(Session.objects.get().device.name, "Phone")
+
+    def test_writes_evict_stale_entities(self):
+        with unit_of_work():
+            self.device_repo.find_by_id(self.device.id)
+            self.device_repo.set_active_status("Laptop", "testuser", False)
+            self.assertFalse(self.device_repo.find_by_id(self.device.id).is_active)
+            self.device_repo.delete(self.device.id)
+            self.assertIsNone(self.device_repo.find_by_id(self.device.id))
+
+    def test_failure_rolls_back_every_write(self):
+        with self.assertRaises(User.DoesNotExist):
+            with unit_of_work():
+                self.device_repo.add(DeviceEntity(name="Phone", device_type="mobile", platform="iOS",
+                                                  username="testuser"))
+                self.device_repo.add(DeviceEntity(name="Ghost", device_type="mobile", platform="iOS",
+                                                  username="nobody"))
+        self.assertEqual(list(Device.objects.values_list('name', flat=True)), ["Laptop"])
+
+    def test_views_share_loads_within_a_request(self):
+        self.client.force_authenticate(self.user)
+        # SAVEPOINT, one SELECT shared by the ownership check and the service, UPDATE, RELEASE
+        with self.assertNumQueries(4):
+            response = self.client.post(f'/api/profile/devices/{self.device.id}/deactivate/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse(Device.objects.get().is_active)
+
+    def test_uncaught_view_error_rolls_back_the_request(self):
+        self.client.force_authenticate(self.user)
+        self.client.raise_request_exception = False
+
+        def deactivate_then_fail(service, device_id):
+            Device.objects.filter(id=device_id).update(is_active=False)
+            raise RuntimeError("fails after writing")
+
+        with mock.patch.object(DeviceServiceWithGateway, 'deactivate_device', deactivate_then_fail):
+            response = self.client.post(f'/api/profile/devices/{self.device.id}/deactivate/')
+        self.assertEqual(response.status_code, status.HTTP_500_INTERNAL_SERVER_ERROR)
+        self.assertTrue(Device.objects.get().is_active)
+
+    def test_error_response_rolls_back_the_request(self):
+        self.client.force_authenticate(self.user)
+
+        def deactivate_then_reject(service, device_id):
+            Device.objects.filter(id=device_id).update(is_active=False)
+            raise ValidationError("rejected after writing")
+
+        with mock.patch.object(DeviceServiceWithGateway, 'deactivate_device', deactivate_then_reject):
+            response = self.client.post(f'/api/profile/devices/{self.device.id}/deactivate/')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertTrue(Device.objects.get().is_active)
+
+    def test_asgi_middleware_chain_stays_async(self):
+        handler = ASGIHandler()
+        self.assertTrue(asyncio.iscoroutinefunction(handler._middleware_chain))
+        self.assertNotIsInstance(handler._middleware_chain, SyncToAsync)
+
+
+class CachedDeviceRepositoryTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="testuser", email="test@example.com")
+        self.device = Device.objects.create(name="Laptop", device_type="laptop", platform="Linux", user=self.user)
+        self.repo = CachedDeviceRepository(DjangoDeviceRepositoryWithGateway(), LocalCache())
+
+    def test_find_by_id_reads_through(self):
+        with self.assertNumQueries(1), self.captureOnCommitCallbacks(execute=True):
+            first = self.repo.find_by_id(self.device.id)
+        with self.assertNumQueries(0):
+            second = self.repo.find_by_id(self.device.id)
+        self.assertEqual(first, second)
+        self.assertEqual(second.changed_fields(), set())
+        self.assertEqual(self.repo.stats(), {'hits': 1, 'misses': 1, 'hit_rate': 0.5})
+
+    def test_rows_read_in_a_transaction_are_cached_on_commit(self):
+        try:
+            with transaction.atomic():
+                Device.objects.filter(id=self.device.id).update(name="Uncommitted")
+                self.repo.find_by_id(self.device.id)
+                raise RuntimeError
+        except RuntimeError:
+            pass
+        self.assertIsNone(self.repo.cache.get(CachedDeviceRepository.id_key(self.device.id)))
+        self.assertEqual(self.repo.find_by_id(self.device.id).name, "Laptop")
+
+    def test_find_by_name_and_user_shares_the_id_entry(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.repo.find_by_name_and_user("Laptop", "testuser")
+        with self.assertNumQueries(0):
+            self.assertEqual(self.repo.find_by_id(self.device.id).name, "Laptop")
+            self.assertEqual(self.repo.find_by_name_and_user("Laptop", "testuser").device_id, self.device.id)
+
+    def test_update_invalidates(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            device = self.repo.find_by_id(self.device.id)
+        device.name = "Renamed"
+        self.repo.update(device)
+        self.assertEqual(self.repo.find_by_id(self.device.id).name, "Renamed")
+        # The old name entry points at a row that no longer matches it
+        self.assertIsNone(self.repo.find_by_name_and_user("Laptop", "testuser"))
+
+    def test_set_active_status_and_delete_invalidate(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.repo.find_by_id(self.device.id)
+        self.repo.set_active_status("Laptop", "testuser", False)
+        self.assertFalse(self.repo.find_by_id(self.device.id).is_active)
+        self.repo.delete(self.device.id)
+        self.assertIsNone(self.repo.find_by_id(self.device.id))
+
+    def test_async_writes_invalidate_the_shared_cache(self):
+        get_device_cache().clear()
+        repo = CachedDeviceRepository(DjangoDeviceRepositoryWithGateway(), get_device_cache())
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertTrue(repo.find_by_id(self.device.id).is_active)
+        service = AsyncDeviceServiceWithGateway()
+        async_to_sync(service.deactivate_device)(self.device.id)
+        self.assertFalse(repo.find_by_id(self.device.id).is_active)
+        async_to_sync(service.delete_device)(self.device.id)
+        self.assertIsNone(repo.find_by_id(self.device.id))
+
+    def test_async_find_by_id_shares_the_cache(self):
+        get_device_cache().clear()
+        repo = CachedDeviceRepository(DjangoDeviceRepositoryWithGateway(), get_device_cache())
+        service = AsyncDeviceServiceWithGateway()
+        with self.captureOnCommitCallbacks(execute=True):
+            repo.find_by_id(self.device.id)
+        with self.assertNumQueries(0):
+            self.assertEqual(async_to_sync(service.get_device_by_id)(self.device.id).name, "Laptop")
+
+        get_device_cache().clear()
+        with self.captureOnCommitCallbacks(execute=True):
+            async_to_sync(service.get_device_by_id)(self.device.id)
+        with self.assertNumQueries(0):
+            self.assertEqual(repo.find_by_id(self.device.id).name, "Laptop")
+
+    def test_delete_user_invalidates_cached_devices(self):
+        get_device_cache().clear()
+        repo = CachedDeviceRepository(DjangoDeviceRepositoryWithGateway(), get_device_cache())
+        with self.captureOnCommitCallbacks(execute=True):
+            repo.find_by_id(self.device.id)
+        UserServiceWithGateway().delete_user("testuser")
+        self.assertIsNone(repo.find_by_id(self.device.id))
+
+    def test_concurrent_misses_load_once(self):
+        loads = []
+
+        class SlowRepository(DjangoDeviceRepositoryWithGateway):
+            def find_by_id(self, device_id):
+                loads.append(device_id)
+                time.sleep(0.05)
+                return DeviceEntity(name="Slow", device_type="laptop", platform="Linux", username="testuser",
+                                    device_id=device_id, created_at=timezone.now(), updated_at=timezone.now())
+
+        repo = CachedDeviceRepository(SlowRepository(), LocalCache())
+        with ThreadPoolExecutor(8) as pool:
+            devices = list(pool.map(repo.find_by_id, [42] * 8))
+        self.assertEqual(loads, [42])
+        self.assertTrue(all(device.name == "Slow" for device in devices))
+        self.assertEqual(repo.stats()['misses'], 1)
+
+
+class EntitySerializerTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="testuser", email="test@example.com")
+        self.device = Device.objects.create(name="Laptop", device_type="laptop", platform="Linux", user=self.user)
+
+    def test_device_output_matches_model_serializer(self):
+        entity = DjangoDeviceRepositoryWithGateway().find_by_id(self.device.id)
+        self.assertEqual(DeviceEntitySerializer(entity).data, dict(DeviceSerializer(self.device).data))
+
+    def test_many_and_stream(self):
+        entities = DjangoDeviceRepositoryWithGateway().find_by_user("testuser")
+        stream = DeviceEntitySerializer(entities, many=True).stream()
+        self.assertEqual(next(stream)['name'], "Laptop")
+        self.assertEqual(DeviceEntitySerializer(entities, many=True).data[0]['id'], self.device.id)
+
+    def test_missing_datetimes_stay_none(self):
+        session = SessionEntity(session_token="token", username="testuser")
+        data = SessionEntitySerializer(session).data
+        self.assertIsNone(data['created_at'])
+        self.assertEqual(set(data), {'id', 'device_name', 'ip_address', 'user_agent', 'is_active',
+                                     'created_at', 'last_activity'})
+
+    def test_benchmark_command_checks_output(self):
+        out = StringIO()
+        call_command('benchmark_serializers', devices=50, repeat=1, stdout=out)
+        self.assertIn('Speedup', out.getvalue())
+
+
+class StreamingExportAPITestCase(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="testuser", email="test@example.com", password="testpass123")
+        self.client.force_authenticate(self.user)
+        Device.objects.bulk_create(
+            Device(name=f"Device {i}", device_type="mobile", platform="iOS", user=self.user) for i in range(5)
+        )
+        Session.objects.create(session_token="token", user=self.user, device=Device.objects.get(name="Device 0"))
+
+    def test_iter_by_user_yields_every_row_in_chunks(self):
+        devices = DjangoDeviceRepositoryWithGateway().iter_by_user("testuser", chunk_size=2)
+        self.assertEqual(
+            [device.name for device in devices],
+            [device.name for device in DjangoDeviceRepositoryWithGateway().find_by_user("testuser")]
+        )
+
+    def test_json_array_export(self):
+        response = self.client.get('/api/profile/devices/export/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        devices = json.loads(b''.join(response.streaming_content))
+        self.assertEqual(len(devices), 5)
+        self.assertEqual(set(devices[0]), set(DeviceSerializer.Meta.fields))
+
+    def test_ndjson_export(self):
+        response = self.client.get('/api/profile/sessions/export/', {"export_format": "ndjson"})
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual([json.loads(line)['device_name'] for line in lines], ["Device 0"])
+
+    def test_empty_export_is_a_valid_array(self):
+        Device.objects.all().delete()
+        response = self.client.get('/api/profile/devices/export/')
+        self.assertEqual(json.loads(b''.join(response.streaming_content)), [])
+
+    async def test_asgi_export_streams_asynchronously(self):
+        token = await Token.objects.acreate(user=self.user)
+        response = await self.async_client.get(
+            '/api/profile/devices/export/', headers={"Authorization": f"Token {token.key}"}
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        # Django would otherwise read the whole export into memory before sending it
+        self.assertTrue(response.is_async)
+        chunks = [chunk async for chunk in response.streaming_content]
+        self.assertEqual(len(json.loads(b''.join(chunks))), 5)
+
+    def test_unknown_format_is_rejected(self):
+        response = self.client.get('/api/profile/devices/export/', {"export_format": "xml"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class RepositoryIterationTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="testuser", email="test@example.com")
+        other = User.objects.create_user(username="other")
+        Session.objects.bulk_create(
+            Session(session_token=f"token-{i}", user=self.user if i % 2 else other, is_active=i % 3 != 0)
+            for i in range(10)
+        )
+        self.repo = DjangoSessionRepositoryWithGateway()
+
+    def test_iter_active_by_user(self):
+        tokens = {session.session_token for session in self.repo.iter_active_by_user("testuser", chunk_size=2)}
+        self.assertEqual(tokens, {"token-1", "token-5", "token-7"})
+
+    def test_iter_all_is_lazy_and_chunked(self):
+        sessions = self.repo.iter_all(chunk_size=3)
+        # Nothing is queried until the first entity is requested, then one chunk at a time
+        with self.assertNumQueries(0):
+            iterator = iter(sessions)
+        self.assertEqual(next(iterator).session_token, "token-0")
+        self.assertEqual(len(list(iterator)), 9)
+
+    def test_device_iter_all(self):
+        Device.objects.create(name="Laptop", device_type="laptop", platform="Linux", user=self.user)
+        self.assertEqual([d.name for d in DjangoDeviceRepositoryWithGateway().iter_all()], ["Laptop"])
+        self.assertEqual(list(DjangoDeviceRepositoryWithGateway().iter_active_by_user("other")), [])
+
+    def test_export_sessions_command(self):
+        out = StringIO()
+        call_command('export_sessions', chunk_size=4, stdout=out, stderr=StringIO())
+        lines = out.getvalue().splitlines()
+        self.assertEqual(len(lines), 10)
+        self.assertEqual(json.loads(lines[0])['is_active'], False)
+
+
+class CompactEntityTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="testuser", email="test@example.com")
+        device = Device.objects.create(name="Laptop", device_type="laptop", platform="Linux", user=self.user)
+        Session.objects.bulk_create(
+            Session(session_token=f"token-{i}", user=self.user, device=device if i % 2 else None)
+            for i in range(5)
+        )
+
+    def test_entities_and_dtos_are_slotted(self):
+        device = DeviceEntity(name="Laptop", device_type="laptop", platform="Linux", username="testuser")
+        self.assertFalse(hasattr(device, '__dict__'))
+        dto = DeviceGateway.entity_to_dto(device, user_id=self.user.id)
+        self.assertFalse(hasattr(dto, '__dict__'))
+        with self.assertRaises(AttributeError):
+            dto.name = "Renamed"
+
+    def test_session_batch_matches_entities(self):
+        rows = list(Session.objects.order_by('id').values_list(*SessionGateway.ROW_FIELDS))
+        batch = SessionGateway.rows_to_batch(rows)
+        self.assertEqual(len(batch), 5)
+        self.assertEqual(list(batch), SessionGateway.rows_to_entities(rows))
+        self.assertEqual(batch[1].device_name, "Laptop")
+        self.assertEqual(batch.column('session_token')[4], "token-4")
+        self.assertEqual(len(SessionGateway.rows_to_batch([])), 0)
+
+    def test_iter_batches(self):
+        batches = list(DjangoSessionRepositoryWithGateway().iter_batches(chunk_size=2))
+        self.assertEqual([len(batch) for batch in batches], [2, 2, 1])
+        self.assertEqual(batches[2][0].session_token, "token-4")
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class GatewayBenchmarkTestCase(TestCase):
+    def test_benchmarks_cover_every_method_and_compare_with_baseline(self):
+        with tempfile.TemporaryDirectory() as directory:
+            baseline = os.path.join(directory, 'baseline.json')
+            out = StringIO()
+            call_command('benchmark_gateways', sizes=[200], rounds=1, min_time=0, save=baseline,
+                         stdout=out, stderr=StringIO())
+            self.assertIn("benchmark 'rows=200'", out.getvalue())
+
+            with open(baseline) as saved:
+                results = {result['name']: result for result in json.load(saved)['benchmarks']}
+            self.assertEqual(results['DeviceRepository.find_by_id']['queries_per_op'], 1)
+            self.assertEqual(results['DeviceGateway.rows_to_entities(100)']['queries_per_op'], 0)
+
+            out = StringIO()
+            call_command('benchmark_gateways', sizes=[200], rounds=1, min_time=0, compare=baseline,
+                         threshold=1000, stdout=out, stderr=StringIO())
+            self.assertIn("No regressions", out.getvalue())
+        self.assertFalse(User.objects.filter(username__startswith='__bench_').exists())
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class LoadTestCommandTestCase(TransactionTestCase):
+    def test_drives_every_endpoint_through_a_local_server(self):
+        out = StringIO()
+        call_command('loadtest_profile_api', users=2, devices=3, requests=40, concurrency=1,
+                     mix='list=1,get=1,sessions=1,create=1,update=1,delete=1,register=1',
+                     stdout=out, stderr=StringIO())
+        report = {line.split()[0]: line.split() for line in out.getvalue().splitlines() if line}
+        for endpoint in ('list', 'get', 'sessions', 'create', 'update', 'delete', 'register'):
+            self.assertEqual(report[endpoint][2], '0', out.getvalue())
+        self.assertGreaterEqual(float(report['list'][8]), 1)
+        self.assertFalse(User.objects.filter(username__startswith='__load_').exists())
+
+    def test_remote_server_needs_explicit_consent_to_seed_the_database(self):
+        with self.assertRaises(CommandError):
+            call_command('loadtest_profile_api', url='http://127.0.0.1:1', stdout=StringIO(), stderr=StringIO())
+
+@override_settings(PROFILE_REQUEST_TIMING={'ENABLED': True, 'SERVER_TIMING_HEADER': True,
+                                           'LOGGER': 'apps.profile.timing'})
+class RequestTimingMiddlewareTestCase(APITestCase):
+    def setUp(self):
+        get_device_cache().clear()
+        self.user = User.objects.create_user(username="testuser", email="test@example.com", password="testpass")
+        self.token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.key)
+        self.device = Device.objects.create(name="Laptop", device_type="laptop", platform="Linux", user=self.user)
+
+    def test_server_timing_header_and_log_line(self):
+        with self.assertLogs('apps.profile.timing', level='INFO') as logs:
+            response = self.client.get(f'/api/profile/devices/{self.device.id}/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        metrics = {metric.split(';')[0]: metric for metric in response['Server-Timing'].split(', ')}
+        self.assertEqual(set(metrics), {'db', 'gateway', 'service', 'serialize', 'total'})
+
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record['endpoint'], '/api/profile/devices/<int:device_id>/')
+        self.assertEqual(record['status'], 200)
+        self.assertGreater(record['db_queries'], 0)
+        self.assertIn(f'desc="{record["db_queries"]} queries"', metrics['db'])
+        self.assertGreater(record['service_ms'], 0)
+        self.assertGreater(record['gateway_ms'], 0)
+        self.assertGreater(record['serialize_ms'], 0)
+        self.assertGreaterEqual(record['total_ms'], record['service_ms'])
+
+    async def test_async_views_are_timed(self):
+        with self.assertLogs('apps.profile.timing', level='INFO') as logs:
+            response = await self.async_client.get(
+                f'/api/profile/async/devices/{self.device.id}/', headers={'Authorization': f'Token {self.token.key}'}
+            )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('Server-Timing', response)
+
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record['endpoint'], '/api/profile/async/devices/<int:device_id>/')
+        self.assertGreater(record['db_queries'], 0)
+        self.assertGreater(record['service_ms'], 0)
+        self.assertGreaterEqual(record['total_ms'], record['service_ms'])
+
+    def test_enabling_the_middleware_patches_nothing(self):
+        before = {cls: dict(vars(cls)) for cls in (DeviceGateway, DeviceServiceWithGateway)}
+        RequestTimingMiddleware(lambda request: None)
+        self.assertEqual({cls: dict(vars(cls)) for cls in before}, before)
+
+    def test_summary_command_aggregates_per_endpoint(self):
+        with self.assertLogs('apps.profile.timing', level='INFO') as logs:
+            for _ in range(3):
+                self.client.get('/api/profile/devices/list/')
+            self.client.get(f'/api/profile/devices/{self.device.id}/')
+
+        with tempfile.NamedTemporaryFile('w', suffix='.log', delete=False) as log:
+            log.write("unrelated output\n")
+            log.writelines(f"INFO {record.getMessage()}\n" for record in logs.records)
+        self.addCleanup(os.remove, log.name)
+
+        out = StringIO()
+        call_command('request_timing_summary', log.name, sort='count', stdout=out)
+        lines = out.getvalue().splitlines()
+        self.assertTrue(lines[2].startswith('GET /api/profile/devices/list/'))
+        self.assertEqual(lines[2].split()[2], '3')
+        self.assertEqual(len(lines), 4)
+
+
+class RequestTimingDisabledTestCase(APITestCase):
+    def test_no_server_timing_header_by_default(self):
+        response = self.client.get('/api/profile/devices/list/')
+        self.assertNotIn('Server-Timing', response)
+
+class SessionTokenIndexTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="testuser", email="test@example.com")
+        self.device = Device.objects.create(name="Laptop", device_type="laptop", platform="Linux", user=self.user)
+        Session.objects.bulk_create(
+            Session(session_token=f"token-{i}", user=self.user, device=self.device, is_active=i != 2)
+            for i in range(3)
+        )
+        self.index = SessionTokenIndex(max_entries=10, timeout=60)
+        self.repository = IndexedSessionRepository(DjangoSessionRepositoryWithGateway(), self.index)
+
+    def test_hit_needs_no_query_and_returns_a_fresh_entity(self):
+        first = self.repository.find_by_token("token-0")
+        with self.assertNumQueries(0):
+            second = self.repository.find_by_token("token-0")
+        self.assertEqual(second, first)
+        self.assertIsNot(second, first)
+        self.assertEqual((second.username, second.device_name), ("testuser", "Laptop"))
+        self.assertIsNone(self.repository.find_by_token("missing"))
+        self.assertEqual(self.index.stats()['hits'], 1)
+        self.assertEqual(self.index.stats()['misses'], 2)
+
+    def test_writes_invalidate_indexed_sessions(self):
+        for i in range(3):
+            self.repository.find_by_token(f"token-{i}")
+
+        self.repository.deactivate("token-0")
+        self.assertFalse(self.repository.find_by_token("token-0").is_active)
+
+        self.repository.delete("token-1")
+        self.assertIsNone(self.repository.find_by_token("token-1"))
+
+        self.repository.delete_inactive_batch(10)
+        self.assertIsNone(self.repository.find_by_token("token-2"))
+        self.assertIsNone(self.repository.find_by_token("token-0"))
+
+    def test_deactivate_user_sessions_and_user_deletion(self):
+        self.repository.find_by_token("token-0")
+        self.repository.deactivate_user_sessions("testuser")
+        self.assertEqual(len(self.index), 0)
+
+        service = SessionServiceWithGateway()
+        get_session_index().clear()
+        service.get_session("token-1")
+        self.assertEqual(len(get_session_index()), 1)
+        UserServiceWithGateway().delete_user("testuser")
+        self.assertIsNone(service.get_session("token-1"))
+
+    def test_activity_updates_refresh_indexed_rows(self):
+        self.repository.find_by_token("token-0")
+        later = timezone.now() + timedelta(minutes=5)
+        self.repository.bulk_update_last_activity({"token-0": later})
+        with self.assertNumQueries(0):
+            self.assertEqual(self.repository.find_by_token("token-0").last_activity, later)
+
+    def test_added_sessions_are_indexed_on_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.repository.add(SessionEntity(session_token="added", username="testuser", device_name="Laptop"))
+        self.assertIsNotNone(self.index.get("added"))
+
+        try:
+            with transaction.atomic():
+                self.repository.add(SessionEntity(session_token="rolled-back", username="testuser"))
+                raise RuntimeError
+        except RuntimeError:
+            pass
+        self.assertIsNone(self.index.get("rolled-back"))
+        self.assertIsNone(self.repository.find_by_token("rolled-back"))
+
+    def test_lru_eviction_and_expiry_metrics(self):
+        index = SessionTokenIndex(max_entries=2, timeout=60)
+        repository = IndexedSessionRepository(DjangoSessionRepositoryWithGateway(), index)
+        for token in ("token-0", "token-1", "token-0", "token-2"):
+            repository.find_by_token(token)
+        self.assertIsNone(index.get("token-1"))
+        self.assertIsNotNone(index.get("token-0"))
+        stats = index.stats()
+        self.assertEqual(stats['evictions'], 1)
+        self.assertAlmostEqual(stats['eviction_rate'], 1 / 3)
+
+        index.timeout = 0
+        repository.find_by_token("token-1")
+        self.assertIsNone(index.get("token-1"))
+        self.assertEqual(index.stats()['expirations'], 1)
+
+class SessionRevocationTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="testuser", email="test@example.com")
+        other = User.objects.create_user(username="otheruser", email="other@example.com")
+        self.phone = Device.objects.create(name="Phone", device_type="mobile", platform="iOS", user=self.user)
+        laptop = Device.objects.create(name="Laptop", device_type="laptop", platform="Linux", user=self.user)
+        Session.objects.bulk_create([
+            Session(session_token="phone-1", user=self.user, device=self.phone),
+            Session(session_token="phone-2", user=self.user, device=self.phone, is_active=False),
+            Session(session_token="laptop-1", user=self.user, device=laptop),
+            Session(session_token="other-1", user=other),
+        ])
+        self.repo = DjangoSessionRepositoryWithGateway()
+
+    def test_user_revocation_skips_inactive_rows_and_returns_tokens(self):
+        with CaptureQueriesContext(connection) as queries:
+            tokens = self.repo.deactivate_user_sessions("testuser")
+        self.assertEqual(sorted(tokens), ["laptop-1", "phone-1"])
+        self.assertEqual(len(queries), 2)
+        self.assertNotIn('auth_user', queries[1]['sql'])
+        self.assertEqual(
+            set(Session.objects.filter(is_active=True).values_list('session_token', flat=True)), {"other-1"}
+        )
+        self.assertEqual(self.repo.deactivate_user_sessions("testuser"), [])
+        self.assertEqual(self.repo.deactivate_user_sessions("nobody"), [])
+
+    def test_revocation_without_returning_upserts(self):
+        with mock.patch('apps.profile.infrastructure.django_repositories_with_gateway.supports_returning_upserts',
+                        return_value=False):
+            tokens = self.repo.deactivate_user_sessions("testuser")
+        self.assertEqual(sorted(tokens), ["laptop-1", "phone-1"])
+        self.assertFalse(Session.objects.filter(user=self.user, is_active=True).exists())
+
+    def test_device_and_age_revocation_are_single_statements(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(self.repo.deactivate_device_sessions(self.phone.id), ["phone-1"])
+
+        Session.objects.filter(session_token="other-1").update(created_at=timezone.now() - timedelta(days=60))
+        with self.assertNumQueries(1):
+            tokens = self.repo.deactivate_sessions_created_before(timezone.now() - timedelta(days=30))
+        self.assertEqual(tokens, ["other-1"])
+        self.assertTrue(Session.objects.get(session_token="laptop-1").is_active)
+
+    def test_service_revocation_drops_indexed_sessions(self):
+        get_session_index().clear()
+        service = SessionServiceWithGateway()
+        service.get_session("phone-1")
+        self.assertEqual(service.revoke_device_sessions(self.phone.id), ["phone-1"])
+        self.assertFalse(service.get_session("phone-1").is_active)
+
+        service.get_session("laptop-1")
+        self.assertEqual(service.logout_user("testuser"), ["laptop-1"])
+        self.assertFalse(service.get_session("laptop-1").is_active)
+
+    def test_async_logout_returns_revoked_tokens(self):
+        tokens = async_to_sync(AsyncSessionServiceWithGateway().logout_user)("testuser")
+        self.assertEqual(sorted(tokens), ["laptop-1", "phone-1"])
+
+    def test_async_writes_drop_indexed_sessions(self):
+        get_session_index().clear()
+        service = SessionServiceWithGateway()
+        async_service = AsyncSessionServiceWithGateway()
+        service.get_session("phone-1")
+        async_to_sync(async_service.deactivate_session)("phone-1")
+        self.assertFalse(service.get_session("phone-1").is_active)
+
+        service.get_session("laptop-1")
+        async_to_sync(async_service.logout_user)("testuser")
+        self.assertFalse(service.get_session("laptop-1").is_active)
+
+        async_to_sync(async_service.session_repository.delete)("laptop-1")
+        self.assertIsNone(service.get_session("laptop-1"))
+
+class DeviceRegistrationUpsertTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="testuser")
+        self.repo = DjangoDeviceRepositoryWithGateway()
+
+    def _device(self, **fields):
+        return DeviceEntity(**{'name': 'Phone', 'device_type': 'mobile', 'platform': 'iOS',
+                               'username': 'testuser', **fields})
+
+    def test_get_or_register_inserts_in_one_query(self):
+        with self.assertNumQueries(1):
+            device, created = self.repo.get_or_register(self._device())
+        self.assertTrue(created)
+        stored = Device.objects.get(id=device.device_id)
+        self.assertEqual((stored.name, stored.user_id, stored.platform), ('Phone', self.user.id, 'iOS'))
+        self.assertEqual(device.created_at, stored.created_at)
+        self.assertEqual(self.repo.find_by_id(device.device_id).username, 'testuser')
+
+    def test_get_or_register_returns_existing_device(self):
+        first, _ = self.repo.get_or_register(self._device())
+        with self.assertNumQueries(2):
+            device, created = self.repo.get_or_register(self._device(platform='Android'))
+        self.assertFalse(created)
+        self.assertEqual(device.device_id, first.device_id)
+        self.assertEqual(device.platform, 'iOS')
+        self.assertEqual(Device.objects.count(), 1)
+
+    def test_get_or_register_scopes_names_per_user(self):
+        User.objects.create_user(username="other")
+        self.repo.get_or_register(self._device())
+        device, created = self.repo.get_or_register(self._device(username='other'))
+        self.assertTrue(created)
+        self.assertEqual(device.username, 'other')
+
+    def test_get_or_register_unknown_user(self):
+        with self.assertRaisesMessage(User.DoesNotExist, "User nobody not found"):
+            self.repo.get_or_register(self._device(username='nobody'))
+        self.assertFalse(Device.objects.exists())
+
+    def test_get_or_register_without_returning_upserts(self):
+        with mock.patch('apps.profile.infrastructure.django_repositories_with_gateway.supports_returning_upserts',
+                        return_value=False):
+            first, created = self.repo.get_or_register(self._device())
+            device, duplicate = self.repo.get_or_register(self._device())
+        self.assertEqual((created, duplicate), (True, False))
+        self.assertEqual(device.device_id, first.device_id)
+
+    def test_batch_registration_survives_a_concurrent_duplicate(self):
+        Device.objects.create(name="Phone", device_type="mobile", platform="iOS", user=self.user)
+        # As if another request registered "Phone" after the existing names were read
+        with mock.patch.object(DjangoDeviceRepositoryWithGateway, 'find_existing_names', return_value=set()):
+            registered = DeviceServiceWithGateway().register_devices_for_user(
+                "testuser", [self._device(), self._device(name="Tablet")]
+            )
+        self.assertIsNone(registered[0])
+        self.assertEqual(registered[1].name, "Tablet")
+        self.assertEqual(sorted(Device.objects.values_list('name', flat=True)), ["Phone", "Tablet"])
+
+    def test_batch_registration_leaves_the_input_entities_alone(self):
+        devices = [self._device(username="someone-else"), self._device(name="Tablet", username="someone-else")]
+        registered = DeviceServiceWithGateway().register_devices_for_user("testuser", devices)
+        self.assertEqual([device.username for device in registered], ["testuser", "testuser"])
+        self.assertEqual([device.username for device in devices], ["someone-else", "someone-else"])
+        self.assertEqual([device.device_id for device in devices], [None, None])
+
+    def test_async_register_device_rejects_duplicates(self):
+        service = AsyncDeviceServiceWithGateway()
+        device = async_to_sync(service.register_device)('Phone', 'mobile', 'iOS', 'testuser')
+        self.assertEqual(Device.objects.get().id, device.device_id)
+        with self.assertRaises(ValueError):
+            async_to_sync(service.register_device)('Phone', 'mobile', 'iOS', 'testuser')
+
+
+class ConcurrentDeviceRegistrationTestCase(TransactionTestCase):
+    def test_same_name_from_many_threads(self):
+        User.objects.create_user(username="testuser")
+        service = DeviceServiceWithGateway()
+        barrier = threading.Barrier(16)
+
+        def register(_):
+            barrier.wait()
+            try:
+                while True:
+                    try:
+                        service.register_device('Phone', 'mobile', 'iOS', 'testuser')
+                        return 'created'
+                    except ValueError:
+                        return 'duplicate'
+                    except OperationalError as e:
+                        # The shared-cache in-memory SQLite test database fails concurrent
+                        # writers with "table is locked" instead of waiting for the lock
+                        if 'locked' not in str(e):
+                            raise
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=16) as executor:
+            outcomes = list(executor.map(register, range(16)))
+
+        self.assertEqual(outcomes.count('created'), 1)
+        self.assertEqual(outcomes.count('duplicate'), 15)
+        self.assertEqual(Device.objects.filter(name='Phone').count(), 1)
+
+
+@override_settings(PROFILE_PASSWORD_HASHING={'PBKDF2_ITERATIONS': 1000})
+class PasswordHashingTestCase(TestCase):
+    def setUp(self):
+        self.service = UserServiceWithGateway()
+        self.repo = DjangoUserRepositoryWithGateway()
+        self.service.create_user("testuser", "test@example.com", "secret-pw")
+
+    def _hash(self):
+        return User.objects.get(username="testuser").password
+
+    def test_new_passwords_use_tuned_cost(self):
+        self.assertTrue(self._hash().startswith('pbkdf2_sha256$1000$'))
+        self.assertTrue(User.objects.get(username="testuser").check_password("secret-pw"))
+
+    def test_authenticate(self):
+        self.assertTrue(self.service.authenticate("testuser", "secret-pw"))
+        self.assertFalse(self.service.authenticate("testuser", "wrong"))
+        self.assertFalse(self.service.authenticate("nobody", "secret-pw"))
+        User.objects.filter(username="testuser").update(is_active=False)
+        self.assertFalse(self.service.authenticate("testuser", "secret-pw"))
+
+    def test_authenticate_does_not_rewrite_current_hashes(self):
+        encoded = self._hash()
+        with self.assertNumQueries(1):
+            self.assertTrue(self.service.authenticate("testuser", "secret-pw"))
+        self.assertEqual(self._hash(), encoded)
+
+    def test_login_upgrades_legacy_hash(self):
+        legacy = PBKDF2SHA1PasswordHasher().encode("secret-pw", "legacysalt", iterations=1000)
+        User.objects.filter(username="testuser").update(password=legacy)
+        with self.assertNumQueries(2):
+            self.assertTrue(self.service.authenticate("testuser", "secret-pw"))
+        self.assertTrue(self._hash().startswith('pbkdf2_sha256$1000$'))
+        self.assertTrue(self.service.authenticate("testuser", "secret-pw"))
+
+    def test_login_upgrades_cost(self):
+        with self.settings(PROFILE_PASSWORD_HASHING={'PBKDF2_ITERATIONS': 1200}):
+            self.assertTrue(self.service.authenticate("testuser", "secret-pw"))
+            self.assertTrue(self._hash().startswith('pbkdf2_sha256$1200$'))
+
+    def test_wrong_password_does_not_upgrade(self):
+        legacy = PBKDF2SHA1PasswordHasher().encode("secret-pw", "legacysalt", iterations=1000)
+        User.objects.filter(username="testuser").update(password=legacy)
+        self.assertFalse(self.service.authenticate("testuser", "wrong"))
+        self.assertEqual(self._hash(), legacy)
+
+    def test_set_password_hash_compares_expected(self):
+        encoded = self._hash()
+        self.assertFalse(self.repo.set_password_hash("testuser", "!new", expected="!stale"))
+        self.assertEqual(self._hash(), encoded)
+        self.assertTrue(self.repo.set_password_hash("testuser", "!new", expected=encoded))
+        self.assertEqual(self._hash(), "!new")
+
+    def test_change_password_is_one_update(self):
+        with self.assertNumQueries(1):
+            self.repo.change_password("testuser", "new-pw")
+        self.assertTrue(self.service.authenticate("testuser", "new-pw"))
+        with self.assertRaisesMessage(User.DoesNotExist, "User nobody not found"):
+            self.repo.change_password("nobody", "new-pw")
+
+    def test_worker_pool(self):
+        pool = PasswordHashingPool(workers=1)
+        self.addCleanup(pool.shutdown)
+        encoded = self._hash()
+        # Workers load the project settings, where the tuned cost is not overridden
+        self.assertEqual(pool.verify("secret-pw", encoded), (True, True))
+        self.assertFalse(async_to_sync(pool.averify)("wrong", encoded)[0])
+        self.assertEqual(pool.hash_many([]), [])
+
+    def test_benchmark_command(self):
+        out = StringIO()
+        call_command('benchmark_password_hashing', '--workers', '0', '--logins', '4', '--threads', '2', stdout=out)
+        self.assertIn('pbkdf2_sha256 (iterations=1000)', out.getvalue())
+        self.assertIn('logins/s', out.getvalue())
+
+
+@override_settings(PROFILE_PASSWORD_HASHING={'PBKDF2_ITERATIONS': 1000})
+class LoginTestCase(APITestCase):
+    def setUp(self):
+        get_session_index().clear()
+        self.service = UserServiceWithGateway()
+        self.service.create_user("testuser", "test@example.com", "secret-pw")
+        self.user = User.objects.get(username="testuser")
+        Device.objects.create(name="phone", device_type="mobile", platform="iOS", user=self.user)
+
+    def test_first_login_issues_token(self):
+        with self.assertNumQueries(3):
+            token, session_token = self.service.login_user("testuser", "secret-pw", "phone", "10.0.0.1", "agent/1.0")
+        self.assertEqual(Token.objects.get(user=self.user).key, token)
+        session = Session.objects.get(user=self.user)
+        self.assertEqual(session.session_token, session_token)
+        self.assertEqual(
+            (session.device.name, session.ip_address, session.user_agent, session.is_active),
+            ("phone", "10.0.0.1", "agent/1.0", True)
+        )
+
+    def test_repeat_login_reuses_token_in_two_queries(self):
+        token, _ = self.service.login_user("testuser", "secret-pw")
+        with self.assertNumQueries(2):
+            self.assertEqual(self.service.login_user("testuser", "secret-pw", "phone")[0], token)
+        self.assertEqual(Token.objects.filter(user=self.user).count(), 1)
+        self.assertEqual(Session.objects.filter(user=self.user).count(), 2)
+        self.assertEqual(len(set(Session.objects.values_list('session_token', flat=True))), 2)
+
+    def test_first_login_without_returning_upserts(self):
+        with mock.patch('apps.profile.infrastructure.django_repositories_with_gateway.supports_returning_upserts',
+                        return_value=False):
+            token, _ = self.service.login_user("testuser", "secret-pw")
+            self.assertEqual(self.service.login_user("testuser", "secret-pw")[0], token)
+        self.assertEqual(Token.objects.get(user=self.user).key, token)
+
+    def test_login_with_unknown_device_records_session_without_device(self):
+        self.service.login_user("testuser", "secret-pw", "laptop")
+        self.assertIsNone(Session.objects.get(user=self.user).device_id)
+
+    def test_login_reuses_token_issued_elsewhere(self):
+        token = Token.objects.create(user=self.user)
+        self.assertEqual(self.service.login_user("testuser", "secret-pw")[0], token.key)
+
+    def test_invalid_credentials(self):
+        for username, password in (("testuser", "wrong"), ("nobody", "secret-pw")):
+            with self.assertRaises(ValueError):
+                self.service.login_user(username, password)
+        self.user.is_active = False
+        self.user.save()
+        with self.assertRaises(ValueError):
+            self.service.login_user("testuser", "secret-pw")
+        self.assertFalse(Session.objects.exists())
+        self.assertFalse(Token.objects.exists())
+
+    def test_login_api(self):
+        response = self.client.post('/api/profile/login/', {
+            "username": "testuser", "password": "secret-pw", "device_name": "phone"
+        }, HTTP_USER_AGENT="agent/2.0")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        token = Token.objects.get(user=self.user).key
+        self.assertEqual(response.data['token'], token)
+        self.assertEqual(response.cookies['auth_token'].value, token)
+        session = Session.objects.get(user=self.user)
+        self.assertEqual((session.ip_address, session.user_agent), ("127.0.0.1", "agent/2.0"))
+        self.assertEqual(response.data['session_token'], session.session_token)
+        self.assertEqual(response.cookies['session_token'].value, session.session_token)
+
+        # Without the session cookie, so the process-wide activity tracker stays idle
+        self.client.cookies.clear()
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + response.data['token'])
+        self.assertEqual(self.client.get('/api/profile/devices/list/').status_code, status.HTTP_200_OK)
+
+    def test_authenticated_requests_touch_their_session(self):
+        response = self.client.post('/api/profile/login/', {"username": "testuser", "password": "secret-pw"})
+        tracker = mock.Mock()
+        with mock.patch('apps.profile.interfaces.authentication.get_activity_tracker', return_value=tracker):
+            # The login cookies (auth_token, session_token) authenticate and name the session
+            self.client.get('/api/profile/devices/list/')
+            self.client.cookies.pop('session_token')
+            self.client.get('/api/profile/devices/list/', HTTP_X_SESSION_TOKEN="from-header")
+            self.client.cookies.pop('auth_token')
+            self.client.get('/api/profile/devices/list/', HTTP_X_SESSION_TOKEN="anonymous")
+        self.assertEqual(
+            [call.args[0] for call in tracker.touch.call_args_list],
+            [response.data['session_token'], "from-header"]
+        )
+
+    def test_login_api_rejects_bad_password(self):
+        response = self.client.post('/api/profile/login/', {"username": "testuser", "password": "wrong"})
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_benchmark_command(self):
+        out = StringIO()
+        call_command('benchmark_login', '--users', '2', '--logins', '4', stdout=out)
+        self.assertIn('login_user  repeat', out.getvalue())
+        self.assertFalse(User.objects.filter(username__startswith='__login_').exists())
@@ -0,0 +1,102 @@
+"""
+Async service implementations using the DTO/Gateway pattern.
+These mirror the synchronous services for use from ASGI views.
+"""
+
+from typing import List, Optional
+from asgiref.sync import sync_to_async
+
+from ..domain.entities import DeviceEntity, SessionEntity
+from ..domain.repositories import Cursor
+from ..infrastructure.async_repositories_with_gateway import (
+    DjangoAsyncDeviceRepositoryWithGateway,
+    DjangoAsyncSessionRepositoryWithGateway
+)
+from ..infrastructure.instrumentation import instrumented
+from ..infrastructure.token_cache import revoke_user_tokens
+
+
+@instrumented('service')
+class AsyncDeviceServiceWithGateway:
+    """Async device service using DTO/Gateway pattern"""
+
+    def __init__(self):
+        self.device_repository = DjangoAsyncDeviceRepositoryWithGateway()
+
+    async def register_device(self, name: str, device_type: str, platform: str, username: str) -> DeviceEntity:
+        """Register a new device for a user"""
+        device_entity = DeviceEntity(
+            name=name,
+            device_type=device_type,
+            platform=platform,
+            username=username,
+            is_active=True
+        )
+        device, created = await self.device_repository.get_or_register(device_entity)
+        if not created:
+            raise ValueError(f"Device with name '{name}' already exists for user '{username}'")
+        return device
+
+    async def get_user_devices(self, username: str, after: Optional[Cursor] = None,
+                               limit: Optional[int] = None) -> List[DeviceEntity]:
+        """Get devices for a user, optionally one page after a cursor"""
+        return await self.device_repository.find_by_user(username, after=after, limit=limit)
+
+    async def get_device_by_id(self, device_id: int) -> Optional[DeviceEntity]:
+        """Get a device by ID"""
+        return await self.device_repository.find_by_id(device_id)
+
+    async def deactivate_device(self, device_id: int) -> Optional[DeviceEntity]:
+        """Deactivate a device, returning the updated device"""
+        device = await self.device_repository.find_by_id(device_id)
+        if device:
+            device.is_active = False
+            device = await self.device_repository.update(device)
+        return device
+
+    async def delete_device(self, device_id: int) -> None:
+        """Delete a device"""
+        await self.device_repository.delete(device_id)
+
+
+@instrumented('service')
+class AsyncSessionServiceWithGateway:
+    """Async session service using DTO/Gateway pattern"""
+
+    def __init__(self):
+        self.session_repository = DjangoAsyncSessionRepositoryWithGateway()
+
+    async def create_session(self, session_token: str, username: str,
+                             device_name: Optional[str] = None, ip_address: Optional[str] = None,
+                             user_agent: Optional[str] = None) -> SessionEntity:
+        """Create a new session"""
+        session_entity = SessionEntity(
+            session_token=session_token,
+            username=username,
+            device_name=device_name,
+            ip_address=ip_address,
+            user_agent=user_agent,
+            is_active=True
+        )
+        return await self.session_repository.add(session_entity)
+
+    async def get_session(self, token: str) -> Optional[SessionEntity]:
+        """Get session by token"""
+        return await self.session_repository.find_by_token(token)
+
+    async def get_user_sessions(self, username: str, active_only: bool = False,
+                                after: Optional[Cursor] = None, limit: Optional[int] = None) -> List[SessionEntity]:
+        """Get sessions for a user, optionally one page after a cursor"""
+        if active_only:
+            return await self.session_repository.find_active_by_user(username, after=after, limit=limit)
+        return await self.session_repository.find_by_user(username, after=after, limit=limit)
+
+    async def deactivate_session(self, token: str) -> None:
+        """Deactivate a session"""
+        await self.session_repository.deactivate(token)
+
+    async def logout_user(self, username: str) -> List[str]:
+        """Logout user (deactivate all sessions and delete the auth token), returning the revoked session tokens"""
+        tokens = await self.session_repository.deactivate_user_sessions(username)
+        await sync_to_async(revoke_user_tokens)(username)
+        return tokens
@@ -3,20 +3,38 @@ Example service implementations using the new DTO/Gateway pattern.
 These services show how to use the gateways for data conversion between layers.
 """
 
-from typing import List, Optional
+import secrets
+import time
+from dataclasses import replace
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Iterator, List, Optional, Tuple
 from ..domain.entities import UserEntity, DeviceEntity, SessionEntity
+from ..domain.repositories import Cursor
 from ..infrastructure.django_repositories_with_gateway import (
     DjangoUserRepositoryWithGateway,
     DjangoDeviceRepositoryWithGateway,
     DjangoSessionRepositoryWithGateway
 )
+from ..infrastructure.activity_tracker import get_activity_tracker
+from ..infrastructure.cached_repositories import (
+    CachedDeviceRepository,
+    get_device_cache,
+    invalidate_devices,
+    user_device_ids
+)
+from ..infrastructure.instrumentation import instrumented
+from ..infrastructure.password_hashing import get_hashing_pool
+from ..infrastructure.session_index import IndexedSessionRepository, get_session_index
+from ..infrastructure.token_cache import invalidate_tokens, invalidate_user_tokens, revoke_user_tokens, user_token_keys
 
 
+@instrumented('service')
 class UserServiceWithGateway:
     """User service using DTO/Gateway pattern"""
 
     def __init__(self):
         self.user_repository = DjangoUserRepositoryWithGateway()
+        self.hashing_pool = get_hashing_pool()
 
     def create_user(self, username: str, email: str, password: str) -> UserEntity:
         """Create a new user"""
@@ -31,28 +49,65 @@ class UserServiceWithGateway:
         """Get user by username"""
         return self.user_repository.find_by_username(username)
 
+    def authenticate(self, username: str, password: str) -> bool:
+        """Check an active user's password, upgrading a legacy or outdated hash on success"""
+        return self._check_password(username, password, self.user_repository.find_password_hash(username))
+
+    def login_user(self, username: str, password: str, device_name: Optional[str] = None,
+                   ip_address: Optional[str] = None, user_agent: Optional[str] = None) -> Tuple[str, str]:
+        """
+        Log a user in and return (auth token, session token), reusing the auth
+        token already issued, and record the login as a new session. A login
+        with a token already issued costs two queries: one read, one INSERT.
+        """
+        credentials = self.user_repository.find_login_credentials(username)
+        encoded = credentials.password_hash if credentials is not None else None
+        if not self._check_password(username, password, encoded):
+            raise ValueError("Invalid credentials")
+
+        session = SessionEntity(
+            session_token=secrets.token_hex(20),
+            username=username,
+            device_name=device_name,
+            ip_address=ip_address,
+            user_agent=user_agent,
+            is_active=True
+        )
+        return self.user_repository.record_login(credentials, session), session.session_token
+
+    def _check_password(self, username: str, password: str, encoded: Optional[str]) -> bool:
+        valid, must_update = self.hashing_pool.verify(password, encoded)
+        if valid and must_update:
+            # Only replace the hash just verified, never one a concurrent password change wrote
+            self.user_repository.set_password_hash(username, self.hashing_pool.hash(password), expected=encoded)
+        return valid
+
     def update_password(self, username: str, new_password: str) -> None:
         """Update user password"""
         self.user_repository.change_password(username, new_password)
+        invalidate_user_tokens(username)
 
     def delete_user(self, username: str) -> None:
         """Delete user"""
+        # Token and device rows cascade with the user, so collect their keys first
+        token_keys = user_token_keys(username)
+        device_ids = user_device_ids(username)
         self.user_repository.delete(username)
+        invalidate_tokens(token_keys)
+        invalidate_devices(device_ids)
+        # Sessions cascade with the user too
+        get_session_index().invalidate_user(username)
 
 
+@instrumented('service')
 class DeviceServiceWithGateway:
     """Device service using DTO/Gateway pattern"""
 
     def __init__(self):
-        self.device_repository = DjangoDeviceRepositoryWithGateway()
+        self.device_repository = CachedDeviceRepository(DjangoDeviceRepositoryWithGateway(), get_device_cache())
 
     def register_device(self, name: str, device_type: str, platform: str, username: str) -> DeviceEntity:
         """Register a new device for a user"""
-        # Check if device with same name already exists for this user
-        existing_device = self.device_repository.find_by_name_and_user(name, username)
-        if existing_device:
-            raise ValueError(f"Device with name '{name}' already exists for user '{username}'")
-        
         device_entity = DeviceEntity(
             name=name,
             device_type=device_type,
@@ -60,37 +115,93 @@ class DeviceServiceWithGateway:
             username=username,
             is_active=True
         )
-        return self.device_repository.add(device_entity)
+        # One atomic insert-or-skip, so concurrent registrations of a name cannot both succeed
+        device, created = self.device_repository.get_or_register(device_entity)
+        if not created:
+            raise ValueError(f"Device with name '{name}' already exists for user '{username}'")
+        return device
 
-    def get_user_devices(self, username: str) -> List[DeviceEntity]:
-        """Get all devices for a user"""
-        return self.device_repository.find_by_user(username)
+    def get_user_devices(self, username: str, after: Optional[Cursor] = None,
+                         limit: Optional[int] = None) -> List[DeviceEntity]:
+        """Get devices for a user, optionally one page after a cursor"""
+        return self.device_repository.find_by_user(username, after=after, limit=limit)
+
+    def export_user_devices(self, username: str, chunk_size: int = 1000) -> Iterator[DeviceEntity]:
+        """Lazily yield every device of a user, for exports"""
+        return self.device_repository.iter_by_user(username, chunk_size=chunk_size)
 
     def get_device(self, name: str, username: str) -> Optional[DeviceEntity]:
         """Get specific device by name and user"""
         return self.device_repository.find_by_name_and_user(name, username)
 
+    def get_device_by_id(self, device_id: int) -> DeviceEntity:
+        """Get a device by ID"""
+        device = self.device_repository.find_by_id(device_id)
+        if device is None:
+            raise ValueError(f"Device {device_id} not found")
+        return device
+
     def update_device(self, device: DeviceEntity) -> DeviceEntity:
-        """Update device information"""
+        """Update device information, writing only the fields that changed"""
         return self.device_repository.update(device)
 
-    def deactivate_device(self, device_id: int) -> None:
-        """Deactivate a device"""
+    def deactivate_device(self, device_id: int) -> Optional[DeviceEntity]:
+        """Deactivate a device, returning the updated device"""
         device = self.device_repository.find_by_id(device_id)
         if device:
             device.is_active = False
-            self.device_repository.update(device)
+            device = self.device_repository.update(device)
+        return device
 
     def delete_device(self, device_id: int) -> None:
         """Delete a device"""
         self.device_repository.delete_by_id(device_id)
 
+    def register_devices(self, devices: List[DeviceEntity]) -> List[DeviceEntity]:
+        """Register many devices in one batch"""
+        return self.device_repository.bulk_add(devices)
+
+    def register_devices_for_user(self, username: str,
+                                  devices: List[DeviceEntity]) -> List[Optional[DeviceEntity]]:
+        """
+        Register many devices for one user.
+        Returns one item per input device: the created entity, or None when the
+        name already exists for the user (or earlier in the same batch, or was
+        registered concurrently).
+        """
+        existing = self.device_repository.find_existing_names(username, [d.name for d in devices])
+        to_create = []
+        for device in devices:
+            if device.name in existing:
+                continue
+            existing.add(device.name)
+            # The caller's entities are left untouched
+            to_create.append(replace(device, username=username))
 
+        created = {device.name: device for device in self.device_repository.bulk_register(to_create)}
+        return [
+            created.pop(device.name, None)
+            for device in devices
+        ]
+
+    def deactivate_devices(self, device_ids: List[int]) -> None:
+        """Deactivate many devices"""
+        self.device_repository.bulk_deactivate(device_ids)
+
+    def delete_devices(self, device_ids: List[int]) -> None:
+        """Delete many devices"""
+        self.device_repository.bulk_delete(device_ids)
+
+
+@instrumented('service')
 class SessionServiceWithGateway:
     """Session service using DTO/Gateway pattern"""
 
     def __init__(self):
-        self.session_repository = DjangoSessionRepositoryWithGateway()
+        self.session_repository = IndexedSessionRepository(
+            DjangoSessionRepositoryWithGateway(), get_session_index()
+        )
+        self.activity_tracker = get_activity_tracker()
 
     def create_session(self, session_token: str, username: str, 
                       device_name: Optional[str] = None, ip_address: Optional[str] = None,
@@ -110,24 +221,90 @@ class SessionServiceWithGateway:
         """Get session by token"""
         return self.session_repository.find_by_token(token)
 
-    def get_user_sessions(self, username: str, active_only: bool = False) -> List[SessionEntity]:
-        """Get all sessions for a user"""
+    def get_user_sessions(self, username: str, active_only: bool = False,
+                          after: Optional[Cursor] = None, limit: Optional[int] = None) -> List[SessionEntity]:
+        """Get sessions for a user, optionally one page after a cursor"""
+        if active_only:
+            return self.session_repository.find_active_by_user(username, after=after, limit=limit)
+        return self.session_repository.find_by_user(username, after=after, limit=limit)
+
+    def export_user_sessions(self, username: str, active_only: bool = False,
+                             chunk_size: int = 1000) -> Iterator[SessionEntity]:
+        """Lazily yield the sessions of a user, for exports"""
         if active_only:
-            return self.session_repository.find_active_by_user(username)
-        return self.session_repository.find_by_user(username)
+            return self.session_repository.iter_active_by_user(username, chunk_size=chunk_size)
+        return self.session_repository.iter_by_user(username, chunk_size=chunk_size)
+
+    def export_all_sessions(self, chunk_size: int = 1000) -> Iterator[SessionEntity]:
+        """Lazily yield every session of every user, for audits"""
+        return self.session_repository.iter_all(chunk_size=chunk_size)
 
     def update_session_activity(self, token: str) -> None:
-        """Update session last activity"""
-        self.session_repository.update_last_activity(token)
+        """Record session activity (written in bulk by the activity tracker)"""
+        self.activity_tracker.touch(token)
+
+    def flush_session_activity(self) -> None:
+        """Write buffered session activity immediately"""
+        self.activity_tracker.flush()
 
     def deactivate_session(self, token: str) -> None:
         """Deactivate a session"""
         self.session_repository.deactivate(token)
 
-    def logout_user(self, username: str) -> None:
-        """Logout user (deactivate all sessions)"""
-        self.session_repository.deactivate_user_sessions(username)
+    def logout_user(self, username: str) -> List[str]:
+        """Logout user (deactivate all sessions and delete the auth token), returning the revoked session tokens"""
+        tokens = self.session_repository.deactivate_user_sessions(username)
+        revoke_user_tokens(username)
+        return tokens
+
+    def revoke_device_sessions(self, device_id: int) -> List[str]:
+        """Deactivate every active session on a device, returning the revoked tokens"""
+        return self.session_repository.deactivate_device_sessions(device_id)
+
+    def revoke_sessions_created_before(self, cutoff: datetime) -> List[str]:
+        """Deactivate every active session created before the cutoff, returning the revoked tokens"""
+        return self.session_repository.deactivate_sessions_created_before(cutoff)
 
     def cleanup_inactive_sessions(self) -> None:
         """Remove all inactive sessions"""
         self.session_repository.delete_inactive_sessions()
+
+    def purge_sessions(self, max_idle: Optional[timedelta] = None, batch_size: int = 1000,
+                       pause: float = 0.0, on_batch: Optional[Callable[[int], None]] = None) -> int:
+        """
+        Delete inactive sessions, and sessions idle for longer than max_idle, in
+        bounded batches with a pause between them. Every batch commits on its
+        own, so an interrupted purge resumes by simply running it again.
+        Returns the total number of deleted sessions.
+        """
+        batches = [self.session_repository.delete_inactive_batch]
+        if max_idle is not None:
+            cutoff = datetime.now(timezone.utc) - max_idle
+            batches.append(lambda size: self.session_repository.delete_idle_batch(cutoff, size))
+
+        total = 0
+        for delete_batch in batches:
+            while True:
+                deleted = delete_batch(batch_size)
+                if not deleted:
+                    break
+                total += deleted
+                if on_batch:
+                    on_batch(deleted)
+                if deleted < batch_size:
+                    break
+                if pause:
+                    time.sleep(pause)
+        return total
+
+    def create_sessions(self, sessions: List[SessionEntity]) -> List[SessionEntity]:
+        """Create many sessions in one batch"""
+        return self.session_repository.bulk_add(sessions)
+
+    def deactivate_sessions(self, tokens: List[str]) -> None:
+        """Deactivate many sessions"""
+        self.session_repository.bulk_deactivate(tokens)
+
+    def delete_sessions(self, tokens: List[str]) -> None:
+        """Delete many sessions"""
+        self.session_repository.bulk_delete(tokens)
@@ -54,6 +54,77 @@ REST_FRAMEWORK = {
     ],
 }
 
+# Server processes, e.g. gunicorn workers; per-process caches are refused when there are several
+WEB_CONCURRENCY = int(os.getenv('WEB_CONCURRENCY', '1'))
+
+# Cache of resolved auth tokens (see apps/profile/infrastructure/token_cache.py).
+# The 'local' backend is per process: a logout or password change only
+# invalidates it in the worker that handled it, so other workers accept the
+# old token for up to TIMEOUT seconds. Keep it short, and use 'django' with a
+# shared (Redis, memcached, database) cache when running several workers.
+PROFILE_TOKEN_CACHE = {
+    'BACKEND': os.getenv('PROFILE_TOKEN_CACHE_BACKEND', 'local'),
+    'TIMEOUT': 5,
+    'MAX_ENTRIES': 10000,
+    'CACHE_ALIAS': 'default',
+    'WORKERS': WEB_CONCURRENCY,
+}
+
+# Read-through cache for single-device lookups (see apps/profile/infrastructure/cached_repositories.py)
+PROFILE_DEVICE_CACHE = {
+    'BACKEND': os.getenv('PROFILE_DEVICE_CACHE_BACKEND', 'local'),
+    'TIMEOUT': 300,
+    'MAX_ENTRIES': 10000,
+    'CACHE_ALIAS': 'default',
+    'WORKERS': WEB_CONCURRENCY,
+}
+
+# In-process hot-token index for session lookups (see apps/profile/infrastructure/session_index.py)
+PROFILE_SESSION_INDEX = {
+    'MAX_ENTRIES': 10000,
+    'TIMEOUT': 30,
+}
+
+# Write-behind session activity (see apps/profile/infrastructure/activity_tracker.py)
+PROFILE_SESSION_ACTIVITY = {
+    'FLUSH_INTERVAL': 5,
+    'MAX_PENDING': 1000,
+    'MIN_RESOLUTION': 60,
+}
+
+# Password hashing cost and worker processes (see apps/profile/infrastructure/password_hashing.py)
+PROFILE_PASSWORD_HASHING = {
+    'WORKERS': int(os.getenv('PROFILE_HASHING_WORKERS', '0')),
+    'MAX_PENDING': 64,
+    'PBKDF2_ITERATIONS': None,
+    'BCRYPT_ROUNDS': None,
+    'ARGON2_TIME_COST': None,
+    'ARGON2_MEMORY_COST': None,
+    'ARGON2_PARALLELISM': None,
+}
+
+# Opt-in per-request query and timing instrumentation (see apps/profile/interfaces/middleware.py)
+PROFILE_REQUEST_TIMING = {
+    'ENABLED': os.getenv('PROFILE_REQUEST_TIMING', '') == '1',
+    'SERVER_TIMING_HEADER': True,
+    'LOGGER': 'apps.profile.timing',
+}
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'message': {'format': '%(message)s'},
+    },
+    'handlers': {
+        'timing': {'class': 'logging.StreamHandler', 'formatter': 'message'},
+    },
+    'loggers': {
+        # One JSON object per request, read back by the request_timing_summary command
+        'apps.profile.timing': {'handlers': ['timing'], 'level': 'INFO', 'propagate': False},
+    },
+}
+
 SWAGGER_SETTINGS = {
     'SECURITY_DEFINITIONS': {
         'Token': {
@@ -67,6 +138,7 @@ SWAGGER_SETTINGS = {
 }
 
 MIDDLEWARE = [
+    'apps.profile.interfaces.middleware.RequestTimingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -111,6 +183,18 @@ DATABASES = {
     }
 }
 
+# Password hashers: the first hashes new passwords, the others still verify older hashes,
+# which are upgraded on the next login. Argon2 needs argon2-cffi and bcrypt needs bcrypt.
+# https://docs.djangoproject.com/en/5.0/topics/auth/passwords/
+
+PASSWORD_HASHERS = [
+    'apps.profile.infrastructure.password_hashing.TunedPBKDF2PasswordHasher',
+    'apps.profile.infrastructure.password_hashing.TunedArgon2PasswordHasher',
+    'apps.profile.infrastructure.password_hashing.TunedBCryptSHA256PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.ScryptPasswordHasher',
+]
+
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
 